@@ -0,0 +1,62 @@
+"""
+Benchmark of SentimentCrosstabs against one groupby per dimension.
+
+    python benchmarks/bench_analytics.py [rows ...]
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.analytics import SentimentCrosstabs
+
+
+def make_processed_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    pick = lambda values: np.array(values, dtype=object)[rng.integers(0, len(values), rows)]
+    return pd.DataFrame({
+        "Clothing Id": rng.integers(0, 1200, rows),
+        "Age": rng.integers(18, 90, rows),
+        "Rating": rng.integers(1, 6, rows),
+        "Recommended Ind": rng.integers(0, 2, rows),
+        "Division Name": pick(["general", "general petite", "initmates"]),
+        "Department Name": pick(["tops", "dresses", "bottoms", "intimate", "jackets", "trend"]),
+        "Class Name": pick(["knits", "dresses", "pants", "blouses", "lounge", "sweaters", "jeans"]),
+        "AI Sentiment": pick(["positive", "negative", "neutral"]),
+    })
+
+
+def groupby_per_dimension(df: pd.DataFrame):
+    df = df.assign(**{
+        "Rating Band": pd.cut(df["Rating"], [0, 2, 3, 5]),
+        "Age Band": pd.cut(df["Age"], [0, 24, 34, 44, 54, 64, 200]),
+    })
+    return {col: df.groupby([col, "AI Sentiment"], observed=False).size().unstack(fill_value=0)
+            for col in ("Class Name", "Department Name", "Division Name", "Rating Band", "Age Band",
+                        "Recommended Ind", "Clothing Id")}
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(sizes):
+    engine = SentimentCrosstabs()
+    print(f"{'rows':>8} {'groupby s':>10} {'crosstabs s':>12} {'+rankings s':>12} {'speedup':>8}")
+    for rows in sizes:
+        df = make_processed_frame(rows)
+        legacy = best_of(lambda: groupby_per_dimension(df))
+        new = best_of(lambda: engine.compute(df))
+        ranked = best_of(lambda: engine.rankings(engine.compute(df), k=10, min_total=20))
+        print(f"{rows:>8} {legacy:>10.3f} {new:>12.3f} {ranked:>12.3f} {legacy / new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 500_000])
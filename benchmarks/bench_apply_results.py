@@ -0,0 +1,76 @@
+"""
+Microbenchmark of applying AI results to the processed frame: the old per-cell
+df.at writes on a copy plus set_action_needed through .apply(lambda), against
+the preallocated arrays, bulk column assignment and vectorized comparison.
+No API calls, only the bookkeeping around them.
+
+    python benchmarks/bench_apply_results.py [rows ...]
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils import GsheetAIAuto
+
+BATCH_SIZE = 10
+
+
+def make_batches(rows: int):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"Review Text": [f"review {i}" for i in range(rows)],
+                       "Class Name": rng.choice(["knits", "dresses", "pants"], rows)})
+    labels = np.array(["positive", "negative", "neutral"], dtype=object)[rng.integers(0, 3, rows)]
+    results = [{"summary": f"summary {i}", "sentiment": label} for i, label in enumerate(labels)]
+    reviews = df["Review Text"]
+    batches = [(reviews.iloc[start:start + BATCH_SIZE], results[start:start + BATCH_SIZE])
+               for start in range(0, rows, BATCH_SIZE)]
+    return df, batches
+
+
+def per_cell(df: pd.DataFrame, batches):
+    df_copy = df.copy()
+    df_copy["AI Summary"] = None
+    df_copy["AI Sentiment"] = None
+    for reviews, results in batches:
+        for idx, result in zip(reviews.index, results):
+            df_copy.at[idx, "AI Summary"] = result["summary"]
+            df_copy.at[idx, "AI Sentiment"] = result["sentiment"]
+    df_copy["Action Needed"] = df_copy["AI Sentiment"].apply(lambda x: "Yes" if x == "negative" else "No")
+    return df_copy
+
+
+def bulk(gsheetauto: GsheetAIAuto, df: pd.DataFrame, batches):
+    summaries = np.empty(len(df), dtype=object)
+    sentiments = np.empty(len(df), dtype=object)
+    for reviews, results in batches:
+        gsheetauto._apply_batch_results(summaries, sentiments, reviews, results)
+    df["AI Summary"] = summaries
+    df["AI Sentiment"] = sentiments
+    return gsheetauto.set_action_needed(df)
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(sizes):
+    gsheetauto = GsheetAIAuto()
+    print(f"{'rows':>8} {'per-cell s':>11} {'bulk s':>8} {'speedup':>8}")
+    for rows in sizes:
+        df, batches = make_batches(rows)
+        assert per_cell(df, batches).equals(bulk(gsheetauto, df.copy(), batches))
+        legacy = best_of(lambda: per_cell(df, batches))
+        new = best_of(lambda: bulk(gsheetauto, df.copy(), batches))
+        print(f"{rows:>8} {legacy:>11.3f} {new:>8.3f} {legacy / new:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1_000, 23_000, 100_000])
@@ -0,0 +1,235 @@
+"""
+End-to-end benchmark of src.etl.main() against the offline fakes in src.fakes.
+
+    python benchmarks/bench_pipeline.py [--sizes 200 2000 10000] [--output results.json]
+                                        [--groq-latency 0.05] [--sheets-latency 0]
+                                        [--groq-rpm N] [--failure-rate 0.0]
+
+For every size a synthetic reviews CSV is written to a temporary directory
+and main() runs once from an empty spreadsheet, cache and watermark. Per
+stage (a GsheetAIAuto or ReviewAnalysis method) it reports wall time,
+calls, Sheets API calls and cells, Groq requests and tokens, and the peak
+traced memory. Memory is only measured for the outermost stage, so nested
+stages (process_stg_data inside pull_gsheet_data_to_df) report null.
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import contextlib
+import functools
+import inspect
+import io
+import json
+import logging
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from configs.config import settings
+from src import etl
+from src.analysis import ReviewAnalysis
+from src.fakes import FakeGroq, FakeSheetsClient, FakeSheetsQuota
+from src.instrumentation import metrics
+from src.utils import GsheetAIAuto
+
+STAGES = ("dataset_columns", "iter_dataset", "get_worksheet", "clean_sheet", "upload_rows_to_gsheets",
+          "pull_gsheet_data_to_df", "process_stg_data", "apply_groqAI", "merge_processed")
+
+
+def make_dataset(path: str, rows: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    reviews = np.array([
+        "I love this dress, the fabric is lovely and it fits perfectly.",
+        "Runs small, I had to return it.",
+        "Great top, very comfortable for everyday wear.",
+        "The color was not what I expected.",
+        "Cheap material and itchy, disappointed.",
+        "",
+    ], dtype=object)
+    pd.DataFrame({
+        "Clothing ID": rng.integers(0, 1200, rows),
+        "Age": rng.integers(18, 90, rows),
+        "Title": np.array(["Love it", "Meh", "Returned", ""], dtype=object)[rng.integers(0, 4, rows)],
+        # a numbered suffix keeps most reviews distinct, like the real dataset
+        "Review Text": [f"{text} #{i}" if text else "" for i, text in
+                        enumerate(reviews[rng.integers(0, len(reviews), rows)])],
+        "Rating": rng.integers(1, 6, rows),
+        "Recommended IND": rng.integers(0, 2, rows),
+        "Positive Feedback Count": rng.integers(0, 50, rows),
+        "Division Name": np.array(["General", "General Petite", "Initmates"], dtype=object)[rng.integers(0, 3, rows)],
+        "Department Name": np.array(["Tops", "Dresses", "Bottoms"], dtype=object)[rng.integers(0, 3, rows)],
+        "Class Name": np.array(["Knits", "Dresses", "Pants", "Blouses"], dtype=object)[rng.integers(0, 4, rows)],
+    }).to_csv(path)
+
+
+class OfflineGsheetAIAuto(GsheetAIAuto):
+    """GsheetAIAuto wired to the in-memory Sheets and Groq fakes."""
+
+    def __init__(self, sheets: FakeSheetsClient, groq: FakeGroq):
+        super().__init__()
+        self.sheets = sheets
+        self.groq = groq
+
+    def create_client(self, credential):
+        return self.sheets
+
+    def create_groq_client(self, api_key: str):
+        return self.groq
+
+
+class StageRecorder:
+    """Wraps methods of an object so every call is attributed to a stage."""
+
+    def __init__(self, sheets: FakeSheetsClient, groq: FakeGroq):
+        self.sheets = sheets
+        self.groq = groq
+        self.depth = 0
+        self.peak_memory = 0
+        self.stages = defaultdict(lambda: defaultdict(int))
+
+    def counters(self):
+        sheet_stats = [spreadsheet.stats() for spreadsheet in self.sheets.spreadsheets.values()]
+        return {
+            "sheets_api_calls": sum(stats["api_calls"] for stats in sheet_stats),
+            "cells_read": sum(stats["cells_read"] for stats in sheet_stats),
+            "cells_written": sum(stats["cells_written"] for stats in sheet_stats),
+            "groq_requests": self.groq.stats["requests"],
+            "prompt_tokens": self.groq.stats["prompt_tokens"],
+            "completion_tokens": self.groq.stats["completion_tokens"],
+        }
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        outermost = self.depth == 0
+        self.depth += 1
+        before = self.counters()
+        if outermost:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.depth -= 1
+            record = self.stages[name]
+            record["calls"] += 1
+            record["seconds"] += elapsed
+            for key, value in self.counters().items():
+                record[key] += value - before[key]
+            if outermost:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.peak_memory = max(self.peak_memory, peak)
+                record["peak_memory_bytes"] = max(record["peak_memory_bytes"], peak - baseline)
+
+    def wrap(self, obj, name: str):
+        method = getattr(obj, name)
+
+        if inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                generator = method(*args, **kwargs)
+                while True:
+                    with self.stage(name):
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                    yield item
+        else:
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return method(*args, **kwargs)
+
+        setattr(obj, name, wrapper)
+
+    def report(self):
+        return {name: {"peak_memory_bytes": None, **record} for name, record in self.stages.items()}
+
+
+def run(rows: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "reviews.csv")
+        make_dataset(csv_path, rows)
+        overrides = {
+            "csv_path": csv_path, "sheet_id": "bench", "creds": None, "GROQ_API_KEY": "offline",
+            "GROQ_RPM": args.groq_rpm or 100_000, "GROQ_TPM": 100_000_000,
+            "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite"),
+            "WATERMARK_PATH": os.path.join(workdir, "watermark.json"),
+            "AGGREGATE_PATH": os.path.join(workdir, "sentiment_aggregate.sqlite"),
+            "ROW_INDEX_DIR": os.path.join(workdir, "row_index"),
+            "JOURNAL_PATH": os.path.join(workdir, "ai_journal.jsonl"),
+        }
+        saved = {key: settings.__dict__[key] for key in overrides if key in settings.__dict__}
+        settings.__dict__.update(overrides)
+
+        quota = FakeSheetsQuota(fail_every=args.sheets_fail_every) if args.sheets_fail_every else None
+        sheets = FakeSheetsClient(latency=args.sheets_latency, quota=quota)
+        groq = FakeGroq(latency=args.groq_latency, requests_per_minute=args.groq_rpm,
+                        failure_rate=args.failure_rate)
+        gsheetauto = OfflineGsheetAIAuto(sheets, groq)
+        revana = ReviewAnalysis(headless=True, output_dir=workdir, verbose=False)
+        recorder = StageRecorder(sheets, groq)
+        for name in STAGES:
+            recorder.wrap(gsheetauto, name)
+        recorder.wrap(revana, "analyze_sentiment_aggregate")
+
+        metrics.reset()
+        metrics.enable()
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                etl.main(gsheetauto, revana, no_of_rows=rows)
+        finally:
+            wall = time.perf_counter() - started
+            recorder.peak_memory = max(recorder.peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            metrics.disable()
+            for key in overrides:
+                settings.__dict__.pop(key, None)
+            settings.__dict__.update(saved)
+
+        totals = {**recorder.counters(), "peak_memory_bytes": recorder.peak_memory}
+        return {"rows": rows, "wall_seconds": wall, "totals": totals, "stages": recorder.report(),
+                "parse_metrics": gsheetauto.parse_metrics.summary(), "groq": dict(groq.stats),
+                "metrics": metrics.summary()["stages"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 2000, 10000])
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--groq-latency", type=float, default=0.05)
+    parser.add_argument("--sheets-latency", type=float, default=0.0)
+    parser.add_argument("--sheets-fail-every", type=int, default=None, help="fail every Nth write to the fake Sheets with a 503")
+    parser.add_argument("--groq-rpm", type=float, default=None, help="throttle the fake Groq to this many requests/min")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    results = []
+    print(f"{'rows':>7} {'wall s':>8} {'sheet calls':>11} {'cells out':>10} {'cells in':>10} "
+          f"{'groq req':>9} {'tokens':>9} {'peak MB':>8}")
+    for rows in args.sizes:
+        result = run(rows, args)
+        results.append(result)
+        totals = result["totals"]
+        print(f"{rows:>7} {result['wall_seconds']:>8.2f} {totals['sheets_api_calls']:>11.0f} "
+              f"{totals['cells_written']:>10.0f} {totals['cells_read']:>10.0f} {totals['groq_requests']:>9.0f} "
+              f"{totals['prompt_tokens'] + totals['completion_tokens']:>9.0f} "
+              f"{totals['peak_memory_bytes'] / 2 ** 20:>8.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark of GsheetAIAuto.process_stg_data against the previous per-column loop.
+
+    python benchmarks/bench_staging.py [rows ...]
+
+The legacy numbers use the old implementation: a defensive copy, one
+.str.strip().str.lower() per object column and values.tolist() at the end.
+"""
+import sys, os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.utils import GsheetAIAuto
+
+
+def make_raw_frame(rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    texts = np.array(["  Love this dress! ", "Runs SMALL, order up", "Great fit ", "meh", ""], dtype=object)
+    return pd.DataFrame({
+        "Clothing ID": rng.integers(0, 1200, rows),
+        "Age": rng.integers(18, 90, rows),
+        "Title": texts[rng.integers(0, len(texts), rows)],
+        "Review Text": texts[rng.integers(0, len(texts), rows)],
+        "Rating": rng.integers(1, 6, rows),
+        "Recommended IND": rng.integers(0, 2, rows),
+        "Positive Feedback Count": rng.integers(0, 50, rows),
+        "Division Name": np.array(["General", "General Petite", "Initmates"], dtype=object)[rng.integers(0, 3, rows)],
+        "Department Name": np.array(["Tops", "Dresses", "Bottoms"], dtype=object)[rng.integers(0, 3, rows)],
+        "Class Name": np.array(["Knits", "Dresses", "Pants", "Blouses"], dtype=object)[rng.integers(0, 4, rows)],
+        "id": np.arange(1, rows + 1),
+    })
+
+
+def legacy_process_stg_data(df: pd.DataFrame):
+    staging_df = df.copy()
+    staging_df.columns = [col.replace(' ', '_').lower().strip() for col in staging_df.columns]
+    for col in staging_df.select_dtypes(include=['object']).columns:
+        staging_df[col] = staging_df[col].str.strip().str.lower()
+    return staging_df.values.tolist()
+
+
+def best_of(fn, make_input, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        data = make_input()
+        started = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(sizes):
+    logging.disable(logging.INFO)
+    gsheetauto = GsheetAIAuto()
+    print(f"{'rows':>8} {'legacy s':>10} {'records s':>10} {'columnar s':>11} {'speedup':>8}")
+    for rows in sizes:
+        raw = make_raw_frame(rows)
+        legacy = best_of(legacy_process_stg_data, lambda: raw)
+        records = best_of(gsheetauto.process_stg_data, lambda: raw)
+        # columnar with ownership handed over, as pull_gsheet_data_to_df does
+        columnar = best_of(lambda df: gsheetauto.process_stg_data(df, copy=False, columnar=True), raw.copy)
+        print(f"{rows:>8} {legacy:>10.4f} {records:>10.4f} {columnar:>11.4f} {legacy / columnar:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [200, 20_000, 200_000])
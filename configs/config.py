@@ -1,33 +1,170 @@
-import ast
 import os
-from dotenv import load_dotenv, dotenv_values
-
-from google.oauth2.service_account import Credentials
-
-
-load_dotenv()
-
+from functools import cached_property
 
 
 #SCOPES = os.getenv('SCOPES')
 
-#SCOPES = ast.literal_eval(SCOPES) 
+#SCOPES = ast.literal_eval(SCOPES)
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive.readonly"]
-sheet_id = os.getenv('sheet_id')
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-CRED_FILE = os.path.join(BASE_DIR, r"configs\credentials.json")
-
-creds =  Credentials.from_service_account_file(CRED_FILE, scopes=SCOPES)
-
-csv_path = os.getenv('csv_path')
-GROQ_API_KEY = os.getenv('GROQ_API_KEY')
-#print(creds)
-#print(creds.valid)
-
-
-#print(SCOPES)sss
-
 
+class Settings:
+    """
+    Project settings, evaluated lazily.
+
+    Nothing is read when the module is imported: the .env file is loaded on
+    the first setting that is accessed, and the service account credentials
+    (with the google-auth import) only when `creds` is first used.
+    Every value is computed once and then cached on the instance.
+    """
+
+    def __init__(self):
+        self._env_loaded = False
+
+    def _env(self, name: str, default: str = None):
+        if not self._env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            self._env_loaded = True
+        return os.getenv(name, default)
+
+    @cached_property
+    def sheet_id(self):
+        return self._env('sheet_id')
+
+    @cached_property
+    def csv_path(self):
+        return self._env('csv_path')
+
+    @cached_property
+    def GROQ_API_KEY(self):
+        return self._env('GROQ_API_KEY')
+
+    @cached_property
+    def CRED_FILE(self):
+        return self._env('CREDS_PATH', os.path.join(BASE_DIR, "configs", "credentials.json"))
+
+    @cached_property
+    def creds(self):
+        from google.oauth2.service_account import Credentials
+        return Credentials.from_service_account_file(self.CRED_FILE, scopes=SCOPES)
+
+    @cached_property
+    def READ_CHUNK_ROWS(self):
+        # rows read from the csv and uploaded per batch
+        return int(self._env('READ_CHUNK_ROWS', '5000'))
+
+    @cached_property
+    def GROQ_MAX_WORKERS(self):
+        # number of Groq batches allowed in flight at once
+        return int(self._env('GROQ_MAX_WORKERS', '1'))
+
+    @cached_property
+    def GROQ_RPM(self):
+        # Groq requests-per-minute budget
+        return float(self._env('GROQ_RPM', '30'))
+
+    @cached_property
+    def GROQ_TPM(self):
+        # Groq tokens-per-minute budget
+        return float(self._env('GROQ_TPM', '8000'))
+
+    @cached_property
+    def DEDUP_NEAR_THRESHOLD(self):
+        # similarity at which near-duplicate reviews share one Groq result, unset only merges exact duplicates
+        threshold = self._env('DEDUP_NEAR_THRESHOLD')
+        return float(threshold) if threshold else None
+
+    @cached_property
+    def PRE_CLASSIFIER(self):
+        # local sentiment decision before Groq: "none", "rules" (rating + word list) or "logistic"
+        kind = self._env('PRE_CLASSIFIER', 'none')
+        if kind not in ('none', 'rules', 'logistic'):
+            raise ValueError(f"Unknown PRE_CLASSIFIER '{kind}'.")
+        return kind
+
+    @cached_property
+    def PRE_CLASSIFIER_THRESHOLD(self):
+        # lowest confidence the pre-classifier decides a row at, the others go to Groq
+        return float(self._env('PRE_CLASSIFIER_THRESHOLD', '0.9'))
+
+    @cached_property
+    def PRE_CLASSIFIER_MODEL_PATH(self):
+        # weights of the logistic pre-classifier, trained from the processed rows when missing
+        return self._env('PRE_CLASSIFIER_MODEL_PATH', os.path.join(BASE_DIR, 'data', 'pre_classifier.npz'))
+
+    @cached_property
+    def PIPELINE_MODE(self):
+        # "memory" keeps the DataFrames between stages, "sheets" reads each stage back from its sheet
+        return self._env('PIPELINE_MODE', 'memory')
+
+    @cached_property
+    def STORAGE_BACKEND(self):
+        # "sheets" works on the worksheets directly, "parquet"/"sqlite" on a local mirror
+        backend = self._env('STORAGE_BACKEND', 'sheets')
+        if backend not in ('sheets', 'parquet', 'sqlite'):
+            raise ValueError(f"Unknown STORAGE_BACKEND '{backend}'.")
+        return backend
+
+    @cached_property
+    def STORAGE_DIR(self):
+        # folder of the local mirror tables
+        return self._env('STORAGE_DIR', os.path.join(BASE_DIR, 'data', 'mirror'))
+
+    @cached_property
+    def PUBLISH_TO_SHEETS(self):
+        # with a local backend, push the mirror tables to the worksheets at the end of the run
+        return self._env('PUBLISH_TO_SHEETS', 'true').lower() in ('1', 'true', 'yes')
+
+    @cached_property
+    def LLM_CACHE_PATH(self):
+        # on-disk cache of Groq summaries and sentiments
+        return self._env('LLM_CACHE_PATH', os.path.join(BASE_DIR, 'data', 'llm_cache.sqlite'))
+
+    @cached_property
+    def WATERMARK_PATH(self):
+        # ids and content hashes of the staging rows that already went through the AI stage
+        return self._env('WATERMARK_PATH', os.path.join(BASE_DIR, 'data', 'watermark.json'))
+
+    @cached_property
+    def JOURNAL_PATH(self):
+        # append-only journal of the AI results of the running batch, a rerun after a crash resumes from it
+        return self._env('JOURNAL_PATH', os.path.join(BASE_DIR, 'data', 'ai_journal.jsonl'))
+
+    @cached_property
+    def FLUSH_EVERY_ROWS(self):
+        # AI results are written to the processed table every this many rows, not only at the end
+        return int(self._env('FLUSH_EVERY_ROWS', '500'))
+
+    @cached_property
+    def ROW_INDEX_DIR(self):
+        # stable row ids and where every id sits on each worksheet
+        return self._env('ROW_INDEX_DIR', os.path.join(BASE_DIR, 'data', 'row_index'))
+
+    @cached_property
+    def AGGREGATE_PATH(self):
+        # running per-class sentiment counts of the processed rows
+        return self._env('AGGREGATE_PATH', os.path.join(BASE_DIR, 'data', 'sentiment_aggregate.sqlite'))
+
+    @cached_property
+    def REPORT_DIR(self):
+        # folder the analysis charts are saved to
+        return self._env('REPORT_DIR', os.path.join(BASE_DIR, 'reports'))
+
+    @cached_property
+    def METRICS_PATH(self):
+        # where the per-stage run metrics are written (*.prom for Prometheus text), unset disables them
+        return self._env('METRICS_PATH')
+
+
+settings = Settings()
+
+
+def __getattr__(name):
+    # keeps `from configs.config import creds` working; the value is resolved on that access
+    if isinstance(getattr(Settings, name, None), cached_property):
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
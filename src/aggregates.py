@@ -0,0 +1,136 @@
+import logging
+import sqlite3
+from collections import Counter, defaultdict
+from typing import Dict
+
+import pandas as pd
+
+from src.state_files import ensure_parent_dir
+from src.watermark import canonical_column
+
+logger = logging.getLogger(__name__)
+
+
+class SentimentAggregate:
+    """
+    Running per-class sentiment counts of the processed rows.
+
+    The counts are updated from the rows each run sends through the AI stage,
+    so a report never has to pull or re-group the whole processed sheet. The
+    class and sentiment every id was counted under are kept as well: a row
+    that is processed again is moved instead of being counted twice.
+
+    Both live in one SQLite file. The counts are small and loaded whole, the
+    per-row map is only looked up and written for the ids an update sees, so a
+    run costs as much as the rows it processed, not as much as the sheet.
+    Changes become durable together on save(), a crash before it loses them all.
+
+    Arguments:
+        path: SQLite file holding the state, created if missing (":memory:" works for tests)
+        class_column: column the counts are grouped by
+        sentiment_column: column holding the sentiment
+        id_column: row id column, in any of the staging/processed spellings
+    """
+
+    def __init__(self, path: str, class_column: str = "Class Name",
+                 sentiment_column: str = "AI Sentiment", id_column: str = "Id"):
+        if path != ":memory:":
+            ensure_parent_dir(path)
+        self.path = path
+        self.class_label, self.sentiment_label = class_column, sentiment_column
+        self.class_column = canonical_column(class_column)
+        self.sentiment_column = canonical_column(sentiment_column)
+        self.id_column = canonical_column(id_column)
+        self.counts: Dict[str, Counter] = defaultdict(Counter)
+
+        self._conn = sqlite3.connect(path)
+        # id -> class and sentiment it is counted under
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS counted_rows (
+                                  id TEXT PRIMARY KEY,
+                                  class_name TEXT NOT NULL,
+                                  sentiment TEXT NOT NULL)""")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS counts (
+                                  class_name TEXT NOT NULL,
+                                  sentiment TEXT NOT NULL,
+                                  n INTEGER NOT NULL,
+                                  PRIMARY KEY (class_name, sentiment))""")
+        self._conn.commit()
+        for class_name, sentiment, n in self._conn.execute("SELECT class_name, sentiment, n FROM counts"):
+            self.counts[class_name][sentiment] = n
+
+    def __len__(self):
+        # every counted row is in exactly one count
+        return sum(sum(counts.values()) for counts in self.counts.values())
+
+    def _counted(self, ids) -> Dict[str, list]:
+        """id -> [class, sentiment] of the ids that were counted before."""
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        # stay under SQLite's bound-parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT id, class_name, sentiment FROM counted_rows WHERE id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            found.update({row_id: [class_name, sentiment] for row_id, class_name, sentiment in rows})
+        return found
+
+    def update(self, df: pd.DataFrame) -> int:
+        """Count the rows of df, replacing what earlier updates counted for the same ids. Returns the rows moved."""
+        if df.empty:
+            return 0
+        canonical = df.rename(columns=canonical_column)
+        ids = canonical[self.id_column].astype(str).tolist()
+        classes = canonical[self.class_column].astype(str).tolist()
+        sentiments = canonical[self.sentiment_column].astype(str).tolist()
+
+        counted = self._counted(ids)
+        changed = {}
+        moved = 0
+        for row_id, class_name, sentiment in zip(ids, classes, sentiments):
+            previous = counted.get(row_id)
+            if previous is not None:
+                if previous == [class_name, sentiment]:
+                    continue
+                self._decrement(*previous)
+                moved += 1
+            self.counts[class_name][sentiment] += 1
+            counted[row_id] = changed[row_id] = [class_name, sentiment]
+        # written in the open transaction, save() commits them with the counts
+        self._conn.executemany("INSERT OR REPLACE INTO counted_rows (id, class_name, sentiment) VALUES (?, ?, ?)",
+                               [(row_id, class_name, sentiment) for row_id, (class_name, sentiment) in changed.items()])
+        logger.info("Sentiment aggregate updated with %s rows, %s moved", len(ids), moved)
+        return moved
+
+    def rebuild(self, df: pd.DataFrame):
+        """Start over from a full processed frame, e.g. when there is no saved state yet."""
+        self.counts = defaultdict(Counter)
+        self._conn.execute("DELETE FROM counted_rows")
+        self.update(df)
+
+    def _decrement(self, class_name: str, sentiment: str):
+        self.counts[class_name][sentiment] -= 1
+        if self.counts[class_name][sentiment] <= 0:
+            del self.counts[class_name][sentiment]
+        if not self.counts[class_name]:
+            del self.counts[class_name]
+
+    def counts_frame(self) -> pd.DataFrame:
+        """Class x sentiment counts, shaped like groupby([class, sentiment]).size().unstack(fill_value=0)."""
+        frame = pd.DataFrame.from_dict({name: dict(counts) for name, counts in self.counts.items()}, orient="index")
+        frame = frame.fillna(0).astype("int64").sort_index()
+        frame = frame[sorted(frame.columns)]
+        frame.index.name, frame.columns.name = self.class_label, self.sentiment_label
+        return frame
+
+    def save(self):
+        """Commit the rows counted since the last save together with the counts."""
+        self._conn.execute("DELETE FROM counts")
+        self._conn.executemany("INSERT INTO counts (class_name, sentiment, n) VALUES (?, ?, ?)",
+                               [(class_name, sentiment, n) for class_name, counts in self.counts.items()
+                                for sentiment, n in counts.items()])
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -1,8 +1,107 @@
 
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Sequence
+
 import pandas as pd
-import matplotlib.pyplot as plt
+
+from src.instrumentation import metrics
+
+if TYPE_CHECKING:
+    from src.aggregates import SentimentAggregate
 
 class ReviewAnalysis:
+    """
+    Sentiment analysis of the processed reviews.
+
+    Arguments:
+        headless: draw charts on an Agg canvas and save them to output_dir
+            instead of opening a window with plt.show()
+        output_dir: folder the chart files are written to in headless mode
+        formats: file formats written for every chart, e.g. ("png", "svg")
+        background: render charts on a worker thread; the result then holds
+            a Future under "charts" and wait() blocks until all are written
+        verbose: print the tables, otherwise results are only returned
+    """
+
+    def __init__(self, headless: bool = False, output_dir: str = "reports",
+                 formats: Sequence[str] = ("png",), background: bool = False,
+                 verbose: bool = True):
+        self.headless = headless
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        self.background = background
+        self.verbose = verbose
+        self._executor = None
+        self._pending: List[Future] = []
+
+    def _render_chart(self, sentiment_pct: pd.DataFrame, name: str) -> List[str]:
+        """Draw the bar chart on its own Agg figure and save it in every format, returns the paths."""
+        # matplotlib is only imported when a chart is drawn; a bare Figure keeps
+        # pyplot's global state (and any GUI backend) out of it, so it is thread safe
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(10, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        sentiment_pct.plot(kind="barh", ax=ax)
+        ax.set_title("Sentiment % by Clothing Class")
+        ax.set_xlabel("Percentage (%)")
+        ax.set_ylabel("Clothing Class")
+        ax.tick_params(axis="x", labelrotation=90)
+        fig.tight_layout()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = []
+        for fmt in self.formats:
+            path = os.path.join(self.output_dir, f"{name}.{fmt}")
+            fig.savefig(path, format=fmt)
+            paths.append(path)
+        return paths
+
+    def _show_chart(self, sentiment_pct: pd.DataFrame):
+        import matplotlib.pyplot as plt
+        sentiment_pct.plot(kind="barh", figsize=(10, 6))
+        plt.title("Sentiment % by Clothing Class")
+        plt.xlabel("Percentage (%)")
+        plt.ylabel("Clothing Class")
+        plt.xticks(rotation=90, ha="right")
+        plt.tight_layout()
+        plt.show()
+
+    def chart(self, sentiment_pct: pd.DataFrame, name: str = "sentiment_by_class"):
+        """
+        Show or save the chart, depending on the mode.
+        Returns the written paths, a Future of them in background mode, or None when shown.
+        """
+        if not self.headless:
+            self._show_chart(sentiment_pct)
+            return None
+        if not self.background:
+            return self._render_chart(sentiment_pct, name)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+        # the worker gets its own copy, the caller may keep changing the frame
+        future = self._executor.submit(self._render_chart, sentiment_pct.copy(), name)
+        self._pending.append(future)
+        return future
+
+    def wait(self) -> List[str]:
+        """Block until every background chart is written, returns all their paths."""
+        paths = []
+        for future in self._pending:
+            paths.extend(future.result())
+        self._pending = []
+        return paths
+
+    def close(self):
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @metrics.instrument()
     def analyze_sentiment_by_class(self, df: pd.DataFrame,
                 class_column: str = "Class Name",
                 sentiment_column: str = "AI Sentiment"
@@ -16,25 +115,63 @@ class ReviewAnalysis:
             # checks it the class column exists
             if class_column not in df.columns or sentiment_column not in df.columns:
                 raise ValueError("Column name not found in dataframe")
+            metrics.add("analyze_sentiment_by_class", rows=len(df))
 
             # Group the dataframe by the Cloth class name and Sentiment
             sentiment_counts = df.groupby([class_column, sentiment_column]).size().unstack(fill_value=0)
 
+            return self.report_sentiment_counts(sentiment_counts)
+
+    @metrics.instrument()
+    def analyze_sentiment_aggregate(self, aggregate: "SentimentAggregate"):
+            """
+            Same report as analyze_sentiment_by_class, served from the running
+            counts of a SentimentAggregate instead of grouping every processed row.
+            """
+            return self.report_sentiment_counts(aggregate.counts_frame())
+
+    @metrics.instrument()
+    def analyze_sentiment_by_dimensions(self, df: pd.DataFrame, dimensions: Sequence[str] = None,
+                                        sentiment: str = "negative", k: int = 5, min_total: int = 1):
+            """
+            Sentiment crosstabs for every dimension (class, department, division,
+            rating band, age band, recommended, clothing id) found in df, with the
+            top-k and bottom-k values of each by the share of `sentiment`.
+            """
+            from src.analytics import SentimentCrosstabs
+
+            metrics.add("analyze_sentiment_by_dimensions", rows=len(df))
+            engine = SentimentCrosstabs()
+            crosstabs = engine.compute(df, dimensions)
+            rankings = engine.rankings(crosstabs, sentiment, k, min_total)
+
+            if self.verbose:
+                for name, ranking in rankings.items():
+                    print(f"\n=== Highest {sentiment.upper()} share by {name} ===")
+                    print(ranking["top"].round(2))
+
+            return {"crosstabs": crosstabs, "rankings": rankings}
+
+    def report_sentiment_counts(self, sentiment_counts: pd.DataFrame):
+            """
+            Percentages, highest classes and chart from a class x sentiment count table.
+            """
             # Convert count to percentages
             sentiment_pct = sentiment_counts.div(sentiment_counts.sum(axis=1), axis=0) * 100
 
-            print("\n=== Sentiment Percentage Breakdown per Clothing Class ===")
-            print(sentiment_pct.round(2))
+            if self.verbose:
+                print("\n=== Sentiment Percentage Breakdown per Clothing Class ===")
+                print(sentiment_pct.round(2))
 
             # check the index with maximum value for each sentiment  types
             if "positive" in sentiment_pct.columns:
                 highest_positive = sentiment_pct["positive"].idxmax()
             else:
-                highest_neutral = None
+                highest_positive = None
             if "negative" in sentiment_pct.columns:
                 highest_negative = sentiment_pct["negative"].idxmax()
             else:
-                highest_neutral = None
+                highest_negative = None
 
             if "neutral" in sentiment_pct.columns:
                 highest_neutral = sentiment_pct["neutral"].idxmax()
@@ -45,19 +182,16 @@ class ReviewAnalysis:
             # highest_negative = sentiment_pct["negative"].idxmax()
             # highest_neutral = sentiment_pct["neutral"].idxmax()
 
-            print("\n=== Highest Sentiment Classes ===")
-            print(f"Highest POSITIVE sentiment: {highest_positive} ({sentiment_pct.loc[highest_positive, 'positive']:.2f}%)")
-            print(f"Highest NEGATIVE sentiment: {highest_negative} ({sentiment_pct.loc[highest_negative, 'negative']:.2f}%)")
-            print(f"Highest NEUTRAL sentiment:  {highest_neutral} ({sentiment_pct.loc[highest_neutral, 'neutral']:.2f}%)")
+            if self.verbose:
+                print("\n=== Highest Sentiment Classes ===")
+                for label, sentiment, highest in (("POSITIVE", "positive", highest_positive),
+                                                  ("NEGATIVE", "negative", highest_negative),
+                                                  ("NEUTRAL", "neutral", highest_neutral)):
+                    if highest is not None:
+                        print(f"Highest {label} sentiment: {highest} ({sentiment_pct.loc[highest, sentiment]:.2f}%)")
 
-            # plot a vertical barchart
-            sentiment_pct.plot(kind="barh", figsize=(10, 6))
-            plt.title("Sentiment % by Clothing Class")
-            plt.xlabel("Percentage (%)")
-            plt.ylabel("Clothing Class")
-            plt.xticks(rotation=90, ha="right")
-            plt.tight_layout()
-            plt.show()
+            # plot a vertical barchart, or save it when running headless
+            charts = self.chart(sentiment_pct)
 
             #return a dictionary of results
 
@@ -66,4 +200,5 @@ class ReviewAnalysis:
                 "highest_positive": highest_positive,
                 "highest_negative": highest_negative,
                 "highest_neutral": highest_neutral,
+                "charts": charts,
             }
@@ -0,0 +1,128 @@
+from typing import Callable, Dict, Iterable, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.llm_output import SENTIMENTS
+from src.watermark import canonical_column
+
+AGE_BANDS = (("under 25", 25), ("25-34", 35), ("35-44", 45), ("45-54", 55), ("55-64", 65), ("65+", np.inf))
+RATING_BANDS = (("low (1-2)", 3), ("mid (3)", 4), ("high (4-5)", np.inf))
+
+
+def band(values: pd.Series, bands: Sequence[Tuple[str, float]]) -> pd.Categorical:
+    """Bucket numbers into ordered labels; each band holds values below its upper bound."""
+    numbers = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    labels = [label for label, _ in bands]
+    codes = np.searchsorted([upper for _, upper in bands], numbers, side="right")
+    codes[np.isnan(numbers)] = -1
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+
+# dimension name -> (source column, optional transform), columns in the canonical spelling
+DIMENSIONS: Dict[str, Tuple[str, Callable]] = {
+    "Class Name": ("class_name", None),
+    "Department Name": ("department_name", None),
+    "Division Name": ("division_name", None),
+    "Rating Band": ("rating", lambda values: band(values, RATING_BANDS)),
+    "Age Band": ("age", lambda values: band(values, AGE_BANDS)),
+    "Recommended IND": ("recommended_ind", None),
+    "Clothing ID": ("clothing_id", None),
+}
+
+
+class SentimentCrosstabs:
+    """
+    Sentiment crosstabs for many dimensions at once.
+
+    Every dimension is turned into integer category codes, and the
+    (dimension, value, sentiment) cells of all dimensions are counted with a
+    single np.bincount, instead of one groupby().size().unstack() per dimension.
+
+    Arguments:
+        sentiment_column: column holding the sentiment, in any spelling
+        sentiments: sentiment labels counted; other values are ignored
+        dimensions: dimension name -> (source column, transform) specs
+    """
+
+    def __init__(self, sentiment_column: str = "AI Sentiment", sentiments: Sequence[str] = SENTIMENTS,
+                 dimensions: Dict[str, Tuple[str, Callable]] = None):
+        self.sentiment_column = canonical_column(sentiment_column)
+        self.sentiments = list(sentiments)
+        self.dimensions = DIMENSIONS if dimensions is None else dimensions
+
+    def _codes(self, values: pd.Series, transform: Callable) -> Tuple[np.ndarray, pd.Index]:
+        if transform is not None:
+            values = transform(values)
+        if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+            categorical = pd.Categorical(values)
+            return np.asarray(categorical.codes, dtype=np.int64), pd.Index(categorical.categories)
+        codes, uniques = pd.factorize(values, sort=True)
+        return codes.astype(np.int64), pd.Index(uniques)
+
+    def compute(self, df: pd.DataFrame, dimensions: Iterable[str] = None) -> Dict[str, pd.DataFrame]:
+        """
+        Count sentiments per value of every dimension found in df.
+
+        Returns {dimension: DataFrame} with one row per value, one count column
+        per sentiment plus "total", sorted like the dimension's categories.
+        Dimensions whose source column is missing are skipped.
+        """
+        columns = {canonical_column(col): col for col in df.columns}
+        if self.sentiment_column not in columns:
+            raise ValueError("Column name not found in dataframe")
+        # normalize each distinct sentiment once, then map the codes back onto the rows
+        codes, uniques = pd.factorize(df[columns[self.sentiment_column]])
+        normalized = pd.Index(uniques.astype(str)).str.strip().str.lower()
+        # the extra -1 at the end catches codes[i] == -1 (missing sentiment)
+        lookup = np.append(pd.Index(self.sentiments).get_indexer(normalized), -1)
+        sentiment_codes = lookup[codes].astype(np.int64)
+        width = len(self.sentiments)
+
+        names, indexes, flat, offset = [], [], [], 0
+        for name in dimensions or self.dimensions:
+            source, transform = self.dimensions[name]
+            if source not in columns:
+                continue
+            codes, index = self._codes(df[columns[source]], transform)
+            valid = (codes >= 0) & (sentiment_codes >= 0)
+            flat.append(offset + codes[valid] * width + sentiment_codes[valid])
+            names.append(name)
+            indexes.append(index)
+            offset += len(index) * width
+
+        counts = np.bincount(np.concatenate(flat), minlength=offset) if flat else np.zeros(0, dtype=np.int64)
+
+        crosstabs, start = {}, 0
+        for name, index in zip(names, indexes):
+            block = counts[start:start + len(index) * width].reshape(len(index), width)
+            start += len(index) * width
+            frame = pd.DataFrame(block, index=index.rename(name),
+                                 columns=pd.Index(self.sentiments, name="AI Sentiment"))
+            frame["total"] = block.sum(axis=1)
+            crosstabs[name] = frame[frame["total"] > 0]
+        return crosstabs
+
+    @staticmethod
+    def percentages(crosstab: pd.DataFrame) -> pd.DataFrame:
+        """Share of every sentiment per row, in percent."""
+        counts = crosstab.drop(columns="total")
+        return counts.div(crosstab["total"].where(crosstab["total"] > 0), axis=0) * 100
+
+    def rank(self, crosstab: pd.DataFrame, sentiment: str = "negative", k: int = 5,
+             min_total: int = 1, bottom: bool = False) -> pd.DataFrame:
+        """
+        Top-k (or bottom-k) values of one crosstab by the share of `sentiment`,
+        among values with at least min_total reviews. Ties go to the larger total.
+        """
+        share = f"{sentiment} %"
+        ranked = crosstab.assign(**{share: self.percentages(crosstab)[sentiment]})
+        ranked = ranked[ranked["total"] >= min_total]
+        return ranked.sort_values([share, "total"], ascending=[bottom, False], kind="stable").head(k)
+
+    def rankings(self, crosstabs: Dict[str, pd.DataFrame], sentiment: str = "negative", k: int = 5,
+                 min_total: int = 1) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """{dimension: {"top": DataFrame, "bottom": DataFrame}} for every crosstab."""
+        return {name: {"top": self.rank(crosstab, sentiment, k, min_total),
+                       "bottom": self.rank(crosstab, sentiment, k, min_total, bottom=True)}
+                for name, crosstab in crosstabs.items()}
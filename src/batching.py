@@ -0,0 +1,95 @@
+import math
+import threading
+from typing import Dict, Iterator
+
+import pandas as pd
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate, about 4 characters per token for English text."""
+    return max(1, math.ceil(len(text) / 4))
+
+
+class BatchPlanner:
+    """
+    Packs reviews into Groq requests by estimated token size instead of a fixed count.
+
+    Each batch is filled until its prompt plus expected completion reaches
+    target_tokens. A truncated response (finish_reason == "length") halves the
+    budget for the next batches; responses that leave plenty of completion
+    headroom grow it back step by step.
+
+    Arguments:
+        target_tokens: prompt + completion tokens aimed for per request
+        prompt_overhead: tokens of the system prompt and JSON framing
+        completion_overhead: completion tokens spent regardless of batch size
+            (reasoning, JSON wrapper)
+        tokens_per_summary: expected completion tokens for one review's result
+        max_completion_tokens: hard cap for max_completion_tokens of a request
+        min_batch, max_batch: bounds on reviews per request
+    """
+
+    def __init__(self, target_tokens: int = 4000, prompt_overhead: int = 200,
+                 completion_overhead: int = 256, tokens_per_summary: int = 60,
+                 max_completion_tokens: int = 8192, min_batch: int = 1, max_batch: int = 50):
+        self.target_tokens = target_tokens
+        self.prompt_overhead = prompt_overhead
+        self.completion_overhead = completion_overhead
+        self.tokens_per_summary = tokens_per_summary
+        self.max_completion_tokens = max_completion_tokens
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.scale = 1.0
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "reviews": 0, "truncated": 0, "shrinks": 0, "grows": 0}
+
+    def item_tokens(self, review: str) -> int:
+        # the review in the prompt, plus its id/json framing, plus its answer
+        return estimate_tokens(review) + 10 + self.tokens_per_summary
+
+    def completion_budget(self, count: int) -> int:
+        """max_completion_tokens for a request carrying `count` reviews, with 50% slack."""
+        expected = self.completion_overhead + self.tokens_per_summary * count
+        return min(self.max_completion_tokens, int(expected * 1.5))
+
+    def plan(self, reviews: pd.Series) -> Iterator[pd.Series]:
+        """
+        Yield consecutive slices of reviews. Batches are cut lazily, so feedback
+        from record() changes the size of the batches that follow.
+        """
+        start = 0
+        texts = reviews.tolist()
+        while start < len(texts):
+            with self._lock:
+                budget = self.target_tokens * self.scale - self.prompt_overhead - self.completion_overhead
+                max_batch = max(self.min_batch, int(self.max_batch * min(1.0, self.scale)))
+            end, used = start, 0
+            while end < len(texts) and end - start < max_batch:
+                cost = self.item_tokens(texts[end])
+                if end - start >= self.min_batch and used + cost > budget:
+                    break
+                used += cost
+                end += 1
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["reviews"] += end - start
+            yield reviews.iloc[start:end]
+            start = end
+
+    def record(self, finish_reason: str, completion_tokens: int = None, max_completion_tokens: int = None):
+        """Feed back how a request ended, to shrink or grow the next batches."""
+        with self._lock:
+            if finish_reason == "length":
+                self.stats["truncated"] += 1
+                self.stats["shrinks"] += 1
+                self.scale = max(0.125, self.scale / 2)
+            elif (self.scale < 2.0 and completion_tokens is not None and max_completion_tokens
+                  and completion_tokens < 0.5 * max_completion_tokens):
+                self.stats["grows"] += 1
+                self.scale = min(2.0, self.scale * 1.25)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            reviews = self.stats["reviews"]
+            return {**self.stats, "scale": self.scale,
+                    "requests_per_1k_reviews": 1000 * self.stats["batches"] / reviews if reviews else 0.0}
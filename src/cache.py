@@ -0,0 +1,113 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Tuple
+
+from src.state_files import ensure_parent_dir
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewCache:
+    """
+    On-disk SQLite cache of Groq results, keyed by the content of the review.
+
+    Arguments:
+        path: SQLite file, created if missing (":memory:" works for tests);
+            several processes can share it, it is opened in WAL mode and
+            writers wait busy_timeout seconds for each other
+        busy_timeout: seconds a write waits for the lock of another process
+        max_entries: keep at most this many entries, least recently used go first
+        max_age_seconds: entries older than this are dropped on evict()
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000, max_age_seconds: float = 30 * 24 * 3600,
+                 busy_timeout: float = 30.0):
+        if path != ":memory:":
+            ensure_parent_dir(path)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        if path != ":memory:":
+            # readers never block the writer of another process, e.g. the shards of a run
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_results (
+                   key TEXT PRIMARY KEY,
+                   summary TEXT NOT NULL,
+                   sentiment TEXT NOT NULL,
+                   created_at REAL NOT NULL,
+                   last_used REAL NOT NULL)"""
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(review: str, model: str, prompt_version: str) -> str:
+        """Hash of the normalized review text, the model and the prompt version."""
+        normalized = " ".join(str(review).lower().split())
+        return hashlib.sha256(f"{model}\x1f{prompt_version}\x1f{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """Return {key: {"summary", "sentiment"}} for the keys found in the cache."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, summary, sentiment FROM llm_results WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                found.update({key: {"summary": summary, "sentiment": sentiment} for key, summary, sentiment in rows})
+            if found:
+                self._conn.executemany("UPDATE llm_results SET last_used = ? WHERE key = ?",
+                                       [(time.time(), key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, str, str]]):
+        """Store (key, summary, sentiment) tuples."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO llm_results VALUES (?, ?, ?, ?, ?)",
+                [(key, summary, sentiment, now, now) for key, summary, sentiment in items],
+            )
+            self._conn.commit()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        with self._lock:
+            removed = 0
+            if self.max_age_seconds is not None:
+                removed += self._conn.execute("DELETE FROM llm_results WHERE created_at < ?",
+                                              (time.time() - self.max_age_seconds,)).rowcount
+            if self.max_entries is not None:
+                removed += self._conn.execute(
+                    """DELETE FROM llm_results WHERE key NOT IN (
+                           SELECT key FROM llm_results ORDER BY last_used DESC LIMIT ?)""",
+                    (self.max_entries,),
+                ).rowcount
+            self._conn.commit()
+        if removed:
+            logger.info("Evicted %s cached Groq results", removed)
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_results").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def close(self):
+        self._conn.close()
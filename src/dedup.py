@@ -0,0 +1,152 @@
+import logging
+import re
+import zlib
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 2**31 - 1, so a * x + b stays inside 64 bits for 32-bit shingle hashes
+_PRIME = (1 << 31) - 1
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_review(text) -> str:
+    """Lowercase, drop punctuation and collapse whitespace: "Love it!!" and "love  it" match."""
+    return " ".join(_PUNCTUATION.sub(" ", str(text).lower()).split())
+
+
+class ReviewDeduplicator:
+    """
+    Groups reviews that would get the same answer, so only one representative
+    per group is sent to the LLM and its result is copied to the others.
+
+    Exact duplicates are matched on the normalized text. With near_threshold
+    set, the remaining texts are also grouped by MinHash signatures of their
+    character shingles, banded into an LSH index: texts whose estimated
+    Jaccard similarity reaches near_threshold fall into one group.
+
+    Arguments:
+        near_threshold: estimated Jaccard similarity for near-duplicates, None
+            only matches exact duplicates
+        num_perm: MinHash permutations per signature
+        bands: LSH bands, num_perm must be a multiple of it
+        shingle_size: characters per shingle
+        seed: seed of the hash permutations
+    """
+
+    def __init__(self, near_threshold: float = None, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 3, seed: int = 0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands.")
+        self.near_threshold = near_threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.int64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.int64)
+        self.stats = {"rows": 0, "groups": 0, "exact_duplicates": 0, "near_duplicates": 0, "calls_saved": 0}
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        size = self.shingle_size
+        shingles = {text[i:i + size] for i in range(max(1, len(text) - size + 1))}
+        return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                           dtype=np.int64, count=len(shingles))
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the character shingles of a normalized text."""
+        return self.signatures([text])[0]
+
+    def signatures(self, texts: List[str], chunk_shingles: int = 200_000) -> np.ndarray:
+        """
+        MinHash signatures of many texts, one row per text. The shingles of a
+        chunk of texts are hashed together and reduced per text with minimum.reduceat.
+        """
+        hashes = [self._shingle_hashes(text) for text in texts]
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.int64)
+        start = 0
+        while start < len(texts):
+            stop, total = start, 0
+            while stop < len(texts) and (stop == start or total + len(hashes[stop]) <= chunk_shingles):
+                total += len(hashes[stop])
+                stop += 1
+            chunk = np.concatenate(hashes[start:stop])
+            offsets = np.cumsum([0] + [len(h) for h in hashes[start:stop - 1]])
+            permuted = (self._a[:, None] * chunk[None, :] + self._b[:, None]) % _PRIME
+            signatures[start:stop] = np.minimum.reduceat(permuted, offsets, axis=1).T
+            start = stop
+        return signatures
+
+    def representatives(self, reviews: pd.Series) -> pd.Series:
+        """
+        For every review, the index label of the review representing its group.
+        The representative of a group is its first review, and maps to itself.
+        """
+        normalized = reviews.map(normalize_review)
+        # exact duplicates: every row points at the first row with the same normalized text
+        codes, _ = pd.factorize(normalized)
+        _, first_row = np.unique(codes, return_index=True)
+        representative = pd.Series(reviews.index.to_numpy()[first_row[codes]], index=reviews.index)
+        unique = representative[representative.index == representative.to_numpy()]
+        exact = len(reviews) - len(unique)
+
+        near = 0
+        if self.near_threshold is not None and len(unique) > 1:
+            merged = self._near_groups(normalized.loc[unique.index])
+            if merged:
+                representative = representative.map(lambda label: merged.get(label, label))
+                near = len(merged)
+
+        groups = int((representative.index == representative.to_numpy()).sum())
+        self.stats["rows"] += len(reviews)
+        self.stats["groups"] += groups
+        self.stats["exact_duplicates"] += exact
+        self.stats["near_duplicates"] += near
+        logger.info("%s reviews in %s groups: %s exact and %s near duplicates",
+                    len(reviews), groups, exact, near)
+        return representative
+
+    def _near_groups(self, texts: pd.Series) -> Dict:
+        """{label: representative label} for the texts merged into an earlier, similar text."""
+        labels = texts.index.tolist()
+        signatures = self.signatures(texts.tolist())
+        rows = self.num_perm // self.bands
+
+        parent = list(range(len(labels)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        # one int64 per band and text; collisions only cost an extra confirmation
+        mix = np.random.default_rng(len(labels)).integers(1, _PRIME, rows, dtype=np.int64)
+        band_keys = (signatures.reshape(len(labels), self.bands, rows) * mix).sum(axis=2)
+        for band in range(self.bands):
+            order = np.argsort(band_keys[:, band], kind="stable")
+            keys = band_keys[order, band]
+            # runs of equal keys with more than one text are the candidate buckets
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            sizes = np.diff(np.r_[starts, len(keys)])
+            for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                members = order[start:start + size].tolist()
+                for other in members[1:]:
+                    head, root = find(members[0]), find(other)
+                    if head == root:
+                        continue
+                    # candidates from one band are confirmed on the whole signature
+                    if (signatures[members[0]] == signatures[other]).mean() >= self.near_threshold:
+                        # the earlier review stays the representative
+                        parent[max(head, root)] = min(head, root)
+
+        return {labels[i]: labels[find(i)] for i in range(len(labels)) if find(i) != i}
+
+    def record_calls_saved(self, calls: int):
+        self.stats["calls_saved"] += calls
+
+    def summary(self) -> Dict:
+        return dict(self.stats)
@@ -1,78 +1,240 @@
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-import ast
-import pandas as pd
-from typing import  Dict, List
-import gspread as gsp
-from configs.config import creds, sheet_id, csv_path ,GROQ_API_KEY
-from gspread.client import Client
-from gspread.worksheet import Worksheet
-from gspread import Spreadsheet
-from groq import Groq
+from configs.config import settings
+
+from functools import lru_cache
+from typing import Callable
 
+import pandas as pd
 
 from src.utils import GsheetAIAuto 
+from src.rate_limiter import RateLimiter
+from src.cache import ReviewCache
+from src.batching import BatchPlanner
+from src.dedup import ReviewDeduplicator
+from src.preclassify import build_pre_classifier
+from src.journal import ResultJournal
+from src.watermark import WatermarkStore
+from src.aggregates import SentimentAggregate
 from src.analysis import ReviewAnalysis
+from src.instrumentation import metrics
+from src.storage import LOCAL_BACKENDS, SheetsBackend, open_local_tables
+from src.row_index import RowKeys, SheetIndex
+from src.sharding import ShardPool, split_shards, worker_state
  
 
-
-def main():
-    #instantiate the object of the classes
-    gsheetauto = GsheetAIAuto()
-    revana = ReviewAnalysis()
-    
+def sheet_tables(gsheetauto: GsheetAIAuto, row: int, col: int):
+    """The raw_data/staging/processed worksheets as storage backends."""
     #create a client that the gspread will use to access the google sheet
-    client = gsheetauto.create_client(creds)
-    #print()
+    client = gsheetauto.create_client(settings.creds)
     #access the spreadsheet
-    spreadsheet = gsheetauto.get_spreadsheet(client, sheet_id)
-
-    #read dataset as pandas dataframe
-    df = gsheetauto.read_dataset(csv_path,200)
-    #df = read_dataset1(csv_path,10)
-
-    #get the shape of the datafrane
-    row, col = len(df[0]) , len(df[1])
-    #get worksheet, create if it doesn't exist
-    raw_worksheet = gsheetauto.get_worksheet(spreadsheet , 'raw_data',row, col)
- 
+    spreadsheet = gsheetauto.get_spreadsheet(client, settings.sheet_id)
+    #get worksheets, create them if they don't exist
+    worksheets = {title: gsheetauto.get_worksheet(spreadsheet, title, row, col)
+                  for title in ('raw_data', 'staging', 'processed')}
     #clean worksheet, so that I don't have unessary worksheet in the spreadsheet
     gsheetauto.clean_sheet(spreadsheet)
-    #upload data to the worksheet
-    gsheetauto.upload_rows_to_gsheets(raw_worksheet, df[0], df[1], True)
-    #get staging worksheet, and create one if it doesn't exist
-    stg_worksheet = gsheetauto.get_worksheet(spreadsheet , 'staging',row, col)
-    #pull data from the raw_data and process it
-    stg_data = gsheetauto.pull_gsheet_data_to_df(raw_worksheet, process=True)
-    #print(stg_data)
-    #upload the processed data to the staging sheet
-    gsheetauto.upload_rows_to_gsheets(stg_worksheet, stg_data.get('sheet_data'),  stg_data.get('sheet_cols'))
-    #print(stg_data.get("sheet_data"))
-    #get the processed sheet and create one if it doens't exist
-
-    prc_worksheet = gsheetauto.get_worksheet(spreadsheet , 'processed',row, col)
-    #pull data from the stagin worksheet
-    prc_data_check =  gsheetauto.pull_gsheet_data_to_df(prc_worksheet,process=False)
-
-    print('>>',len(stg_data.get("sheet_data")))
-
-    print('>>',prc_data_check.shape[0])
+    #raw data is never cleared, and every worksheet keeps an index of where its rows are
+    return {title: SheetsBackend(gsheetauto, worksheet, protected=(title == 'raw_data'),
+                                 index=SheetIndex(os.path.join(settings.ROW_INDEX_DIR, f"{spreadsheet.id}_{title}.json")))
+            for title, worksheet in worksheets.items()}
+
+
+def load_pre_classifier(read_processed: Callable[[], pd.DataFrame]):
+    """
+    Clear-cut rows can be decided locally, a logistic model learns from the rows processed so far.
+    read_processed() is only called when there is no saved model to load.
+    """
+    model_path = settings.PRE_CLASSIFIER_MODEL_PATH
+    training = None
+    if settings.PRE_CLASSIFIER == "logistic" and not (model_path and os.path.exists(model_path)):
+        training = read_processed()
+    return build_pre_classifier(settings.PRE_CLASSIFIER, settings.PRE_CLASSIFIER_THRESHOLD, model_path, training)
+
+
+def ai_stage(gsheetauto: GsheetAIAuto, new_prc_data: pd.DataFrame, rate_limiter: RateLimiter, max_workers: int,
+             pre_classifier, journal: ResultJournal, flush=None) -> pd.DataFrame:
+    """Summary and sentiment of the new rows, from the journal, the pre-classifier, the cache or Groq."""
+    #the shards of a run share the cache file, every ai_stage opens and closes its own connection
+    cache = ReviewCache(settings.LLM_CACHE_PATH)
+    try:
+        return gsheetauto.apply_groqAI(settings.GROQ_API_KEY, new_prc_data, "openai/gpt-oss-120b", "Review Text", "AI Sentiment", "AI Summary", 10, max_workers,
+                                       rate_limiter, cache,
+                                       BatchPlanner(), ReviewDeduplicator(settings.DEDUP_NEAR_THRESHOLD), pre_classifier,
+                                       journal=journal, flush=flush, flush_every=settings.FLUSH_EVERY_ROWS)
+    finally:
+        cache.close()
+
+
+def shard_journal(shard: int) -> ResultJournal:
+    return ResultJournal(f"{settings.JOURNAL_PATH}.shard{shard}")
+
+
+def process_shard(shard: int, shards: int, raw_shard: pd.DataFrame, pre_classifier):
+    """Staging and AI stage of one shard, run in a ShardPool worker; returns (staging rows, new processed rows)."""
+    gsheetauto, rate_limiter = worker_state()
+    stg_df = gsheetauto.process_stg_data(raw_shard, copy=False, columnar=True).get('processed_frame')
+    #the watermark is only read here, the parent commits it once every shard is merged
+    new_prc_data = WatermarkStore(settings.WATERMARK_PATH).changed_rows(stg_df)
+    if new_prc_data.empty:
+        return stg_df, new_prc_data
+    #the shards share the Groq budget, and split the worker threads between them
+    return stg_df, ai_stage(gsheetauto, new_prc_data, rate_limiter, max(1, settings.GROQ_MAX_WORKERS // shards),
+                            pre_classifier, shard_journal(shard))
+
+
+def run_shards(gsheetauto: GsheetAIAuto, raw_data: pd.DataFrame, shards: int, pre_classifier):
+    """
+    Split raw_data by row key into shards and stage and AI-process them in a ShardPool.
+    The shard outputs are merged in id order, so the result does not depend on
+    which shard finishes first; (staging frame, new processed rows) is returned.
+    """
+    parts = split_shards(raw_data, shards)
+    calls = [(shard, shards, part, pre_classifier) for shard, part in enumerate(parts) if not part.empty]
+    with ShardPool(shards, settings.GROQ_RPM, settings.GROQ_TPM, gsheetauto) as pool:
+        results = pool.map(process_shard, calls)
+
+    def merge(frames, id_column):
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        merged = pd.concat(frames, ignore_index=True)
+        order = pd.to_numeric(merged[id_column], errors='coerce').argsort(kind='stable')
+        return merged.iloc[order].reset_index(drop=True)
+
+    new_prc_data_df = merge([new for _, new in results], 'Id')
+    #concat drops attrs that differ between the shards
+    new_prc_data_df.attrs["fallback_ids"] = [row_id for _, new in results for row_id in new.attrs.get("fallback_ids", [])]
+    return merge([stg for stg, _ in results], 'id'), new_prc_data_df
+
+
+def main(gsheetauto: GsheetAIAuto = None, revana: ReviewAnalysis = None, no_of_rows: int = 200,
+         metrics_path: str = None, in_memory: bool = None, shards: int = 1):
+    #instantiate the object of the classes, the benchmark and tests pass in offline ones
+    gsheetauto = gsheetauto or GsheetAIAuto()
+    #the batch job saves the charts in the background instead of opening a window
+    revana = revana or ReviewAnalysis(headless=True, output_dir=settings.REPORT_DIR,
+                                      formats=("png", "svg"), background=True)
+    #per-stage timings and counters are only collected when they are written somewhere
+    if metrics_path:
+        metrics.reset()
+        metrics.enable()
+    #in memory mode the DataFrames stay authoritative and raw/staging are only written to,
+    #the "sheets" mode reads every stage back from the sheet it was written to
+    if in_memory is None:
+        in_memory = settings.PIPELINE_MODE != "sheets"
     
-    if len(stg_data.get("sheet_data")) != prc_data_check.shape[0]:
-
-        prc_data =  gsheetauto.pull_gsheet_data_to_df(stg_worksheet,process=False)
-        #apply the groqAI to summarise test and oerfirm sentiment analysis.
-        prc_data_df = gsheetauto.apply_groqAI(GROQ_API_KEY,   prc_data, "openai/gpt-oss-120b",  "Review Text",  "AI Sentiment",  "AI Summary", 10 )
-        #print(prc_data.head())
-        #upload Ai data into the processed sheet
-        gsheetauto.upload_rows_to_gsheets(prc_worksheet, prc_data_df.values.tolist(),  prc_data_df.columns.tolist())
-        #analyse the
-        revana.analyze_sentiment_by_class( prc_data_df, "Class Name",  "AI Sentiment" )
-
-    revana.analyze_sentiment_by_class( prc_data_check, "Class Name",  "AI Sentiment" )
+    #get the shape of the dataset from its header, the rows are streamed below
+    row, col = no_of_rows or 1000 , len(gsheetauto.dataset_columns(settings.csv_path))
+    #the raw_data/staging/processed tables: the worksheets, or a local mirror published to them at the end
+    local = settings.STORAGE_BACKEND in LOCAL_BACKENDS
+    tables = open_local_tables(settings.STORAGE_BACKEND, settings.STORAGE_DIR) if local else sheet_tables(gsheetauto, row, col)
+    raw, staging, processed = tables['raw_data'], tables['staging'], tables['processed']
+
+    #stream the dataset in batches and upload each batch to the raw table,
+    #every row gets the id of its Clothing ID + Review Text, whatever its position in the file
+    row_keys = RowKeys(os.path.join(settings.ROW_INDEX_DIR, 'keys.json'))
+    raw_batches, stg_batches = [], []
+    for records, col_names in gsheetauto.iter_dataset(settings.csv_path, no_of_rows, settings.READ_CHUNK_ROWS):
+        batch = gsheetauto.records_to_frame(records, col_names, row_keys=row_keys)
+        raw.upsert(batch)
+        if in_memory and shards > 1:
+            #the shard workers stage their own rows
+            raw_batches.append(batch)
+        elif in_memory:
+            #stage every batch as it is read, only the staging rows are kept
+            stg_batches.append(gsheetauto.process_stg_data(batch, copy=False, columnar=True).get('processed_frame'))
+    row_keys.save()
+
+    #the processed table is only pulled in full when something needs all of it,
+    #and then only once
+    read_processed = lru_cache(maxsize=None)(processed.read)
+    watermark = WatermarkStore(settings.WATERMARK_PATH)
+    if not watermark.hashes:
+        #first incremental run, rows already on the processed sheet count as done
+        watermark.seed(read_processed())
+
+    if shards > 1:
+        #the raw batches we hold, or the raw table in sheets mode
+        raw_data = (pd.concat(raw_batches, ignore_index=True) if raw_batches else pd.DataFrame()) if in_memory else raw.read()
+        #staging and the AI stage run per shard in worker processes, the tables are only written from here
+        stg_df, new_prc_data_df = run_shards(gsheetauto, raw_data, shards, load_pre_classifier(read_processed))
+    elif in_memory:
+        #the batches were staged as they were read
+        stg_df = pd.concat(stg_batches, ignore_index=True) if stg_batches else pd.DataFrame()
+    else:
+        #pull data from the raw table and process it
+        stg_df = gsheetauto.process_stg_data(raw.read(), copy=False, columnar=True).get('processed_frame')
+    #upload the processed data to the staging table
+    staging.upsert(stg_df)
+    if (in_memory or shards > 1) and not stg_df.empty:
+        #instead of reading staging back, check that its ids arrived
+        staging.verify(stg_df['id'].tolist())
+
+    #keep only the staging rows that are new or changed since the last run
+    prc_data = stg_df if in_memory or shards > 1 else staging.read()
+    new_prc_data = watermark.changed_rows(prc_data)
+    #running per-class sentiment counts, built once from the processed sheet and then updated per run
+    aggregate = SentimentAggregate(settings.AGGREGATE_PATH)
+    if not len(aggregate) and not read_processed().empty:
+        aggregate.rebuild(read_processed())
+
+    print('>>',prc_data.shape[0])
+
+    print('>>',new_prc_data.shape[0])
+
+    if not new_prc_data.empty:
+
+        #finished batches go to a journal, so a crashed run picks up where it stopped
+        journal = ResultJournal(settings.JOURNAL_PATH)
+        if shards <= 1:
+            #apply the groqAI to summarise test and oerfirm sentiment analysis.
+            new_prc_data_df = ai_stage(gsheetauto, new_prc_data, RateLimiter(settings.GROQ_RPM, settings.GROQ_TPM),
+                                       settings.GROQ_MAX_WORKERS, load_pre_classifier(read_processed), journal,
+                                       flush=lambda rows: processed.upsert(rows, "Id"))
+        #rows that only got the neutral fallback are not marked as done, the next run tries them again
+        watermark.release(new_prc_data_df.attrs.get("fallback_ids", []))
+        #upload only the new results, the processed table replaces the rows with their Id and appends the rest
+        processed.upsert(new_prc_data_df, "Id")
+        if in_memory:
+            processed.verify(new_prc_data_df['Id'].tolist(), "Id")
+        #only the new rows are counted; the aggregate is saved before the watermark, so a
+        #failed commit reprocesses rows that the aggregate then moves instead of double counting
+        aggregate.update(new_prc_data_df)
+        aggregate.save()
+        watermark.commit()
+        #everything is committed, the next run starts a new journal
+        journal.clear()
+        for shard in range(shards if shards > 1 else 0):
+            shard_journal(shard).clear()
+    elif len(aggregate):
+        aggregate.save()
+
+    if local and settings.PUBLISH_TO_SHEETS:
+        #the worksheets are only written once, from the local mirror
+        for name, sheet in sheet_tables(gsheetauto, row, col).items():
+            sheet.upsert(tables[name].read(), "Id" if name == 'processed' else "id")
+
+    #analyse the processed rows once, from the aggregate
+    #the processed sheet is empty on the very first run into a new spreadsheet
+    if len(aggregate):
+        revana.analyze_sentiment_aggregate(aggregate)
+    aggregate.close()
+
+    #wait for the charts to be written
+    revana.close()
+
+    if metrics_path:
+        metrics.export(metrics_path)
+        metrics.disable()
    
 if __name__ == '__main__':
-    main()
+    import argparse
+    parser = argparse.ArgumentParser(description="Load the reviews dataset, summarise it with Groq and publish it.")
+    parser.add_argument("--rows", type=int, default=200, help="rows of the dataset to process, 0 for all of them")
+    parser.add_argument("--shards", type=int, default=1, help="processes the staging and AI stages are split over")
+    args = parser.parse_args()
+    main(no_of_rows=args.rows or None, metrics_path=settings.METRICS_PATH, shards=args.shards)
 
 
 
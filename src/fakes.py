@@ -0,0 +1,359 @@
+"""
+Offline stand-ins for Google Sheets and Groq.
+
+They keep everything in memory, count the calls, cells and tokens that go
+through them, and can add latency, throughput limits and failures, so the
+pipeline can be tested and benchmarked without network access.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from types import SimpleNamespace
+
+from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol, numericise_all
+from gspread.worksheet import Worksheet
+
+
+class FakeSheetsError(APIError):
+    """A failed Sheets request, with the code and message of a gspread APIError."""
+
+    def __init__(self, code: int, message: str = ""):
+        self.error = {"code": code, "message": message, "status": ""}
+        self.code = code
+        self.response = None
+        Exception.__init__(self, self.error)
+
+    def __reduce__(self):
+        return self.__class__, (self.code, self.error["message"])
+
+
+class FakeSheetsQuota:
+    """
+    Request quota and failure injection shared by everything opened from a FakeSheetsClient.
+
+    Arguments:
+        requests_per_minute: requests above this rate in a rolling minute get a 429, like the per-user Sheets quota
+        fail_every: every fail_every-th write request of a worksheet fails with fail_code
+        fail_code: status of the injected failures, 429 or a 5xx
+    """
+
+    WRITES = frozenset({"update", "batch_update", "append_rows", "batch_clear", "clear"})
+
+    def __init__(self, requests_per_minute: float = None, fail_every: int = None, fail_code: int = 503):
+        self.requests_per_minute = requests_per_minute
+        self.fail_every = fail_every
+        self.fail_code = fail_code
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self._writes = 0
+        self.stats = Counter()
+
+    def check(self, name: str, write: bool = False):
+        """Count a request, raising FakeSheetsError when it is over the quota or due to fail."""
+        with self._lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self.requests_per_minute and len(self._recent) >= self.requests_per_minute:
+                self.stats["throttled"] += 1
+                raise FakeSheetsError(429, f"Quota exceeded for {name}")
+            self._recent.append(now)
+            if write and self.fail_every:
+                self._writes += 1
+                if self._writes % self.fail_every == 0:
+                    self.stats["failures"] += 1
+                    raise FakeSheetsError(self.fail_code, f"Injected failure of {name}")
+
+
+class FakeWorksheet(Worksheet):
+    """
+    In-memory stand-in for a gspread Worksheet.
+
+    It keeps the grid as a list of rows and counts API calls and the
+    cells read and written, so tests can check how much data a code path
+    moves to and from Sheets. With a FakeSheetsQuota every request is checked
+    against it first, and a failed request writes nothing.
+    """
+
+    def __init__(self, title: str = "Sheet1", rows=None, sheet_id: int = 0, latency: float = 0.0,
+                 quota: FakeSheetsQuota = None):
+        self._properties = {"title": title, "sheetId": sheet_id, "index": 0,
+                            "gridProperties": {"rowCount": 1000, "columnCount": 26}}
+        self.spreadsheet_id = "fake-spreadsheet"
+        self.client = None
+        self.latency = latency
+        self.quota = quota
+        self.grid = [list(row) for row in rows or []]
+        self.calls = Counter()
+        self.cells_read = 0
+        self.cells_written = 0
+
+    def __repr__(self):
+        return f"<FakeWorksheet {self.title!r}>"
+
+    def _call(self, name: str):
+        self.calls[name] += 1
+        if self.quota:
+            self.quota.check(name, write=name in FakeSheetsQuota.WRITES)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _read(self):
+        self.cells_read += sum(len(row) for row in self.grid)
+        return [["" if value is None else str(value) for value in row] for row in self.grid]
+
+    def _write(self, row: int, col: int, values):
+        for r, row_values in enumerate(values, start=row - 1):
+            while len(self.grid) <= r:
+                self.grid.append([])
+            grid_row = self.grid[r]
+            for c, value in enumerate(row_values, start=col - 1):
+                while len(grid_row) <= c:
+                    grid_row.append("")
+                grid_row[c] = value
+                self.cells_written += 1
+
+    def get_all_values(self, *args, **kwargs):
+        self._call("get_all_values")
+        return self._read()
+
+    def get_all_records(self, *args, **kwargs):
+        self._call("get_all_records")
+        values = self._read()
+        if not values:
+            return []
+        return [dict(zip(values[0], numericise_all(row))) for row in values[1:]]
+
+    def row_values(self, row: int, *args, **kwargs):
+        self._call("row_values")
+        values = self.grid[row - 1] if len(self.grid) >= row else []
+        self.cells_read += len(values)
+        return [str(value) for value in values]
+
+    def col_values(self, col: int, *args, **kwargs):
+        self._call("col_values")
+        values = [row[col - 1] if len(row) >= col else "" for row in self.grid]
+        self.cells_read += len(values)
+        return [str(value) for value in values]
+
+    def update(self, values=None, range_name=None, *args, **kwargs):
+        self._call("update")
+        # accept the legacy update("A1", values) order too
+        if isinstance(values, str):
+            values, range_name = range_name, values
+        row, col = a1_to_rowcol((range_name or "A1").split(":")[0])
+        self._write(row, col, values)
+        return {}
+
+    def batch_update(self, data, *args, **kwargs):
+        self._call("batch_update")
+        for item in data:
+            row, col = a1_to_rowcol(item["range"].split(":")[0])
+            self._write(row, col, item["values"])
+        return {}
+
+    def append_rows(self, values, *args, **kwargs):
+        self._call("append_rows")
+        self._write(len(self.grid) + 1, 1, values)
+        return {}
+
+    def batch_clear(self, ranges):
+        self._call("batch_clear")
+        for range_name in ranges:
+            start, _, end = range_name.partition(":")
+            first_row, first_col = a1_to_rowcol(start)
+            last_row, last_col = a1_to_rowcol(end or start)
+            for row in self.grid[first_row - 1:last_row]:
+                for col in range(first_col - 1, min(last_col, len(row))):
+                    row[col] = ""
+        # like Sheets, the values end at the last row and column that are not empty
+        while self.grid and all(value == "" for value in self.grid[-1]):
+            self.grid.pop()
+        width = max((col + 1 for row in self.grid for col, value in enumerate(row) if value != ""), default=0)
+        self.grid = [row[:width] for row in self.grid]
+        return {}
+
+    def clear(self):
+        self._call("clear")
+        self.grid = []
+        return {}
+
+
+class FakeSpreadsheet:
+    """In-memory spreadsheet holding FakeWorksheets by title."""
+
+    def __init__(self, spreadsheet_id: str = "fake-spreadsheet", titles=("Sheet1",), latency: float = 0.0,
+                 quota: FakeSheetsQuota = None):
+        self.id = spreadsheet_id
+        self.latency = latency
+        self.quota = quota
+        self.calls = Counter()
+        self._worksheets = {}
+        self._all_worksheets = []
+        for title in titles:
+            self._add(title)
+
+    def _call(self, name: str):
+        self.calls[name] += 1
+        if self.quota:
+            # spreadsheet requests count towards the quota, failures are only injected into worksheet writes
+            self.quota.check(name)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _add(self, title: str) -> FakeWorksheet:
+        worksheet = FakeWorksheet(title, sheet_id=len(self._all_worksheets), latency=self.latency, quota=self.quota)
+        self._worksheets[title] = worksheet
+        # deleted worksheets still count towards stats()
+        self._all_worksheets.append(worksheet)
+        return worksheet
+
+    def worksheets(self):
+        self._call("worksheets")
+        return list(self._worksheets.values())
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self._call("worksheet")
+        return self._worksheets[title]
+
+    def add_worksheet(self, title: str, rows: int = 1000, cols: int = 26, index=None) -> FakeWorksheet:
+        self._call("add_worksheet")
+        return self._add(title)
+
+    def del_worksheet(self, worksheet: FakeWorksheet):
+        self._call("del_worksheet")
+        del self._worksheets[worksheet.title]
+
+    def batch_update(self, body):
+        self._call("batch_update")
+        for request in body.get("requests", []):
+            sheet_id = request.get("deleteSheet", {}).get("sheetId")
+            for title, worksheet in list(self._worksheets.items()):
+                if worksheet.id == sheet_id:
+                    del self._worksheets[title]
+        return {}
+
+    def stats(self) -> dict:
+        """API calls and cells moved by the spreadsheet and all of its worksheets."""
+        calls = Counter(self.calls)
+        cells_read = cells_written = 0
+        for worksheet in self._all_worksheets:
+            calls.update(worksheet.calls)
+            cells_read += worksheet.cells_read
+            cells_written += worksheet.cells_written
+        return {"api_calls": sum(calls.values()), "calls": dict(calls),
+                "cells_read": cells_read, "cells_written": cells_written}
+
+
+class FakeSheetsClient:
+    """Stands in for a gspread Client, opening FakeSpreadsheets by key; they all share its quota."""
+
+    def __init__(self, latency: float = 0.0, quota: FakeSheetsQuota = None):
+        self.latency = latency
+        self.quota = quota
+        self.spreadsheets = {}
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        if key not in self.spreadsheets:
+            self.spreadsheets[key] = FakeSpreadsheet(key, latency=self.latency, quota=self.quota)
+        return self.spreadsheets[key]
+
+
+class FakeGroqError(Exception):
+    """Carries status_code and response headers like groq.APIStatusError."""
+
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+POSITIVE_WORDS = re.compile(r"\b(love|loved|lovely|great|perfect|beautiful|comfortable|flattering)\b")
+NEGATIVE_WORDS = re.compile(r"\b(small|big|return|returned|disappointed|cheap|poor|itchy|bad)\b")
+
+
+class FakeGroq:
+    """
+    Offline stand-in for the Groq client, answering
+    chat.completions.with_raw_response.create() like the JSON-mode prompt asks.
+
+    Arguments:
+        latency: seconds every request takes
+        requests_per_minute: requests above this rate in a rolling minute get a 429
+        failure_rate: share of requests answered with a 500
+        malformed_rate: share of responses that drop their last item
+        truncate_rate: share of responses cut off with finish_reason "length"
+        seed: seed for the failure injection
+    """
+
+    def __init__(self, latency: float = 0.0, requests_per_minute: float = None,
+                 failure_rate: float = 0.0, malformed_rate: float = 0.0,
+                 truncate_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.truncate_rate = truncate_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self.stats = Counter()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            with_raw_response=SimpleNamespace(create=self._create)))
+
+    @staticmethod
+    def sentiment(review: str) -> str:
+        review = review.lower()
+        if NEGATIVE_WORDS.search(review):
+            return "negative"
+        if POSITIVE_WORDS.search(review):
+            return "positive"
+        return "neutral"
+
+    def _create(self, model: str, messages, max_completion_tokens: int = 1024, **kwargs):
+        with self._lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            if self.requests_per_minute and len(self._recent) >= self.requests_per_minute:
+                self.stats["throttled"] += 1
+                raise FakeGroqError(429, {"retry-after": str(60 - (now - self._recent[0])),
+                                          "x-ratelimit-remaining-requests": "0"})
+            self._recent.append(now)
+            roll = self._random.random()
+        if self.latency:
+            time.sleep(self.latency)
+        if roll < self.failure_rate:
+            with self._lock:
+                self.stats["failures"] += 1
+            raise FakeGroqError(500)
+
+        reviews = json.loads(messages[-1]["content"].split("=", 1)[1])
+        results = [{"id": item["id"], "summary": item["review"][:120],
+                    "sentiment": self.sentiment(item["review"])} for item in reviews]
+        finish_reason = "stop"
+        if self._random.random() < self.malformed_rate and results:
+            results = results[:-1]
+        content = json.dumps({"results": results})
+        if self._random.random() < self.truncate_rate:
+            content, finish_reason = content[:len(content) // 2], "length"
+
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        completion_tokens = min(max_completion_tokens, len(content) // 4)
+        with self._lock:
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(finish_reason=finish_reason, message=SimpleNamespace(content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens))
+        remaining = "" if not self.requests_per_minute else str(int(self.requests_per_minute - len(self._recent)))
+        headers = {"x-ratelimit-remaining-requests": remaining} if remaining else {}
+        return SimpleNamespace(headers=headers, parse=lambda: response)
@@ -0,0 +1,135 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+
+class _NoopSpan:
+    # shared by every span() while metrics are disabled
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, **counts):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def add(self, **counts):
+        self.metrics.add(self.name, **counts)
+
+
+class Metrics:
+    """
+    Per-stage timings and counters for one pipeline run.
+
+    Stages are timed with span() or the instrument() decorator and counters
+    (rows, api_calls, retries, bytes, tokens, ...) are added with add(). It is
+    disabled by default; then span() hands out a shared no-op object and add()
+    returns straight away, so instrumented code pays one attribute check.
+    Durations of nested stages are inclusive, e.g. pull_gsheet_data_to_df
+    includes the process_stg_data it calls.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.stages: Dict[str, Dict[str, float]] = {}
+            self.started_at = time.time()
+
+    def add(self, name: str, **counts):
+        """Add counts to the totals of stage `name`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            stage = self.stages.setdefault(name, {})
+            for key, value in counts.items():
+                if value:
+                    stage[key] = stage.get(key, 0) + value
+
+    @contextmanager
+    def _timed(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield _Span(self, name)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                stage = self.stages.setdefault(name, {})
+                stage["calls"] = stage.get("calls", 0) + 1
+                stage["seconds"] = stage.get("seconds", 0.0) + elapsed
+                stage["max_seconds"] = max(stage.get("max_seconds", 0.0), elapsed)
+
+    def span(self, name: str):
+        """Context manager timing stage `name`; the object it yields has add(**counts)."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return self._timed(name)
+
+    def instrument(self, name: str = None) -> Callable:
+        """Decorator timing every call of the function as stage `name` (default: function name)."""
+        def decorator(fn):
+            stage = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self._timed(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {"started_at": self.started_at,
+                    "wall_seconds": time.time() - self.started_at,
+                    "stages": {name: dict(stage) for name, stage in self.stages.items()}}
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self, prefix: str = "pipeline") -> str:
+        """Prometheus text exposition format, one counter family per recorded key."""
+        summary = self.summary()
+        families: Dict[str, Dict[str, float]] = {}
+        for stage, counts in summary["stages"].items():
+            for key, value in counts.items():
+                families.setdefault(key, {})[stage] = value
+
+        lines = [f"# TYPE {prefix}_wall_seconds gauge", f"{prefix}_wall_seconds {summary['wall_seconds']}"]
+        for key, stages in sorted(families.items()):
+            metric = f"{prefix}_stage_{key}" if key.startswith("max_") else f"{prefix}_stage_{key}_total"
+            lines.append(f"# TYPE {metric} {'gauge' if key.startswith('max_') else 'counter'}")
+            for stage, value in sorted(stages.items()):
+                lines.append(f'{metric}{{stage="{stage}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Write the summary to path, as Prometheus text for *.prom files and as JSON otherwise."""
+        with open(path, "w") as f:
+            f.write(self.to_prometheus() if str(path).endswith(".prom") else self.to_json())
+
+
+metrics = Metrics()
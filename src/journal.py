@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+from typing import Dict, Iterable, Tuple
+
+from src.state_files import ensure_parent_dir
+
+logger = logging.getLogger(__name__)
+
+
+class ResultJournal:
+    """
+    Append-only JSONL journal of the AI results of the current run.
+
+    Every finished batch is appended (and fsynced) as it completes, one line
+    per review, so a run that dies half way can resume: results found in the
+    journal are reused instead of being requested again. The journal is
+    cleared once the run has committed its results.
+
+    Arguments:
+        path: the .jsonl file, created on the first record()
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Dict[str, Dict[str, str]]:
+        """{review key: {"id", "summary", "sentiment"}}; a line cut off by a crash is skipped."""
+        if not os.path.exists(self.path):
+            return {}
+        entries, damaged = {}, 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    entries[entry["key"]] = {"id": entry.get("id"), "summary": entry["summary"],
+                                             "sentiment": entry["sentiment"]}
+                except (ValueError, KeyError, TypeError):
+                    damaged += 1
+        if damaged:
+            logger.warning("Skipped %s damaged lines of the journal %s", damaged, self.path)
+        logger.info("%s results in the journal %s", len(entries), self.path)
+        return entries
+
+    def record(self, entries: Iterable[Tuple[str, str, str, str]]):
+        """Append (id, review key, summary, sentiment) tuples and flush them to disk."""
+        lines = [json.dumps({"id": row_id, "key": key, "summary": summary, "sentiment": sentiment}) + "\n"
+                 for row_id, key, summary, sentiment in entries]
+        if not lines:
+            return
+        ensure_parent_dir(self.path)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,108 @@
+import ast
+import json
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+SENTIMENTS = ("positive", "negative", "neutral")
+
+
+def iter_json_objects(text: str) -> Iterator[dict]:
+    """
+    Yield every complete JSON object carrying an "id" found in text.
+
+    Used when the response as a whole is not valid JSON (e.g. it was cut off
+    at the token limit): each item that was fully written is still recovered.
+    """
+    decoder = json.JSONDecoder()
+    pos = text.find("{")
+    while pos != -1:
+        try:
+            obj, end = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            pos = text.find("{", pos + 1)
+            continue
+        if isinstance(obj, dict) and "id" in obj:
+            yield obj
+            pos = text.find("{", end)
+        else:
+            pos = text.find("{", pos + 1)
+
+
+def _items(payload) -> List:
+    if isinstance(payload, dict):
+        payload = payload.get("results", payload.get("reviews", []))
+    return payload if isinstance(payload, list) else []
+
+
+def parse_results(text: str, ids: List[int]) -> Tuple[Dict[int, dict], bool]:
+    """
+    Parse the model output into {id: item} for the ids that were asked for.
+
+    Accepts {"results": [...]} or a bare list, as JSON or as a Python literal.
+    Items without an id are matched by position only when the list has
+    exactly one item per requested id.
+    Returns (items, clean) where clean is False when the output had to be
+    salvaged item by item.
+    """
+    text = (text or "").strip()
+    items, clean = None, True
+    for loader in (json.loads, ast.literal_eval):
+        try:
+            items = _items(loader(text))
+            break
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            continue
+    if items is None:
+        items, clean = list(iter_json_objects(text)), False
+
+    wanted = set(ids)
+    parsed = {}
+    if items and len(items) == len(ids) and not any(isinstance(item, dict) and "id" in item for item in items):
+        parsed = dict(zip(ids, items))
+    else:
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                item_id = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            if item_id in wanted:
+                parsed[item_id] = item
+    return parsed, clean
+
+
+def is_valid_item(item) -> bool:
+    return (isinstance(item, dict)
+            and isinstance(item.get("summary"), str) and item["summary"].strip() != ""
+            and item.get("sentiment") in SENTIMENTS)
+
+
+class ParseMetrics:
+    """Thread-safe counters for how well model output could be parsed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "parse_failures": 0, "items_requested": 0,
+                       "items_parsed": 0, "items_invalid": 0, "repair_requests": 0,
+                       "items_repaired": 0, "items_fallback": 0}
+
+    def add(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.counts[key] += value
+
+    @property
+    def parse_failure_rate(self) -> float:
+        return self.counts["parse_failures"] / self.counts["requests"] if self.counts["requests"] else 0.0
+
+    @property
+    def fallback_rate(self) -> float:
+        requested = self.counts["items_requested"]
+        return self.counts["items_fallback"] / requested if requested else 0.0
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {**self.counts,
+                    "parse_failure_rate": self.parse_failure_rate,
+                    "fallback_rate": self.fallback_rate}
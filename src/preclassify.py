@@ -0,0 +1,215 @@
+import logging
+import os
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.llm_output import SENTIMENTS
+from src.state_files import atomic_write
+from src.watermark import canonical_column
+
+logger = logging.getLogger(__name__)
+
+POSITIVE_WORDS = r"\b(love|loved|lovely|great|perfect|beautiful|comfortable|flattering|gorgeous|soft|cute|favorite)\b"
+NEGATIVE_WORDS = r"\b(return|returned|returning|disappointed|disappointing|cheap|poor|itchy|bad|awful|terrible|unflattering)\b"
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_TOKEN = re.compile(r"[a-z']+")
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Column `name` in any spelling, or an all-missing column when it is absent."""
+    columns = {canonical_column(col): col for col in df.columns}
+    if name in columns:
+        return df[columns[name]]
+    return pd.Series(np.nan, index=df.index)
+
+
+class PreClassifier(ABC):
+    """
+    A cheap local sentiment decision made before the LLM.
+
+    predict() gives a label and a confidence per row; rows at or above
+    threshold are resolved locally and only the others are sent to Groq.
+
+    Arguments:
+        threshold: lowest confidence a local decision is kept at
+    """
+
+    name = "base"
+
+    def __init__(self, threshold: float = 0.9):
+        self.threshold = threshold
+        self.stats = {"rows": 0, "resolved": 0}
+
+    @abstractmethod
+    def predict(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """(labels, confidences) for every row of df, both as arrays."""
+
+    def resolve(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """(mask of the rows decided locally, their labels for every row)."""
+        labels, confidence = self.predict(df)
+        confident = confidence >= self.threshold
+        self.stats["rows"] += len(df)
+        self.stats["resolved"] += int(confident.sum())
+        return confident, labels
+
+    @staticmethod
+    def summarize(reviews: pd.Series) -> pd.Series:
+        """The first sentence of a review stands in for the AI summary of a local decision."""
+        return reviews.str.strip().str.split(_SENTENCE_END, n=1, regex=True).str[0]
+
+    def summary(self) -> Dict:
+        return dict(self.stats)
+
+
+class RatingLexiconClassifier(PreClassifier):
+    """
+    Decides from the star rating, Recommended IND and a small word list.
+
+    A 5-star recommended review (or 1-star, not recommended) is confident
+    when its text does not contain words of the opposite sentiment; 4 and 2
+    stars count for less, and short texts are decided from the words alone.
+    """
+
+    name = "rules"
+
+    def predict(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        text = _column(df, "review_text").fillna("").astype(str).str.lower()
+        rating = pd.to_numeric(_column(df, "rating"), errors="coerce").to_numpy(dtype=float)
+        recommended = pd.to_numeric(_column(df, "recommended_ind"), errors="coerce").to_numpy(dtype=float)
+        positive = text.str.count(POSITIVE_WORDS).to_numpy()
+        negative = text.str.count(NEGATIVE_WORDS).to_numpy()
+        short = (text.str.split().str.len().fillna(0) <= 6).to_numpy()
+
+        agrees_positive = (negative == 0)
+        agrees_negative = (positive == 0)
+        conditions = [
+            (rating == 5) & (recommended == 1) & agrees_positive,
+            (rating == 1) & (recommended == 0) & agrees_negative,
+            (rating == 4) & (recommended == 1) & agrees_positive & (positive > 0),
+            (rating == 2) & (recommended == 0) & agrees_negative & (negative > 0),
+            short & (positive > 0) & (negative == 0),
+            short & (negative > 0) & (positive == 0),
+        ]
+        labels = np.select(conditions, ["positive", "negative", "positive", "negative", "positive", "negative"],
+                           default="neutral").astype(object)
+        confidence = np.select(conditions, [0.95, 0.95, 0.85, 0.85, 0.75, 0.75], default=0.0)
+        return labels, confidence
+
+
+class LogisticClassifier(PreClassifier):
+    """
+    Multinomial logistic regression in NumPy, trained on earlier processed rows.
+
+    Features are hashed review words plus the rating and Recommended IND,
+    kept sparse (one index per feature of a row), so training and
+    prediction need neither scikit-learn nor a dense matrix.
+
+    Arguments:
+        threshold: lowest predicted probability a local decision is kept at
+        n_features: size of the hashed feature space
+        epochs: full-batch gradient steps in fit()
+        learning_rate: gradient step size
+        l2: weight decay
+    """
+
+    name = "logistic"
+
+    def __init__(self, threshold: float = 0.9, n_features: int = 1 << 14, epochs: int = 200,
+                 learning_rate: float = 0.5, l2: float = 1e-4):
+        super().__init__(threshold)
+        self.n_features = n_features
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.classes = np.array(SENTIMENTS, dtype=object)
+        self.weights = None
+
+    def _features(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """(row of every feature, feature index), every row has at least its bias feature."""
+        text = _column(df, "review_text").fillna("").astype(str).str.lower()
+        rating = _column(df, "rating").astype(str).str.replace(r"\.0$", "", regex=True)
+        recommended = _column(df, "recommended_ind").astype(str).str.replace(r"\.0$", "", regex=True)
+        rows, features = [], []
+        for row, (words, stars, rec) in enumerate(zip(text, rating, recommended)):
+            tokens = set(_TOKEN.findall(words))
+            tokens.update((f"__rating={stars}", f"__recommended={rec}", "__bias"))
+            for token in tokens:
+                rows.append(row)
+                features.append(zlib.crc32(token.encode("utf-8")) % self.n_features)
+        return np.array(rows, dtype=np.int64), np.array(features, dtype=np.int64)
+
+    def _probabilities(self, rows: np.ndarray, features: np.ndarray, n_rows: int) -> np.ndarray:
+        # sparse x dense product: per class, sum the weights of every row's features
+        scores = np.column_stack([np.bincount(rows, weights=self.weights[features, k], minlength=n_rows)
+                                  for k in range(len(self.classes))])
+        scores -= scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def fit(self, df: pd.DataFrame, sentiment_column: str = "AI Sentiment") -> "LogisticClassifier":
+        """Train on the rows of df whose sentiment is one of SENTIMENTS."""
+        labels = _column(df, canonical_column(sentiment_column)).astype(str).str.strip().str.lower()
+        targets = pd.Index(self.classes).get_indexer(labels)
+        df = df[targets >= 0]
+        targets = targets[targets >= 0]
+        if not len(df):
+            raise ValueError("No labelled rows to train the pre-classifier on.")
+
+        rows, features = self._features(df)
+        one_hot = np.eye(len(self.classes))[targets]
+        self.weights = np.zeros((self.n_features, len(self.classes)))
+        for _ in range(self.epochs):
+            # gradient of the mean cross-entropy, features are 0/1
+            error = (self._probabilities(rows, features, len(df)) - one_hot) / len(df)
+            gradient = np.column_stack([np.bincount(features, weights=error[rows, k], minlength=self.n_features)
+                                        for k in range(len(self.classes))])
+            self.weights -= self.learning_rate * (gradient + self.l2 * self.weights)
+        logger.info("Trained the logistic pre-classifier on %s rows", len(df))
+        return self
+
+    def predict(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        if self.weights is None:
+            raise ValueError("The logistic pre-classifier is not trained.")
+        rows, features = self._features(df)
+        probabilities = self._probabilities(rows, features, len(df))
+        return self.classes[probabilities.argmax(axis=1)], probabilities.max(axis=1)
+
+    def save(self, path: str):
+        # np.savez adds .npz to names without it, write to a name that already has it
+        atomic_write(path, lambda tmp_path: np.savez(tmp_path, weights=self.weights), suffix=".tmp.npz")
+
+    def load(self, path: str) -> "LogisticClassifier":
+        with np.load(path) as state:
+            self.weights = state["weights"]
+        self.n_features = self.weights.shape[0]
+        return self
+
+
+def build_pre_classifier(kind: str, threshold: float, model_path: str = None,
+                         training_frame: pd.DataFrame = None) -> PreClassifier:
+    """
+    The pre-classifier named by kind ("none", "rules" or "logistic"). A logistic
+    model is loaded from model_path, or trained on training_frame and saved there;
+    without either there is nothing to decide with and None is returned.
+    """
+    if kind in (None, "", "none"):
+        return None
+    if kind == "rules":
+        return RatingLexiconClassifier(threshold)
+    if kind == "logistic":
+        model = LogisticClassifier(threshold)
+        if model_path and os.path.exists(model_path):
+            return model.load(model_path)
+        if training_frame is None or training_frame.empty:
+            logger.info("No processed rows to train the logistic pre-classifier on yet")
+            return None
+        model.fit(training_frame)
+        if model_path:
+            model.save(model_path)
+        return model
+    raise ValueError(f"Unknown pre-classifier '{kind}'.")
@@ -0,0 +1,231 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections.abc import Mapping
+from multiprocessing.managers import BaseManager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def parse_reset(value: str) -> float:
+    """
+    Convert a Groq reset header such as "2m59.56s", "7.66s" or "250ms"
+    into seconds.
+    """
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    seconds = 0.0
+    for amount, unit in re.findall(r"([\d.]+)(ms|h|m|s)", value):
+        amount = float(amount)
+        if unit == "h":
+            seconds += amount * 3600
+        elif unit == "m":
+            seconds += amount * 60
+        elif unit == "s":
+            seconds += amount
+        else:
+            seconds += amount / 1000
+    return seconds
+
+
+class _Bucket:
+    """A token bucket that refills to capacity once per minute."""
+
+    def __init__(self, per_minute: float, now: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.updated = now
+
+    def refill(self, now: float):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # never ask for more than a full bucket, else we would wait forever
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.capacity
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter for the Groq requests-per-minute and
+    tokens-per-minute budgets.
+
+    Arguments:
+        requests_per_minute: request budget
+        tokens_per_minute: token budget (prompt + completion)
+        max_retries: retries on 429/5xx before the error is raised
+        base_delay: first backoff delay in seconds, doubled on each retry
+        max_delay: cap for a single backoff delay
+    """
+
+    def __init__(self, requests_per_minute: float = 30, tokens_per_minute: float = 8000,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        now = clock()
+        self._requests = _Bucket(requests_per_minute, now)
+        self._tokens = _Bucket(tokens_per_minute, now)
+        self._blocked_until = now
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "waited_seconds": 0.0}
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request and `tokens` tokens fit in the budget, then spend them."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._requests.refill(now)
+                self._tokens.refill(now)
+                wait = max(self._blocked_until - now,
+                           self._requests.wait_time(1),
+                           self._tokens.wait_time(tokens))
+                if wait <= 0:
+                    self._requests.tokens -= 1
+                    self._tokens.tokens -= min(tokens, self._tokens.capacity)
+                    self.stats["requests"] += 1
+                    return
+                self.stats["waited_seconds"] += wait
+            self._sleep(wait)
+
+    def settle(self, estimated: int, actual: int):
+        """Correct the token bucket once the real usage of a request is known."""
+        with self._lock:
+            self._tokens.tokens -= actual - estimated
+
+    def update_from_headers(self, headers):
+        """Tighten the local budgets to what the Groq rate-limit headers report."""
+        if not isinstance(headers, Mapping):
+            return
+        with self._lock:
+            now = self._clock()
+            for kind, bucket in (("requests", self._requests), ("tokens", self._tokens)):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = headers.get(f"x-ratelimit-reset-{kind}")
+                # Groq reports requests per day, so only the token limit resizes the bucket
+                if limit is not None and kind == "tokens":
+                    bucket.capacity = float(limit)
+                if remaining is None:
+                    continue
+                bucket.refill(now)
+                if float(remaining) <= 0 and reset is not None:
+                    # exhausted: hold every caller until the window resets, then start full
+                    reset_at = now + parse_reset(reset)
+                    self._blocked_until = max(self._blocked_until, reset_at)
+                    bucket.tokens, bucket.updated = bucket.capacity, reset_at
+                else:
+                    bucket.tokens = min(bucket.tokens, float(remaining))
+
+            retry_after = headers.get("retry-after")
+            if retry_after is not None:
+                self._blocked_until = max(self._blocked_until, now + parse_reset(retry_after))
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, fn: Callable, tokens: int = 0, retry_on: tuple = ()):
+        """
+        Run fn() inside the budget, retrying throttled and server errors.
+
+        fn may return a raw response; its headers are fed back into the limiter.
+        Exceptions carrying a 429/5xx status_code, or listed in retry_on,
+        are retried with backoff until max_retries is reached.
+        """
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if not (status in RETRY_STATUS_CODES or isinstance(e, retry_on)) or attempt >= self.max_retries:
+                    raise
+                response = getattr(e, "response", None)
+                self.update_from_headers(getattr(response, "headers", None))
+                with self._lock:
+                    self.stats["retries"] += 1
+                    self.stats["throttled"] += status == 429
+                delay = self.backoff(attempt)
+                logger.info("Groq call failed with %s, retrying in %.2fs", status or type(e).__name__, delay)
+                attempt += 1
+                self._sleep(delay)
+                continue
+
+            self.update_from_headers(getattr(result, "headers", None))
+            return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"requests_available": self._requests.tokens,
+                    "tokens_available": self._tokens.tokens,
+                    **self.stats}
+
+
+class RateLimitManager(BaseManager):
+    """
+    Server process holding one RateLimiter for a pool of processes:
+
+        manager = RateLimitManager()
+        manager.start()
+        budget = manager.RateLimiter(requests_per_minute, tokens_per_minute)
+
+    `budget` is a proxy that can be handed to other processes.
+    """
+
+
+RateLimitManager.register("RateLimiter", RateLimiter,
+                          exposed=("acquire", "settle", "update_from_headers", "snapshot"))
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    RateLimiter drawing on a budget shared by several processes.
+
+    The request/token buckets are those of the RateLimiter behind `budget`
+    (a RateLimitManager proxy); retries and backoff stay local, so fn() is
+    never sent to another process.
+
+    Arguments:
+        budget: proxy of the shared RateLimiter
+        max_retries, base_delay, max_delay: as for RateLimiter
+    """
+
+    def __init__(self, budget, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        super().__init__(max_retries=max_retries, base_delay=base_delay, max_delay=max_delay, sleep=sleep)
+        self.budget = budget
+
+    def acquire(self, tokens: int = 0):
+        self.budget.acquire(tokens)
+        with self._lock:
+            self.stats["requests"] += 1
+
+    def settle(self, estimated: int, actual: int):
+        self.budget.settle(estimated, actual)
+
+    def update_from_headers(self, headers):
+        # httpx headers do not pickle as a Mapping, send a plain dict
+        if isinstance(headers, Mapping):
+            self.budget.update_from_headers(dict(headers))
+
+    def snapshot(self) -> dict:
+        return {**self.budget.snapshot(), **self.stats}
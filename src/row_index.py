@@ -0,0 +1,121 @@
+import hashlib
+import logging
+from collections import Counter
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.state_files import read_json, write_json
+from src.watermark import canonical_column
+
+logger = logging.getLogger(__name__)
+
+# what identifies a review in the source data, independent of its position in the file
+KEY_COLUMNS = ("Clothing ID", "Review Text")
+
+
+def content_hash(values: Sequence[str]) -> str:
+    """Short hash of a row's cell texts, cells as they read back from a sheet."""
+    return hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def key_hashes(df: pd.DataFrame, key_columns: Sequence[str] = KEY_COLUMNS) -> np.ndarray:
+    """uint64 hash of the key columns of every row, the same in every process and run."""
+    columns = {canonical_column(col): col for col in df.columns}
+    missing = [col for col in map(canonical_column, key_columns) if col not in columns]
+    if missing:
+        raise ValueError(f"Key columns {missing} not found in dataframe")
+    selected = [columns[canonical_column(col)] for col in key_columns]
+    return pd.util.hash_pandas_object(df[selected].astype(str), index=False).to_numpy()
+
+
+class RowKeys:
+    """
+    Stable ids for source rows.
+
+    A row's key is a hash of its key columns (Clothing ID + Review Text), plus
+    how many identical rows came before it in the run. Every key gets an
+    integer id the first time it is seen and keeps it, so ids no longer
+    depend on the order of the source file.
+
+    Arguments:
+        path: JSON file holding key -> id, created on first save()
+        key_columns: columns the key is built from, in any spelling
+    """
+
+    def __init__(self, path: str, key_columns: Sequence[str] = KEY_COLUMNS):
+        self.path = path
+        self.key_columns = [canonical_column(col) for col in key_columns]
+        state = read_json(path)
+        self.ids: Dict[str, int] = state.get("ids", {})
+        self.next_id = state.get("next_id", 1)
+        # identical rows seen so far in this run, so the nth copy always gets the same key
+        self._seen = Counter()
+
+    def keys(self, df: pd.DataFrame) -> List[str]:
+        keys = []
+        for value in key_hashes(df, self.key_columns):
+            occurrence = self._seen[value]
+            self._seen[value] += 1
+            keys.append(f"{value:016x}-{occurrence}")
+        return keys
+
+    def assign(self, df: pd.DataFrame) -> np.ndarray:
+        """The id of every row of df, giving new ids to keys not seen before."""
+        ids = np.empty(len(df), dtype=np.int64)
+        for i, key in enumerate(self.keys(df)):
+            row_id = self.ids.get(key)
+            if row_id is None:
+                row_id = self.ids[key] = self.next_id
+                self.next_id += 1
+            ids[i] = row_id
+        return ids
+
+    def save(self):
+        write_json(self.path, {"next_id": self.next_id, "ids": self.ids})
+
+
+class SheetIndex:
+    """
+    Where every id sits on one worksheet, and the hash of its content.
+
+    With it an upsert decides insert / update / unchanged per row with one
+    dict lookup, without downloading the sheet. The index is tied to the
+    worksheet id and header it was built for; on any mismatch it is rebuilt
+    from one read of the sheet.
+
+    Arguments:
+        path: JSON file holding the index, created on first save()
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        state = read_json(path)
+        self.sheet_id = state.get("sheet_id")
+        self.header: List[str] = state.get("header", [])
+        # id -> [sheet row number, content hash]
+        self.rows: Dict[str, list] = state.get("rows", {})
+        self.next_row = state.get("next_row", 1)
+
+    def matches(self, sheet_id, header: List[str]) -> bool:
+        return self.sheet_id == sheet_id and self.header == header and self.next_row > 1
+
+    def rebuild(self, sheet_id, values: List[List[str]], id_column: str):
+        """Index the values of the whole sheet, the header row included."""
+        self.sheet_id = sheet_id
+        self.header = list(values[0]) if values else []
+        self.rows = {}
+        self.next_row = len(values) + 1
+        if id_column not in self.header:
+            return
+        id_col = self.header.index(id_column)
+        width = len(self.header)
+        for row_number, row in enumerate(values[1:], start=2):
+            cells = (list(row) + [""] * width)[:width]
+            self.rows[cells[id_col]] = [row_number, content_hash(cells)]
+        logger.info("Rebuilt the row index of sheet %s, %s rows", sheet_id, len(self.rows))
+
+    def save(self):
+        write_json(self.path, {"sheet_id": self.sheet_id, "header": self.header,
+                                "rows": self.rows, "next_row": self.next_row})
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.rate_limiter import RateLimitManager, SharedRateLimiter
+from src.row_index import KEY_COLUMNS, key_hashes
+
+if TYPE_CHECKING:
+    from src.utils import GsheetAIAuto
+
+logger = logging.getLogger(__name__)
+
+# set in every worker process by _init_worker
+_worker = {}
+
+
+def shard_of(df: pd.DataFrame, shards: int, key_columns: Sequence[str] = KEY_COLUMNS) -> np.ndarray:
+    """Shard number of every row, from its key columns, so a row always lands in the same shard."""
+    return (key_hashes(df, key_columns) % np.uint64(shards)).astype(np.int64)
+
+
+def split_shards(df: pd.DataFrame, shards: int, key_columns: Sequence[str] = KEY_COLUMNS) -> List[pd.DataFrame]:
+    """df split into `shards` frames by shard_of(), rows keep their order within a shard."""
+    if df.empty:
+        return [df] * shards
+    numbers = shard_of(df, shards, key_columns)
+    return [df[numbers == shard] for shard in range(shards)]
+
+
+def _init_worker(gsheetauto: GsheetAIAuto, budget):
+    from src.utils import GsheetAIAuto
+    _worker["gsheetauto"] = gsheetauto if gsheetauto is not None else GsheetAIAuto()
+    _worker["rate_limiter"] = SharedRateLimiter(budget)
+
+
+def worker_state() -> Tuple[GsheetAIAuto, SharedRateLimiter]:
+    """The GsheetAIAuto and rate limiter of the worker process a shard runs in."""
+    return _worker["gsheetauto"], _worker["rate_limiter"]
+
+
+class ShardPool:
+    """
+    Process pool for running shards of the pipeline side by side.
+
+    All workers draw on one Groq budget: a RateLimitManager process holds the
+    RateLimiter and every worker gets a SharedRateLimiter on it. Where fork
+    is available the workers inherit gsheetauto (and everything else the
+    parent set up), otherwise each one builds its own GsheetAIAuto.
+    Metrics recorded in the workers stay in the workers.
+
+    Arguments:
+        shards: worker processes
+        requests_per_minute: Groq request budget of the whole pool
+        tokens_per_minute: Groq token budget of the whole pool
+        gsheetauto: GsheetAIAuto the workers use, when they are forked
+
+    While the pool is open, `budget` is the proxy of the shared RateLimiter.
+    """
+
+    def __init__(self, shards: int, requests_per_minute: float, tokens_per_minute: float,
+                 gsheetauto: GsheetAIAuto = None):
+        self.shards = shards
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.gsheetauto = gsheetauto
+        self.budget = None
+        self._manager = None
+        self._executor = None
+
+    def __enter__(self) -> "ShardPool":
+        self._manager = RateLimitManager()
+        self._manager.start()
+        self.budget = self._manager.RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+        fork = "fork" in mp.get_all_start_methods()
+        context = mp.get_context("fork" if fork else None)
+        self._executor = ProcessPoolExecutor(self.shards, mp_context=context, initializer=_init_worker,
+                                             initargs=(self.gsheetauto if fork else None, self.budget))
+        logger.info("Started %s shard workers", self.shards)
+        return self
+
+    def map(self, fn: Callable, calls: List[tuple]) -> List:
+        """Run fn(*args) for every args of calls in the pool; results come back in the order of calls."""
+        futures = [self._executor.submit(fn, *args) for args in calls]
+        return [future.result() for future in futures]
+
+    def __exit__(self, *exc):
+        self._executor.shutdown(cancel_futures=True)
+        self._manager.shutdown()
+        return False
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+
+from src.instrumentation import metrics
+from src.rate_limiter import RETRY_STATUS_CODES
+
+if TYPE_CHECKING:
+    from gspread.worksheet import Worksheet
+
+logger = logging.getLogger(__name__)
+
+# gspread raises the requests exceptions on network failures, they do not derive from the builtin ones
+NETWORK_ERRORS = (ConnectionError, TimeoutError, RequestsConnectionError, Timeout)
+
+
+def rowcol_to_a1(row: int, col: int) -> str:
+    """(1, 1) -> "A1", (5, 28) -> "AB5", like gspread.utils.rowcol_to_a1 without importing gspread."""
+    label = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        label = chr(65 + rem) + label
+    return f"{label}{row}"
+
+
+class ChunkWriteError(Exception):
+    """A chunk still failed after all retries; the writer can be resumed with write()/append()."""
+
+    def __init__(self, chunk: int, error: Exception):
+        super().__init__(f"Chunk {chunk} failed: {error}")
+        self.chunk = chunk
+        self.error = error
+
+
+class ChunkedSheetWriter:
+    """
+    Writes a large table to a worksheet in size-bounded requests.
+
+    Every chunk is retried on its own, and chunks that were written are
+    remembered, so calling write()/append() again with the same values after
+    a ChunkWriteError only sends the chunks that have not been written yet.
+
+    Arguments:
+        worksheet: gspread Worksheet instance
+        max_cells_per_chunk: upper bound for rows x columns sent in one request
+        max_retries: retries per chunk on 429/5xx and connection errors
+        base_delay: first backoff delay in seconds, doubled on each retry
+        stage: metrics stage the requests are counted under
+    """
+
+    def __init__(self, worksheet: Worksheet, max_cells_per_chunk: int = 50_000,
+                 max_retries: int = 5, base_delay: float = 1.0,
+                 sleep: Callable[[float], None] = time.sleep,
+                 stage: str = "upload_rows_to_gsheets"):
+        self.worksheet = worksheet
+        self.stage = stage
+        self.max_cells_per_chunk = max_cells_per_chunk
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._sleep = sleep
+        self.completed_chunks = set()
+        self.stats = {"chunks": 0, "rows": 0, "cells": 0, "retries": 0, "seconds": 0.0}
+
+    def chunks(self, values: List[List[Any]]) -> List[List[List[Any]]]:
+        width = max((len(row) for row in values), default=1) or 1
+        rows_per_chunk = max(1, self.max_cells_per_chunk // width)
+        return [values[start:start + rows_per_chunk] for start in range(0, len(values), rows_per_chunk)]
+
+    def write(self, values: List[List[Any]], start_row: int = 1, start_col: int = 1) -> Dict:
+        """Write values into the sheet starting at (start_row, start_col)."""
+        row = start_row
+        for chunk_no, chunk in enumerate(self.chunks(values)):
+            range_name = rowcol_to_a1(row, start_col)
+            self._send(chunk_no, chunk, lambda chunk=chunk, range_name=range_name:
+                       self.worksheet.update(range_name=range_name, values=chunk))
+            row += len(chunk)
+        return self.throughput()
+
+    def append(self, values: List[List[Any]]) -> Dict:
+        """Append values after the last row of the table starting at A1."""
+        for chunk_no, chunk in enumerate(self.chunks(values)):
+            self._send(chunk_no, chunk, lambda chunk=chunk:
+                       self.worksheet.append_rows(chunk, table_range="A1"))
+        return self.throughput()
+
+    def update_ranges(self, batches: List[List[Dict]]) -> Dict:
+        """
+        Send every batch of {"range", "values"} updates as one batch_update request.
+        The batches are numbered like chunks, so a writer resumes one kind of call only.
+        """
+        for chunk_no, batch in enumerate(batches):
+            rows = [row for item in batch for row in item["values"]]
+            self._send(chunk_no, rows, lambda batch=batch: self.worksheet.batch_update(batch))
+        return self.throughput()
+
+    def _send(self, chunk_no: int, chunk: List[List[Any]], request: Callable):
+        if chunk_no in self.completed_chunks:
+            return
+
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                request()
+                break
+            except Exception as e:
+                status = getattr(e, "code", None) or getattr(e, "status_code", None)
+                retryable = status in RETRY_STATUS_CODES or isinstance(e, NETWORK_ERRORS)
+                if not retryable or attempt >= self.max_retries:
+                    raise ChunkWriteError(chunk_no, e) from e
+                delay = random.uniform(0, self.base_delay * 2 ** attempt)
+                logger.info("Chunk %s failed with %s, retrying in %.2fs", chunk_no, status or type(e).__name__, delay)
+                self.stats["retries"] += 1
+                attempt += 1
+                self._sleep(delay)
+
+        self.completed_chunks.add(chunk_no)
+        self.stats["chunks"] += 1
+        self.stats["rows"] += len(chunk)
+        self.stats["cells"] += sum(len(row) for row in chunk)
+        self.stats["seconds"] += time.perf_counter() - started
+        if metrics.enabled:
+            metrics.add(self.stage, api_calls=attempt + 1, retries=attempt,
+                        cells=sum(len(row) for row in chunk),
+                        bytes=len(json.dumps(chunk, default=str)))
+
+    def throughput(self) -> Dict:
+        seconds = self.stats["seconds"] or float("nan")
+        report = {**self.stats,
+                  "rows_per_second": self.stats["rows"] / seconds,
+                  "cells_per_second": self.stats["cells"] / seconds}
+        logger.info("Wrote %s rows (%s cells) to %s in %s chunks, %.0f rows/s, %.0f cells/s",
+                    report["rows"], report["cells"], self.worksheet.title, report["chunks"],
+                    report["rows_per_second"], report["cells_per_second"])
+        return report
@@ -0,0 +1,35 @@
+import json
+import os
+from typing import Callable, Dict
+
+
+def ensure_parent_dir(path: str):
+    """Create the folder a file is written to, if the path has one."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+
+def atomic_write(path: str, write: Callable[[str], None], suffix: str = ".tmp"):
+    """
+    Call write() with a temporary path next to path and move the result over
+    path, so a crash leaves either the old file or the new one, never half of it.
+    """
+    ensure_parent_dir(path)
+    tmp_path = f"{path}{suffix}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def write_json(path: str, state: Dict):
+    def dump(tmp_path: str):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+    atomic_write(path, dump)
+
+
+def read_json(path: str) -> Dict:
+    """The state in a JSON file, {} when there is no file yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
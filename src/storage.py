@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import logging
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+from typing import TYPE_CHECKING, Dict, List
+
+import pandas as pd
+
+from src.sheet_writer import ChunkedSheetWriter
+from src.state_files import atomic_write, ensure_parent_dir
+
+if TYPE_CHECKING:
+    from gspread.worksheet import Worksheet
+    from src.row_index import SheetIndex
+    from src.utils import GsheetAIAuto
+
+logger = logging.getLogger(__name__)
+
+TABLES = ("raw_data", "staging", "processed")
+LOCAL_BACKENDS = ("parquet", "sqlite")
+
+
+def _key_strings(values) -> pd.Series:
+    # ids read back from Sheets or SQLite can be ints or strings, compare them as text
+    return pd.Series(values).astype(str).str.replace(r"\.0$", "", regex=True)
+
+
+class StorageBackend(ABC):
+    """
+    One table of the pipeline (raw_data, staging or processed).
+
+    Every backend can read the whole table, append rows, upsert rows by a
+    key column, clear the table and check that a set of keys arrived.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def read(self) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def append(self, df: pd.DataFrame) -> int:
+        ...
+
+    @abstractmethod
+    def upsert(self, df: pd.DataFrame, key: str = "id") -> Dict:
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    def verify(self, ids: List, key: str = "id") -> bool:
+        """Local backends write synchronously, there is nothing that can go missing."""
+        return True
+
+
+class SheetsBackend(StorageBackend):
+    """
+    A worksheet, through GsheetAIAuto.
+
+    Arguments:
+        gsheetauto: GsheetAIAuto doing the reads and uploads
+        worksheet: gspread Worksheet instance
+        protected: never clear the worksheet when rewriting it
+        index: SheetIndex of the worksheet; upserts then go through it
+            instead of reading the sheet
+    """
+
+    name = "sheets"
+
+    def __init__(self, gsheetauto: GsheetAIAuto, worksheet: Worksheet, protected: bool = False,
+                 index: SheetIndex = None):
+        self.gsheetauto = gsheetauto
+        self.worksheet = worksheet
+        self.protected = protected
+        self.index = index
+
+    def read(self) -> pd.DataFrame:
+        return self.gsheetauto.pull_gsheet_data_to_df(self.worksheet, process=False)
+
+    def append(self, df: pd.DataFrame) -> int:
+        writer = ChunkedSheetWriter(self.worksheet)
+        if self.worksheet.row_values(1):
+            writer.append(df.values.tolist())
+        else:
+            writer.write([df.columns.tolist()] + df.values.tolist())
+        return len(df)
+
+    def upsert(self, df: pd.DataFrame, key: str = "id") -> Dict:
+        # the uploads match rows on their id/Id column, there is no other key to upsert by
+        if key.lower() != "id" or (len(df.columns) and key not in df.columns):
+            raise ValueError(f"The sheets backend upserts by the id column, not '{key}'.")
+        return self.gsheetauto.upload_rows_to_gsheets(self.worksheet, df, df.columns.tolist(), self.protected,
+                                                      mode="append" if self.index is None else "indexed",
+                                                      row_index=self.index)
+
+    def clear(self):
+        self.worksheet.clear()
+        if self.index is not None:
+            self.index.rebuild(None, [], "id")
+            self.index.save()
+
+    def verify(self, ids: List, key: str = "id") -> bool:
+        return self.gsheetauto.verify_upload(self.worksheet, ids, key)
+
+
+class ParquetBackend(StorageBackend):
+    """
+    A table kept in one Parquet file, rewritten atomically on every change.
+    Needs pyarrow, which is in requirements.txt.
+
+    Arguments:
+        path: the .parquet file, created on the first write
+    """
+
+    name = "parquet"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self) -> pd.DataFrame:
+        if not os.path.exists(self.path):
+            return pd.DataFrame()
+        return pd.read_parquet(self.path)
+
+    def _write(self, df: pd.DataFrame):
+        df = df.reset_index(drop=True)
+        # Parquet columns need one type, mixed object columns are stored as text
+        for col in df.columns[df.dtypes == object]:
+            if pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty"):
+                df[col] = df[col].astype(str)
+        atomic_write(self.path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+    def append(self, df: pd.DataFrame) -> int:
+        self._write(pd.concat([self.read(), df], ignore_index=True))
+        return len(df)
+
+    def upsert(self, df: pd.DataFrame, key: str = "id") -> Dict:
+        # a key given twice is upserted once, with its last row
+        df = df[~_key_strings(df[key]).duplicated(keep="last").to_numpy()]
+        existing = self.read()
+        if existing.empty:
+            self._write(df)
+            return {"inserted": len(df), "updated": 0}
+
+        existing_keys = _key_strings(existing[key]).to_numpy()
+        new_keys = _key_strings(df[key]).to_numpy()
+        is_update = pd.Index(new_keys).isin(existing_keys)
+        combined = pd.concat([existing.set_axis(existing_keys), df.set_axis(new_keys)])
+        combined = combined[~combined.index.duplicated(keep="last")]
+        # replaced rows keep their place, new rows go to the end
+        order = pd.Index(existing_keys).append(pd.Index(new_keys[~is_update]))
+        self._write(combined.loc[order])
+        updated = int(is_update.sum())
+        logger.info("Upserted %s rows into %s, %s updated", len(df), self.path, updated)
+        return {"inserted": len(df) - updated, "updated": updated}
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    A table in a SQLite database. upsert() keeps one row per key with a
+    unique index and INSERT ... ON CONFLICT DO UPDATE, so rows keep their order.
+
+    Arguments:
+        path: database file, shared by all tables
+        table: table name
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, table: str):
+        self.path = path
+        self.table = table
+        ensure_parent_dir(path)
+        self._conn = sqlite3.connect(path)
+
+    def _columns(self) -> List[str]:
+        return [row[1] for row in self._conn.execute(f'PRAGMA table_info("{self.table}")')]
+
+    @staticmethod
+    def _sql_type(dtype) -> str:
+        if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+            return "INTEGER"
+        if pd.api.types.is_float_dtype(dtype):
+            return "REAL"
+        return "TEXT"
+
+    def _ensure_table(self, df: pd.DataFrame):
+        existing = self._columns()
+        if not existing:
+            cols = ", ".join(f'"{col}" {self._sql_type(df[col].dtype)}' for col in df.columns)
+            self._conn.execute(f'CREATE TABLE "{self.table}" ({cols})')
+            return
+        for col in df.columns:
+            if col not in existing:
+                self._conn.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "{col}" {self._sql_type(df[col].dtype)}')
+
+    @staticmethod
+    def _rows(df: pd.DataFrame) -> List[list]:
+        # plain Python values, missing values become NULL
+        return df.astype(object).where(df.notna(), None).values.tolist()
+
+    def read(self) -> pd.DataFrame:
+        if not self._columns():
+            return pd.DataFrame()
+        return pd.read_sql_query(f'SELECT * FROM "{self.table}" ORDER BY rowid', self._conn)
+
+    def append(self, df: pd.DataFrame) -> int:
+        if df.empty:
+            return 0
+        with self._conn:
+            self._ensure_table(df)
+            cols = ", ".join(f'"{col}"' for col in df.columns)
+            marks = ", ".join("?" for _ in df.columns)
+            self._conn.executemany(f'INSERT INTO "{self.table}" ({cols}) VALUES ({marks})', self._rows(df))
+        return len(df)
+
+    def upsert(self, df: pd.DataFrame, key: str = "id") -> Dict:
+        if df.empty:
+            return {"inserted": 0, "updated": 0}
+        with self._conn:
+            self._ensure_table(df)
+            self._conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{self.table}_{key}" ON "{self.table}" ("{key}")')
+            existing = {str(row[0]) for row in self._conn.execute(f'SELECT "{key}" FROM "{self.table}"')}
+            updated = int(_key_strings(df[key]).isin(existing).sum())
+
+            cols = ", ".join(f'"{col}"' for col in df.columns)
+            marks = ", ".join("?" for _ in df.columns)
+            updates = ", ".join(f'"{col}" = excluded."{col}"' for col in df.columns if col != key)
+            self._conn.executemany(
+                f'INSERT INTO "{self.table}" ({cols}) VALUES ({marks}) '
+                f'ON CONFLICT ("{key}") DO UPDATE SET {updates}', self._rows(df))
+        logger.info("Upserted %s rows into %s, %s updated", len(df), self.table, updated)
+        return {"inserted": len(df) - updated, "updated": updated}
+
+    def clear(self):
+        if self._columns():
+            with self._conn:
+                self._conn.execute(f'DELETE FROM "{self.table}"')
+
+    def close(self):
+        self._conn.close()
+
+
+def open_local_tables(kind: str, directory: str) -> Dict[str, StorageBackend]:
+    """The raw_data/staging/processed tables of a local mirror in directory."""
+    if kind == "parquet":
+        return {table: ParquetBackend(os.path.join(directory, f"{table}.parquet")) for table in TABLES}
+    if kind == "sqlite":
+        return {table: SQLiteBackend(os.path.join(directory, "pipeline.sqlite"), table) for table in TABLES}
+    raise ValueError(f"Unknown local storage backend '{kind}'.")
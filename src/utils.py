@@ -1,18 +1,30 @@
+from __future__ import annotations
 import sys, os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-import ast
+import json
+import numpy as np
 import pandas as pd
-from typing import  Dict, List
-import gspread as gsp
-from configs.config import creds, sheet_id, csv_path ,GROQ_API_KEY
-from gspread.client import Client
-from gspread.worksheet import Worksheet
-from gspread import Spreadsheet
-from groq import Groq
-import matplotlib.pyplot as plt
-from gspread.exceptions import APIError
-import time
+from typing import  Callable, Dict, List, TYPE_CHECKING
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src.rate_limiter import RateLimiter
+from src.cache import ReviewCache
+from src.batching import BatchPlanner
+from src.dedup import ReviewDeduplicator
+from src.preclassify import PreClassifier
+from src.journal import ResultJournal
+from src.llm_output import ParseMetrics, is_valid_item, parse_results
+from src.sheet_writer import ChunkedSheetWriter, ChunkWriteError, rowcol_to_a1
+from src.row_index import RowKeys, SheetIndex, content_hash
+from src.instrumentation import metrics
+
+# gspread and groq are slow to import, so they are only imported where they are used
+if TYPE_CHECKING:
+    from gspread.client import Client
+    from gspread.worksheet import Worksheet
+    from gspread import Spreadsheet
+    from groq import Groq
 
 logger = logging.getLogger(__name__)
 
@@ -20,49 +32,173 @@ logging.basicConfig(level=logging.INFO,
                     format= "%(levelname)s - %(message)s - %(asctime)s")
  
 
+# bump whenever GROQ_SYSTEM_PROMPT changes, so cached results are not reused
+GROQ_PROMPT_VERSION = "2"
+
+GROQ_SYSTEM_PROMPT = """
+    You are an expert women clothing e-commerce review summarizer.
+
+    You receive a JSON list of reviews, each with an "id" and a "review".
+    Your tasks for EACH review:
+    1. Produce a clear one-sentence summary.
+    2. Assign sentiment: "positive", "negative", or "neutral".
+    3. If text is too short to summarize, output summary=text
+
+    RETURN FORMAT (STRICT):
+    Return ONLY a JSON object with exactly one item per review id, like:
+    {"results": [
+        {"id": 0, "summary": "...", "sentiment": "positive|negative|neutral"}
+    ]}
+"""
+
+
+# dtypes of the Womens Clothing E-Commerce Reviews columns, so pandas does not have to infer them
+DATASET_DTYPES = {
+    "Clothing ID": "int32",
+    "Age": "int16",
+    "Title": "object",
+    "Review Text": "object",
+    "Rating": "int8",
+    "Recommended IND": "int8",
+    "Positive Feedback Count": "int32",
+    "Division Name": "object",
+    "Department Name": "object",
+    "Class Name": "object",
+}
+
+
+def _keep_column(col: str) -> bool:
+    # the csv carries its own index as an unnamed first column
+    return col != 'Unnamed: 0'
+
+
+def _int_or_zero(value) -> int:
+    # usage fields can be missing or mocked
+    return value if isinstance(value, int) else 0
+
+
+def _cell_text(value) -> str:
+    """Text a value shows as in a sheet cell, so 4, 4.0 and "4" compare equal."""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
 
 class GsheetAIAuto:
 
     logging.info('...starting the pipeline')
 
+    def __init__(self):
+        # spreadsheet id -> {worksheet title: Worksheet}, filled once per run
+        self._worksheet_registry = {}
+        # how well the Groq responses could be parsed, across every batch
+        self.parse_metrics = ParseMetrics()
+
     def create_client(self, credential:str) -> Client:
         logging.info('creating GSheet client')
+        import gspread as gsp
         return gsp.authorize(credential)
 
+    def create_groq_client(self, api_key: str) -> Groq:
+        # the rate limiter retries throttled calls, so the client's own retries are off
+        from groq import Groq
+        return Groq(api_key=api_key, max_retries=0)
+
     def get_spreadsheet(self, client: Client, spreadsheet_id:str):
         logging.info('...getting spreeadsheet with id %s', spreadsheet_id)
         return client.open_by_key(spreadsheet_id)
 
+    @metrics.instrument()
     def read_dataset(self, file_path:str, no_of_rows: int):
         logging.info('..importing dataset')
-        df = pd.read_csv(file_path).head(no_of_rows).drop('Unnamed: 0', axis=1).fillna("") 
+        # only parse the rows we keep, and skip the index column entirely
+        df = pd.read_csv(file_path, nrows=no_of_rows, usecols=_keep_column,
+                         dtype=DATASET_DTYPES).fillna("")
+        metrics.add("read_dataset", rows=len(df))
         return [df.values.tolist() , df.columns.tolist()]
 
+    def dataset_columns(self, file_path:str) -> List[str]:
+        """Column names of the dataset, read from the header line only."""
+        return pd.read_csv(file_path, nrows=0, usecols=_keep_column).columns.tolist()
+
+    def iter_dataset(self, file_path:str, no_of_rows: int = None, chunksize: int = 5000,
+                     usecols: List[str] = None, dtype: Dict = None):
+        """
+        Stream the dataset as [rows, columns] batches of at most chunksize rows,
+        stopping after no_of_rows rows (None reads the whole file).
+        Only one batch is held in memory at a time.
+        """
+        logging.info('..streaming dataset in batches of %s rows', chunksize)
+        reader = pd.read_csv(file_path, nrows=no_of_rows, chunksize=chunksize,
+                             usecols=usecols or _keep_column,
+                             dtype=DATASET_DTYPES if dtype is None else dtype)
+        with reader:
+            chunks = iter(reader)
+            while True:
+                # every batch counts as one read_dataset call, the consumer's time is left out
+                with metrics.span("read_dataset") as span:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    chunk = chunk.fillna("")
+                    batch = [chunk.values.tolist(), chunk.columns.tolist()]
+                    span.add(rows=len(chunk))
+                yield batch
+
+
+    def records_to_frame(self, records: List[List], col_names: List[str], start_id: int = 1,
+                         row_keys: RowKeys = None) -> pd.DataFrame:
+        """
+        The DataFrame of one uploaded batch, with the same ids upload_rows_to_gsheets
+        gives the rows, so the pipeline can go on from memory instead of reading the sheet back.
+        With row_keys the ids come from the content of the rows instead of their
+        position, so a row keeps its id when the source file is reordered.
+        """
+        df = pd.DataFrame(records, columns=col_names)
+        if 'id' not in [col.lower() for col in col_names]:
+            df['id'] = row_keys.assign(df) if row_keys is not None else np.arange(start_id, start_id + len(df))
+        return df
 
     # def read_dataset1(self,file_path:str, no_of_rows: int):
     #     return pd.read_csv(file_path).head(no_of_rows).drop('Unnamed: 0', axis=1).fillna("") 
 
 
+    def worksheets(self, spreadsheet:Spreadsheet) -> Dict[str, Worksheet]:
+        """
+        Worksheets of the spreadsheet by title. The metadata is fetched once per
+        run and kept up to date by get_worksheet and clean_sheet.
+        """
+        key = getattr(spreadsheet, "id", None) or id(spreadsheet)
+        if key not in self._worksheet_registry:
+            logging.info('Fetching worksheet metadata')
+            self._worksheet_registry[key] = {ws.title: ws for ws in spreadsheet.worksheets()}
+        return self._worksheet_registry[key]
+
     def clean_sheet(self, spreadsheet:Spreadsheet):
         logging.info('Removing unnessary worksheet in the spreadsheet')
-        ss_worksheet = [ws.title for ws in spreadsheet.worksheets()] 
-        for ss_ws in ss_worksheet:
-            if ss_ws not in ['raw_data', 'staging','processed']:
-                spreadsheet.del_worksheet(spreadsheet.worksheet(ss_ws))
-                logging.info('Deleted %s', ss_ws)
+        registry = self.worksheets(spreadsheet)
+        to_delete = [title for title in registry if title not in ['raw_data', 'staging','processed']]
+        if not to_delete:
+            return
+        # a single batch_update deletes every sheet in one round trip
+        spreadsheet.batch_update({"requests": [{"deleteSheet": {"sheetId": registry[title].id}}
+                                               for title in to_delete]})
+        for title in to_delete:
+            del registry[title]
+            logging.info('Deleted %s', title)
 
     def get_worksheet(self, spreadsheet:Spreadsheet, worsheet_title:str, row:int, col:int ):
         logging.info('Getting worksheet %s',worsheet_title )
-        ss_worksheet = [ws.title for ws in spreadsheet.worksheets()] # map(lambda x:x.title, spreadsheet.worksheets())  #[ws.title for ws in spreadsheet.worksheets()] 
-        #print(ss_worksheet) 
-        if worsheet_title in ss_worksheet:
+        registry = self.worksheets(spreadsheet)
+        if worsheet_title in registry:
             logging.info(f"{worsheet_title} worksheet found")
-            return spreadsheet.worksheet(worsheet_title)
+            return registry[worsheet_title]
         else:
             logging.info(f"{worsheet_title} does not exists, need to create one")
-            return spreadsheet.add_worksheet(title=worsheet_title, rows=row , cols=col )
-        
-        
+            registry[worsheet_title] = spreadsheet.add_worksheet(title=worsheet_title, rows=row , cols=col )
+            return registry[worsheet_title]
 
 
     # def  upload_rows_to_gsheets(self, worksheet: Worksheet,
@@ -77,61 +213,129 @@ class GsheetAIAuto:
 
     #     print('Record uploaded successfully!!!')
     
+    @metrics.instrument()
     def upload_rows_to_gsheets(self, worksheet: Worksheet, records: List, 
-                               col_names: List[str], protected: bool = False):
+                               col_names: List[str], protected: bool = False,
+                               mode: str = "rewrite", chunk_cells: int = 50_000,
+                               start_id: int = 1, row_index: SheetIndex = None,
+                               writer: ChunkedSheetWriter = None):
         """
         Upload data to Google Sheets safely.
         
         Arguments:
             worksheet: gspread Worksheet instance
-            records: List of lists (rows) or list of dicts
+            records: List of lists (rows), list of dicts or a DataFrame
             col_names: List of column names
             protected: If True, worksheet is read-only and won't be cleared
+            mode: "rewrite" clears the sheet and writes every row again when
+                anything is new or changed; "append" appends only the new
+                rows and updates only the changed cells of existing ids;
+                "indexed" does the same from row_index, without reading the sheet
+            chunk_cells: largest number of cells sent in one request, bigger
+                tables are written in chunks that are retried on their own
+            start_id: id given to the first record when ids are added, so
+                batches of one stream keep counting from the previous batch
+            row_index: SheetIndex of the worksheet, needed by the "indexed" mode
+            writer: ChunkedSheetWriter of a rewrite that raised ChunkWriteError;
+                passing it back with the same records only sends the chunks
+                that were not written yet
+
+        A rewrite that takes more than one chunk writes over the old table
+        and then clears what is left of it, so a failed chunk never leaves
+        the sheet cut off.
         """
         
         logging.info(f"Uploading data to %s worksheet", worksheet  )
+        from gspread.worksheet import Worksheet
+        from gspread.exceptions import APIError
         if not isinstance(worksheet, Worksheet):
             raise ValueError("Invalid worksheet provided.")
         
-        # Convert list-of-lists to list-of-dicts if needed
-        if len(records) > 0 and isinstance(records[0], list):
-            records = [dict(zip(col_names, row)) for row in records]
+        # everything is uploaded as a header and lists of cell values,
+        # a DataFrame goes straight to them without a dict per row
+        if isinstance(records, pd.DataFrame):
+            keys, rows = records.columns.tolist(), records.to_numpy(dtype=object).tolist()
+        elif len(records) > 0 and isinstance(records[0], dict):
+            keys, rows = list(records[0].keys()), [list(row.values()) for row in records]
+        else:
+            keys, rows = list(col_names), [list(row) for row in records]
 
-        if 'id' not in [col.lower() for col in col_names]:
+        if 'id' not in [col.lower() for col in keys]:
             # Add id to each row for idempotency
-            for i, row in enumerate(records):
-                row['id'] = i + 1
+            keys.append('id')
+            for i, row in enumerate(rows):
+                row.append(i + start_id)
+        id_col = keys.index('id') if 'id' in keys else next(i for i, col in enumerate(keys) if col.lower() == 'id')
+
+        if mode not in ("rewrite", "append", "indexed"):
+            raise ValueError(f"Unknown upload mode '{mode}'.")
+        if mode == "indexed" and row_index is None:
+            raise ValueError("The indexed upload mode needs a row_index.")
+        metrics.add("upload_rows_to_gsheets", rows=len(rows))
 
         try:
+            if mode == "indexed":
+                status = self._upload_rows_indexed(worksheet, keys, rows, row_index, chunk_cells)
+                if status is not None:
+                    return status
+                logging.info("Columns of %s do not match the records, rewriting the sheet", worksheet.title)
+                row_index.rebuild(None, [], 'id')
+                row_index.save()
+
+            if mode == "append":
+                status = self._upload_rows_diff(worksheet, keys, rows, chunk_cells)
+                if status is not None:
+                    return status
+                logging.info("Columns of %s do not match the records, rewriting the sheet", worksheet.title)
+
             # Fetch existing records for idempotency
             existing_records = worksheet.get_all_records()
-            existing_ids = {(r.get('id') or r.get('Id')) for r in existing_records if 'id'in r or  "Id" in r}
+            metrics.add("upload_rows_to_gsheets", api_calls=1)
+            existing_by_id = {(r.get('id') or r.get('Id')): r for r in existing_records if 'id'in r or  "Id" in r}
+            existing_ids = set(existing_by_id)
 
             #print(existing_records)
             #print(existing_ids)
             logging.info(f"{len(existing_ids)} number of records already exists")
 
             # Only keep new rows that don’t exist yet
-            new_records = [row for row in records if (row.get('id') or row.get('Id')) not in existing_ids]
+            new_records = [row for row in rows if row[id_col] not in existing_ids]
+            # and rows whose content changed since they were uploaded
+            changed_records = [row for row in rows if row[id_col] in existing_ids
+                               and any(_cell_text(existing_by_id[row[id_col]].get(key, "")) != _cell_text(value)
+                                       for key, value in zip(keys, row))]
 
             logging.info(f"Adding {len(new_records)} new records")
+            logging.info(f"Updating {len(changed_records)} changed records")
 
-            if not new_records:
-                logging.info(f"No new records to update in worksheet %s ",worksheet.title)
+            if not new_records and not changed_records:
+                logging.info("No new records to update in worksheet %s ",worksheet.title)
                 return {"status": "success", "message": "No new records to update."}
 
+            #the header and every row, including existing ones
+            values = [keys] + rows
+            writer = writer or ChunkedSheetWriter(worksheet, chunk_cells)
+            single_request = len(writer.chunks(values)) == 1
+
             # If not protected, clear the worksheet
-            if not protected:
+            if not protected and single_request:
                 worksheet.clear()
+                metrics.add("upload_rows_to_gsheets", api_calls=1)
 
-            #get the keys and value that will be updated to the sheet
-            keys = list(records[0].keys())
-            values = [keys] + [list(row.values()) for row in records]  # all rows including existing ones
-
-            worksheet.update('A1', values)
+            writer.write(values)
+            if not protected and not single_request:
+                # the old table may be longer or wider than the new one
+                self._clear_outside(worksheet, len(values), len(keys))
             logging.info(f"Records uploaded successfully to '{worksheet.title}'!")
 
-            return {"status": "success", "message": f"{len(new_records)} new records uploaded."}
+            message = f"{len(new_records)} new records uploaded."
+            if changed_records:
+                message += f" {len(changed_records)} records updated."
+            return {"status": "success", "message": message}
+
+        except ChunkWriteError:
+            # raised as is, the caller can resume with the writer
+            raise
 
         except APIError as e:
             if "[403]" in str(e):
@@ -143,9 +347,177 @@ class GsheetAIAuto:
             raise Exception(f"Error while uploading to sheet '{worksheet.title}': {e}")
 
 
-    def process_stg_data(self, df:pd.DataFrame) -> Dict:
+    def _clear_outside(self, worksheet: Worksheet, rows: int, cols: int):
+        """Clear every cell below and to the right of a rows x cols table starting at A1."""
+        last = rowcol_to_a1(max(worksheet.row_count, rows + 1), max(worksheet.col_count, cols + 1))
+        last_col = last.rstrip("0123456789")
+        worksheet.batch_clear([f"A{rows + 1}:{last}", f"{rowcol_to_a1(1, cols + 1)}:{last_col}{rows}"])
+        metrics.add("upload_rows_to_gsheets", api_calls=1)
+
+    def _upload_rows_diff(self, worksheet: Worksheet, keys: List[str], rows: List[List], chunk_cells: int) -> Dict:
+        """
+        Append new rows and patch changed cells, without clearing the sheet.
+        Writes the whole table when the sheet is empty, and returns None when
+        the sheet columns do not match the records so the caller can rewrite.
+        """
+        existing_values = worksheet.get_all_values()
+        metrics.add("upload_rows_to_gsheets", api_calls=1)
+        header = existing_values[0] if existing_values else []
+
+        if not header:
+            if rows:
+                ChunkedSheetWriter(worksheet, chunk_cells).write([keys] + rows)
+            logging.info(f"Records uploaded successfully to '{worksheet.title}'!")
+            return {"status": "success", "message": f"{len(rows)} new records uploaded."}
+
+        id_col = next((i for i, col in enumerate(header) if col in ('id', 'Id')), None)
+        if id_col is None or header != keys:
+            return None
+
+        # id -> (sheet row number, row values), the header is row 1
+        existing_by_id = {row[id_col]: (row_number, row)
+                          for row_number, row in enumerate(existing_values[1:], start=2) if len(row) > id_col}
+        logging.info(f"{len(existing_by_id)} number of records already exists")
+
+        new_rows = []
+        cell_updates = []
+        changed_ids = set()
+        for row in rows:
+            row_id = _cell_text(row[id_col])
+            if row_id not in existing_by_id:
+                new_rows.append(row)
+                continue
+            row_number, existing_row = existing_by_id[row_id]
+            for col_number, value in enumerate(row, start=1):
+                existing_value = existing_row[col_number - 1] if col_number <= len(existing_row) else ""
+                if _cell_text(value) != _cell_text(existing_value):
+                    cell_updates.append({"range": rowcol_to_a1(row_number, col_number), "values": [[value]]})
+                    changed_ids.add(row_id)
+
+        logging.info(f"Adding {len(new_rows)} new records")
+        logging.info(f"Updating {len(cell_updates)} cells in {len(changed_ids)} changed records")
+
+        if not new_rows and not cell_updates:
+            logging.info("No new records to update in worksheet %s ",worksheet.title)
+            return {"status": "success", "message": "No new records to update."}
+
+        # one range per changed cell, sent in batches of at most chunk_cells cells
+        ChunkedSheetWriter(worksheet, chunk_cells).update_ranges(
+            [cell_updates[start:start + chunk_cells] for start in range(0, len(cell_updates), chunk_cells)])
+        if new_rows:
+            ChunkedSheetWriter(worksheet, chunk_cells).append(new_rows)
+        logging.info(f"Records uploaded successfully to '{worksheet.title}'!")
+
+        message = f"{len(new_rows)} new records uploaded."
+        if changed_ids:
+            message += f" {len(changed_ids)} records updated."
+        return {"status": "success", "message": message}
+
+    def _upload_rows_indexed(self, worksheet: Worksheet, keys: List[str], rows: List[List], row_index: SheetIndex,
+                             chunk_cells: int) -> Dict:
+        """
+        Upsert through the worksheet's SheetIndex: each record is an insert, an
+        update or unchanged by one lookup of its id and content hash, so only new
+        rows are appended and changed rows rewritten, without reading the sheet.
+        The sheet is read once when the index does not match it yet. Returns
+        None when the sheet columns do not match the records so the caller can rewrite.
+        """
+        if not rows:
+            return {"status": "success", "message": "No new records to update."}
+        id_key = next((key for key in keys if key in ('id', 'Id')), None)
+        sheet_id = getattr(worksheet, "id", None)
+        if id_key is None:
+            return None
+        if not row_index.matches(sheet_id, keys):
+            # new index, another sheet or other columns: sync it from the sheet once
+            existing_values = worksheet.get_all_values()
+            metrics.add("upload_rows_to_gsheets", api_calls=1)
+            row_index.rebuild(sheet_id, existing_values, id_key)
+            if row_index.header and row_index.header != keys:
+                return None
+
+        write_header = not row_index.header
+        next_row = 2 if write_header else row_index.next_row
+        new_rows, placed, row_updates = [], {}, []
+        id_col = keys.index(id_key)
+        for values in rows:
+            row_id = _cell_text(values[id_col])
+            digest = content_hash([_cell_text(value) for value in values])
+            entry = placed.get(row_id) or row_index.rows.get(row_id)
+            if entry is None:
+                placed[row_id] = [next_row + len(new_rows), digest]
+                new_rows.append(values)
+            elif entry[1] != digest:
+                row_updates.append((row_id, entry[0], digest, values))
+        logging.info(f"Adding {len(new_rows)} new records")
+        logging.info(f"Updating {len(row_updates)} changed records")
+
+        if not new_rows and not row_updates:
+            logging.info("No new records to update in worksheet %s ",worksheet.title)
+            row_index.save()
+            return {"status": "success", "message": "No new records to update."}
+
+        writer = ChunkedSheetWriter(worksheet, chunk_cells)
+        if write_header:
+            writer.write([keys] + new_rows)
+        elif new_rows:
+            writer.append(new_rows)
+        # one range per changed row, sent in batches of at most chunk_cells cells
+        rows_per_call = max(1, chunk_cells // len(keys))
+        updates = [{"range": f"{rowcol_to_a1(row_number, 1)}:{rowcol_to_a1(row_number, len(keys))}", "values": [values]}
+                   for _, row_number, _, values in row_updates]
+        ChunkedSheetWriter(worksheet, chunk_cells).update_ranges(
+            [updates[start:start + rows_per_call] for start in range(0, len(updates), rows_per_call)])
+
+        # the index only moves on once the sheet was written
+        row_index.sheet_id, row_index.header = sheet_id, keys
+        row_index.rows.update(placed)
+        for row_id, row_number, digest, _ in row_updates:
+            row_index.rows[row_id] = [row_number, digest]
+        row_index.next_row = next_row + len(new_rows)
+        row_index.save()
+        logging.info(f"Records uploaded successfully to '{worksheet.title}'!")
+
+        message = f"{len(new_rows)} new records uploaded."
+        if row_updates:
+            message += f" {len(row_updates)} records updated."
+        return {"status": "success", "message": message}
+
+    @metrics.instrument()
+    def verify_upload(self, worksheet: Worksheet, ids: List, id_column: str = "id") -> bool:
+        """
+        Cheap check that every id made it to the sheet: reads the header row and
+        the id column only, instead of the whole sheet.
+        """
+        header = worksheet.row_values(1)
+        id_col = next((i for i, col in enumerate(header) if col.lower() == id_column.lower()), None)
+        metrics.add("verify_upload", api_calls=1)
+        if id_col is None:
+            logging.warning("No %s column on worksheet %s", id_column, worksheet.title)
+            return False
+        on_sheet = set(worksheet.col_values(id_col + 1)[1:])
+        metrics.add("verify_upload", api_calls=1, cells=len(on_sheet))
+        missing = [row_id for row_id in map(_cell_text, ids) if row_id not in on_sheet]
+        if missing:
+            logging.warning("%s of %s rows are missing on worksheet %s", len(missing), len(ids), worksheet.title)
+            return False
+        logging.info("All %s rows are on worksheet %s", len(ids), worksheet.title)
+        return True
+
+    @metrics.instrument()
+    def process_stg_data(self, df:pd.DataFrame, copy: bool = True, columnar: bool = False) -> Dict:
+        """
+        Standardize column names and normalize every string cell (strip + lower).
+
+        Arguments:
+            df: the raw data
+            copy: set to False when the caller hands df over, it is then changed in place
+            columnar: return the DataFrame itself as "processed_frame" instead of
+                boxing every cell into "processed_records" lists
+        """
         logging.info('Processing the staging data')
-        staging_df = df.copy()
+        metrics.add("process_stg_data", rows=len(df))
+        staging_df = df.copy() if copy else df
         #print('staging dataframe')
         #print(staging_df.head())
 
@@ -156,29 +528,46 @@ class GsheetAIAuto:
         staging_df.columns = refined_cols_list
         #standardize string columns
         logging.info("Normalizing the review text")
-        str_cols = staging_df.select_dtypes(include=['object']).columns
-        for col in str_cols:
-            staging_df[col] = staging_df[col].str.strip().str.lower()
+        str_cols = staging_df.select_dtypes(include=['object', 'string']).columns
+        if len(str_cols):
+            # all string columns in one pass, normalizing each distinct value once
+            block = staging_df[str_cols].to_numpy(dtype=object)
+            codes, uniques = pd.factorize(block.ravel())
+            uniques = pd.Series(uniques, dtype=object)
+            # numbers read back from Sheets can sit in object columns,
+            # .str turns them into NaN so they keep their original value
+            normalized = uniques.str.strip().str.lower()
+            normalized = normalized.where(normalized.notna(), uniques).to_numpy()
+            cells = np.where(codes >= 0, normalized[codes], block.ravel())
+            staging_df[str_cols] = cells.reshape(block.shape)
             
         processed_df = staging_df
 
+        if columnar:
+            return {"processed_cols": processed_df.columns.tolist(),
+                    "processed_frame": processed_df}
+
         return {"processed_cols":processed_df.columns.tolist(),
                 
                 "processed_records":processed_df.values.tolist()
         }
     
 
-    def pull_gsheet_data_to_df(self, worksheet_name: Worksheet, process:True) -> Dict:
+    @metrics.instrument()
+    def pull_gsheet_data_to_df(self, worksheet_name: Worksheet, process:True, columnar: bool = False) -> Dict:
         logging.info(f"Pulling data from {worksheet_name} worksheet")
+        from gspread.worksheet import Worksheet
         if isinstance(worksheet_name, Worksheet):
             
             sheet_data = worksheet_name.get_all_records() #worksheet_name.get_all_values() 
+            metrics.add("pull_gsheet_data_to_df", api_calls=1, rows=len(sheet_data))
             if process == True:
-                process_data = self.process_stg_data(pd.DataFrame(sheet_data))
+                # the frame is built here, so it can be processed without a copy
+                process_data = self.process_stg_data(pd.DataFrame(sheet_data), copy=False, columnar=columnar)
         
                 #print(process_data)
             
-                return {"sheet_data": process_data.get("processed_records"),
+                return {"sheet_data": process_data.get("processed_frame" if columnar else "processed_records"),
                         "worksheet": worksheet_name,
                         "sheet_cols": process_data.get("processed_cols")}
             else: 
@@ -186,6 +575,7 @@ class GsheetAIAuto:
 
 
         
+    @metrics.instrument()
     def apply_groqAI(
         self,
         api_key: str,
@@ -194,109 +584,319 @@ class GsheetAIAuto:
         review_column: str,
         sentiment_column: str = "AI Sentiment",
         summary_column: str = "AI Summary",
-        batch_size: int = 10
+        batch_size: int = 10,
+        max_workers: int = 1,
+        rate_limiter: RateLimiter = None,
+        cache: ReviewCache = None,
+        batch_planner: BatchPlanner = None,
+        deduplicator: ReviewDeduplicator = None,
+        pre_classifier: PreClassifier = None,
+        journal: ResultJournal = None,
+        flush: Callable[[pd.DataFrame], None] = None,
+        flush_every: int = 500
     ):
         """
         Summarizes staging reviews using Groq,
         processed in batches to reduce API calls.
         Output format is a list of dicts.
         Ensures no empty summaries.
-        """
-        logging.info('Using Groq AI')
-        client = Groq(api_key=api_key)
-
-        df_col = [col.replace("_", " ").title() for col in df.columns]
-        df.columns = df_col
 
-        df[summary_column] = None
-        df[sentiment_column] = None
+        max_workers sets how many batches can be in flight at once;
+        with more than one worker the batches are dispatched on a
+        bounded thread pool and results are still applied in row order.
 
-        df_copy = df.copy()
+        Every request goes through rate_limiter (a default RateLimiter
+        when None), which paces calls against the RPM/TPM budgets and
+        retries 429/5xx responses.
 
-        system_prompt = """
-            You are an expert women clothing e-commerce review summarizer.
+        With a cache, reviews already summarized by the same model and
+        prompt version are not sent again; new results are stored in it.
 
-            Your tasks for EACH review:
-            1. Produce a clear one-sentence summary.
-            2. Assign sentiment: "positive", "negative", or "neutral".
-            3. If text is too short to summarize, output summary=text
-
-            RETURN FORMAT (STRICT):
-            Return ONLY a Python list of dictionaries like:
-            [
-                {"summary": "...", "sentiment": "positive|negative|neutral"}
-            ]
-        """
+        A batch_planner replaces the fixed batch_size: batches are packed to
+        a token budget and resized from truncated or roomy responses.
 
-        # Process in batches
-        for start in range(0, df_copy.shape[0], batch_size):
-            batch_df = df_copy.iloc[start:start + batch_size].copy()
-            batch_df[review_column] = batch_df[review_column].fillna("").astype(str)
+        With a deduplicator, duplicate and (optionally) near-duplicate reviews
+        are sent once and the result of their representative is copied to them.
 
-            # Filter valid vs empty reviews
-            valid_mask = batch_df[review_column].str.strip() != ""
-            valid_reviews_df = batch_df[valid_mask]
-            invalid_reviews_df = batch_df[~valid_mask]
+        A pre_classifier decides the rows it is confident about locally (at or
+        above its threshold), with the first sentence as summary; only the
+        other rows are sent to Groq.
 
-            valid_reviews_list = valid_reviews_df[review_column].tolist()
+        With a journal, every finished batch is appended to it, and results
+        it already holds (from a run that died half way) are reused. flush is
+        called with the processed rows every flush_every rows that come back
+        from Groq, so they reach the processed sheet before the whole loop ends.
 
-            # If all reviews empty, skip AI call
-            if len(valid_reviews_list) == 0:
-                for idx in invalid_reviews_df.index:
-                    df_copy.at[idx, summary_column] = ""
-                    df_copy.at[idx, sentiment_column] = "neutral"
-                continue
+        Rows that only got the neutral fallback are neither cached nor
+        journalled; their ids are listed in the attrs["fallback_ids"] of the
+        returned frame, so the caller can leave them to be retried.
+        """
+        logging.info('Using Groq AI')
+        client = self.create_groq_client(api_key)
+        rate_limiter = rate_limiter or RateLimiter()
+        retries_before = rate_limiter.stats["retries"]
+        metrics.add("apply_groqAI", rows=len(df))
 
-            user_prompt = f"Reviews = {valid_reviews_list}"
+        df_col = [col.replace("_", " ").title() for col in df.columns]
+        # a new frame over the same data, the result columns are not added to the caller's frame
+        df = df.set_axis(df_col, axis=1, copy=False)
+
+        # results are collected by row position and assigned as whole columns at the end
+        summaries = np.empty(len(df), dtype=object)
+        sentiments = np.empty(len(df), dtype=object)
+
+        reviews = df[review_column].fillna("").astype(str).reset_index(drop=True)
+
+        # Filter valid vs empty reviews, empty reviews never reach the AI
+        valid_mask = (reviews.str.strip() != "").to_numpy()
+        summaries[~valid_mask] = ""
+        sentiments[~valid_mask] = "neutral"
+        pending = reviews[valid_mask]
+
+        # the same key the cache uses: the normalized review, the model and the prompt version
+        review_keys = {}
+        if cache is not None or journal is not None:
+            review_keys = {pos: ReviewCache.make_key(review, model, GROQ_PROMPT_VERSION) for pos, review in pending.items()}
+
+        # Pick up the results of an interrupted run from the journal
+        if journal is not None:
+            done = journal.load()
+            resumed = [pos for pos, key in review_keys.items() if key in done]
+            summaries[resumed] = [done[review_keys[pos]]["summary"] for pos in resumed]
+            sentiments[resumed] = [done[review_keys[pos]]["sentiment"] for pos in resumed]
+            pending = pending.drop(resumed)
+            metrics.add("apply_groqAI", resumed=len(resumed))
+            logging.info('%s reviews resumed from the journal', len(resumed))
+
+        # Rows the local pre-classifier is sure about never reach the AI either
+        if pre_classifier is not None and len(pending):
+            local, labels = pre_classifier.resolve(df.iloc[pending.index])
+            positions = pending.index.to_numpy()[local]
+            summaries[positions] = pre_classifier.summarize(pending[local]).to_numpy()
+            sentiments[positions] = labels[local]
+            pending = pending[~local]
+            metrics.add("apply_groqAI", pre_classified=len(positions))
+            logging.info('%s reviews decided by the %s pre-classifier', len(positions), pre_classifier.name)
+
+        # Send one review per group of duplicates, the others get its result at the end
+        duplicates = pd.Series(dtype=np.int64)
+        if deduplicator is not None:
+            representatives = deduplicator.representatives(pending)
+            is_representative = representatives.index == representatives.to_numpy()
+            duplicates = representatives[~is_representative]
+            pending = pending[is_representative]
+        # the rows that copy each representative, they are journalled and flushed with its batch
+        copies = duplicates.groupby(duplicates.to_numpy()).groups if len(duplicates) else {}
+
+        # Serve reviews seen on earlier runs from the cache
+        if cache is not None:
+            cache_keys = {pos: review_keys[pos] for pos in pending.index}
+            cached = cache.get_many(cache_keys.values())
+            hit_pos = [pos for pos, key in cache_keys.items() if key in cached]
+            summaries[hit_pos] = [cached[cache_keys[pos]]["summary"] for pos in hit_pos]
+            sentiments[hit_pos] = [cached[cache_keys[pos]]["sentiment"] for pos in hit_pos]
+            pending = pending.drop(hit_pos)
+            metrics.add("apply_groqAI", cache_hits=len(hit_pos))
+            logging.info('%s reviews served from cache, %s sent to Groq', len(hit_pos), len(pending))
+
+        if batch_planner is not None:
+            # cut lazily, so truncations shrink the batches that follow
+            batches = batch_planner.plan(pending)
+        else:
+            batches = [pending.iloc[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+
+        sent = {"reviews": 0, "batches": 0}
+        fallback = np.zeros(len(df), dtype=bool)
+        row_ids = df["Id"].astype(str).to_numpy() if "Id" in df.columns else np.arange(len(df)).astype(str)
+        unflushed = []
+
+        def flush_rows():
+            positions = np.array(unflushed)
+            unflushed.clear()
+            rows = df.iloc[positions].assign(**{summary_column: summaries[positions],
+                                                sentiment_column: sentiments[positions]})
+            flush(self.set_action_needed(rows, sentiment_column=sentiment_column))
+            metrics.add("apply_groqAI", flushed_rows=len(positions))
+
+        def summarize(reviews: pd.Series):
+            results = self._summarize_batch(client, model, reviews.tolist(), rate_limiter,
+                                            batch_planner=batch_planner)
+            return reviews, results
+
+        def apply(reviews: pd.Series, results: List):
+            applied = self._apply_batch_results(summaries, sentiments, reviews, results)
+            sent["reviews"] += len(reviews)
+            sent["batches"] += 1
+            failed = [idx for idx, result in zip(reviews.index, results) if result.get("fallback")]
+            fallback[failed] = True
+            answered = [(idx, summary, sentiment) for idx, (summary, sentiment) in applied.items() if not fallback[idx]]
+            if cache is not None:
+                cache.put_many((review_keys[idx], summary, sentiment) for idx, summary, sentiment in answered)
+            copied = [(int(copy), summary, sentiment) for idx, summary, sentiment in answered
+                      for copy in copies.get(idx, ())]
+            for copy, summary, sentiment in copied:
+                summaries[copy], sentiments[copy] = summary, sentiment
+            if journal is not None:
+                journal.record((row_ids[idx], review_keys[idx], summary, sentiment)
+                               for idx, summary, sentiment in answered + copied)
+            if flush is not None:
+                unflushed.extend(applied)
+                unflushed.extend(copy for copy, _, _ in copied)
+                if len(unflushed) >= flush_every:
+                    flush_rows()
+
+        if max_workers > 1:
+            logging.info('Dispatching batches with %s workers', max_workers)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # at most max_workers batches are in flight; the oldest is always
+                # applied first, so rows keep their position
+                in_flight = deque()
+                for reviews in batches:
+                    in_flight.append(executor.submit(summarize, reviews))
+                    if len(in_flight) >= max_workers:
+                        apply(*in_flight.popleft().result())
+                while in_flight:
+                    apply(*in_flight.popleft().result())
+        else:
+            for reviews in batches:
+                apply(*summarize(reviews))
+
+        if len(duplicates):
+            summaries[duplicates.index] = summaries[duplicates.to_numpy()]
+            sentiments[duplicates.index] = sentiments[duplicates.to_numpy()]
+            fallback[duplicates.index] = fallback[duplicates.to_numpy()]
+            # requests the duplicates would have needed at this run's reviews per request
+            per_request = sent["reviews"] / sent["batches"] if sent["batches"] else batch_size
+            calls_saved = int(np.ceil(len(duplicates) / per_request))
+            deduplicator.record_calls_saved(calls_saved)
+            metrics.add("apply_groqAI", deduplicated=len(duplicates), calls_saved=calls_saved)
+            logging.info('Dedup stats: %s', deduplicator.summary())
+
+        metrics.add("apply_groqAI", retries=rate_limiter.stats["retries"] - retries_before)
+        if cache is not None:
+            cache.evict()
+            logging.info('Cache stats: %s', cache.stats())
+        logging.info('Parse stats: %s', self.parse_metrics.summary())
+        if batch_planner is not None:
+            logging.info('Batch stats: %s', batch_planner.summary())
+
+        df[summary_column] = summaries
+        df[sentiment_column] = sentiments
+        logging.info('Done getting the AI Summary and AI Sentiments')
+        new_df = self.set_action_needed(df, sentiment_column=sentiment_column)
+        logging.info('Added the Action Needed column!')
+        new_df.attrs["fallback_ids"] = row_ids[fallback].tolist()
+        if fallback.any():
+            logging.info('%s reviews only got the fallback, they are retried on the next run', int(fallback.sum()))
+        return new_df
 
-            response = client.chat.completions.create(
+    def _summarize_batch(self, client: Groq, model: str, reviews: List[str],
+                         rate_limiter: RateLimiter, max_repair_attempts: int = 2,
+                         batch_planner: BatchPlanner = None) -> List:
+        """
+        Summarize one batch and return one result per review, in order.
+
+        Reviews are sent with their position as id. Items that are missing or
+        malformed in the response are asked for again on their own, up to
+        max_repair_attempts times, before they fall back to neutral; those
+        results carry "fallback": True.
+        With a batch_planner the completion budget follows the batch size,
+        and how each response ended is fed back into the planner.
+        """
+        pending = dict(enumerate(reviews))
+        results = {}
+        for attempt in range(max_repair_attempts + 1):
+            max_completion_tokens = batch_planner.completion_budget(len(pending)) if batch_planner else 1024
+            content, finish_reason, completion_tokens = self._request_completion(
+                client, model, pending, rate_limiter, max_completion_tokens)
+            if batch_planner is not None:
+                batch_planner.record(finish_reason, completion_tokens, max_completion_tokens)
+            parsed, clean = parse_results(content, list(pending))
+            valid = {item_id: item for item_id, item in parsed.items() if is_valid_item(item)}
+
+            self.parse_metrics.add(requests=1, parse_failures=int(not clean),
+                                   items_requested=len(pending) if attempt == 0 else 0,
+                                   items_parsed=len(valid), items_invalid=len(parsed) - len(valid),
+                                   repair_requests=int(attempt > 0),
+                                   items_repaired=len(valid) if attempt > 0 else 0)
+            results.update(valid)
+            for item_id in valid:
+                del pending[item_id]
+            if not pending:
+                break
+            logging.info('%s of %s reviews missing or malformed in the response', len(pending), len(reviews))
+
+        # Fallback for what could not be recovered, marked so it is not kept as an answer
+        self.parse_metrics.add(items_fallback=len(pending))
+        for item_id, review in pending.items():
+            results[item_id] = {"summary": review, "sentiment": "neutral", "fallback": True}
+
+        return [results[item_id] for item_id in range(len(reviews))]
+
+    def _request_completion(self, client: Groq, model: str, reviews: Dict[int, str],
+                            rate_limiter: RateLimiter, max_completion_tokens: int = 1024):
+        """Send one request, return (content, finish_reason, completion_tokens)."""
+        from groq import APIConnectionError
+        user_prompt = "Reviews = " + json.dumps([{"id": item_id, "review": review}
+                                                 for item_id, review in reviews.items()])
+        # rough estimate (4 chars per token) plus room for one summary per review
+        estimated_tokens = (len(GROQ_SYSTEM_PROMPT) + len(user_prompt)) // 4 + 60 * len(reviews)
+
+        raw_response = rate_limiter.call(
+            lambda: client.chat.completions.with_raw_response.create(
                 model=model,
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    {"role": "system", "content": GROQ_SYSTEM_PROMPT},
                     {"role": "user", "content": user_prompt},
                 ],
                 temperature=0.3,
-                max_completion_tokens=1024,
-            )
-
-            results = response.choices[0].message.content.strip()
-
-            # Safely convert string to list
-            try:
-                results = ast.literal_eval(results)
-            except Exception:
-                # Fallback if AI output cannot be parsed
-                results = [{"summary": review, "sentiment": "neutral"} for review in valid_reviews_list]
-
-            # Apply results to valid reviews
-            for idx, result in zip(valid_reviews_df.index, results):
-                summary = result.get("summary") if isinstance(result, dict) else valid_reviews_df.at[idx, review_column]
-                sentiment = result.get("sentiment") if isinstance(result, dict) else "neutral"
-
-                if not summary.strip():
-                    summary = valid_reviews_df.at[idx, review_column]
-                if sentiment not in ["positive", "negative", "neutral"]:
-                    sentiment = "neutral"
-
-                df_copy.at[idx, summary_column] = summary
-                df_copy.at[idx, sentiment_column] = sentiment
-
-            # Apply neutral to invalid reviews
-            for idx in invalid_reviews_df.index:
-                df_copy.at[idx, summary_column] = ""
-                df_copy.at[idx, sentiment_column] = "neutral"
-
-            time.sleep(5)
-        logging.info('Done getting the AI Summary and AI Sentiments')
-        new_df = self.set_action_needed(df_copy)
-        logging.info('Added the Action Needed column!')
-        return new_df
-
+                max_completion_tokens=max_completion_tokens,
+                response_format={"type": "json_object"},
+            ),
+            tokens=estimated_tokens,
+            retry_on=(APIConnectionError,),
+        )
+        response = raw_response.parse()
+        usage = getattr(response, "usage", None)
+        if isinstance(getattr(usage, "total_tokens", None), int):
+            rate_limiter.settle(estimated_tokens, usage.total_tokens)
+
+        choice = response.choices[0]
+        if metrics.enabled:
+            metrics.add("apply_groqAI", api_calls=1, bytes=len(user_prompt) + len(choice.message.content or ""),
+                        prompt_tokens=_int_or_zero(getattr(usage, "prompt_tokens", None)),
+                        completion_tokens=_int_or_zero(getattr(usage, "completion_tokens", None)))
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        return (choice.message.content or "", getattr(choice, "finish_reason", None),
+                completion_tokens if isinstance(completion_tokens, int) else None)
+
+    def _apply_batch_results(self, summaries: np.ndarray, sentiments: np.ndarray, reviews: pd.Series,
+                             results: List) -> Dict:
+        """Write the results of one batch into the summary/sentiment arrays, at the row positions of reviews."""
+        positions = reviews.index.to_numpy()
+        batch_summaries = [result["summary"] for result in results]
+        batch_sentiments = [result["sentiment"] for result in results]
+        summaries[positions] = batch_summaries
+        sentiments[positions] = batch_sentiments
+        return dict(zip(positions.tolist(), zip(batch_summaries, batch_sentiments)))
+
+    def merge_processed(self, existing_df: pd.DataFrame, new_df: pd.DataFrame,
+                        id_column: str = "Id") -> pd.DataFrame:
+        """
+        Merge freshly processed rows into the rows already on the processed sheet.
+        A new row replaces the existing row with the same id; the result is sorted by id.
+        """
+        logging.info("Merging %s processed rows into %s existing rows", new_df.shape[0], existing_df.shape[0])
+        if existing_df.empty or id_column not in existing_df.columns:
+            return new_df.sort_values(id_column).reset_index(drop=True)
 
+        kept_df = existing_df[~existing_df[id_column].astype(str).isin(new_df[id_column].astype(str))]
+        merged_df = pd.concat([kept_df, new_df], ignore_index=True)[new_df.columns]
+        return merged_df.sort_values(id_column, kind="stable").reset_index(drop=True)
 
-    def set_action_needed(self, df:pd.DataFrame, col_name='Action Needed'):
+    def set_action_needed(self, df:pd.DataFrame, col_name='Action Needed', sentiment_column: str = "AI Sentiment"):
         logging.info("Adding the Action needed? column")
-        df[col_name] = df["AI Sentiment"].apply(lambda x: "Yes" if x == "negative" else "No")
+        df[col_name] = np.where(df[sentiment_column].to_numpy() == "negative", "Yes", "No")
 
         return df
 
@@ -0,0 +1,87 @@
+import logging
+from typing import Iterable
+
+import pandas as pd
+
+from src.state_files import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+# columns the AI stage adds, they are not part of a row's content
+AI_COLUMNS = ("ai_summary", "ai_sentiment", "action_needed")
+
+
+def canonical_column(col: str) -> str:
+    """'Review Text', 'review_text' and 'Review_Text' all become 'review_text'."""
+    return str(col).strip().lower().replace(" ", "_")
+
+
+class WatermarkStore:
+    """
+    Remembers which staging rows went through the AI stage.
+
+    It keeps the highest processed id (the high-water mark) and a content
+    hash per id in a JSON file, so a run only has to process rows that are
+    new or whose content changed since the last run.
+
+    Arguments:
+        path: JSON file holding the state, created on first commit()
+        id_column: id column, in any of the staging/processed spellings
+        exclude: columns that are ignored when hashing a row
+    """
+
+    def __init__(self, path: str, id_column: str = "id", exclude: Iterable[str] = AI_COLUMNS):
+        self.path = path
+        self.id_column = canonical_column(id_column)
+        self.exclude = {canonical_column(col) for col in exclude}
+        self.high_water_mark = None
+        self.hashes = {}
+        self._pending = {}
+
+        state = read_json(path)
+        self.high_water_mark = state.get("high_water_mark")
+        self.hashes = state.get("hashes", {})
+
+    def row_hashes(self, df: pd.DataFrame) -> pd.Series:
+        """Content hash of every row, indexed by the row id as a string."""
+        canonical = df.rename(columns=canonical_column)
+        cols = sorted(col for col in canonical.columns if col not in self.exclude)
+        hashes = pd.util.hash_pandas_object(canonical[cols].astype(str), index=False).astype(str)
+        hashes.index = canonical[self.id_column].astype(str)
+        return hashes
+
+    def seed(self, df: pd.DataFrame):
+        """Start from rows that are already processed, e.g. read from the processed sheet."""
+        if df.empty:
+            return
+        self._pending.update(self.row_hashes(df).to_dict())
+        self.commit()
+
+    def changed_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Return the rows of df that are new or changed since the last commit.
+        Their hashes are held until commit() is called.
+        """
+        if df.empty:
+            return df
+        hashes = self.row_hashes(df)
+        changed = (hashes != hashes.index.map(self.hashes)).to_numpy()
+
+        self._pending = hashes[changed].to_dict()
+        logger.info("%s of %s staging rows are new or changed", int(changed.sum()), len(df))
+        return df[changed]
+
+    def release(self, ids: Iterable):
+        """Drop rows from the pending hashes, so the next run hands them out again."""
+        for row_id in ids:
+            self._pending.pop(str(row_id), None)
+
+    def commit(self):
+        """Persist the hashes of the rows handed out by changed_rows()."""
+        self.hashes.update(self._pending)
+        ids = [int(row_id) for row_id in self._pending if str(row_id).lstrip("-").isdigit()]
+        if ids:
+            self.high_water_mark = max(ids + [self.high_water_mark or ids[0]])
+        self._pending = {}
+
+        write_json(self.path, {"high_water_mark": self.high_water_mark, "hashes": self.hashes})
@@ -0,0 +1,64 @@
+import pandas as pd
+from src.aggregates import SentimentAggregate
+
+
+def processed_df():
+    return pd.DataFrame({
+        "Id": [1, 2, 3, 4],
+        "Class Name": ["blouses", "dresses", "dresses", "pants"],
+        "AI Sentiment": ["positive", "negative", "positive", "negative"],
+    })
+
+
+def test_counts_match_groupby(tmp_path):
+    aggregate = SentimentAggregate(str(tmp_path / "aggregate.sqlite"))
+    aggregate.rebuild(processed_df())
+
+    expected = processed_df().groupby(["Class Name", "AI Sentiment"]).size().unstack(fill_value=0)
+    pd.testing.assert_frame_equal(aggregate.counts_frame(), expected)
+
+
+def test_update_moves_reprocessed_rows(tmp_path):
+    path = str(tmp_path / "state" / "aggregate.sqlite")
+    aggregate = SentimentAggregate(path)
+    aggregate.rebuild(processed_df())
+    aggregate.save()
+
+    # staging spelling of the columns, one changed row and one new row
+    new_rows = pd.DataFrame({"id": [2, 5], "class_name": ["dresses", "pants"],
+                             "ai_sentiment": ["neutral", "positive"]})
+    reloaded = SentimentAggregate(path)
+    assert reloaded.update(new_rows) == 1
+
+    counts = reloaded.counts_frame()
+    assert len(reloaded) == 5
+    assert counts.loc["dresses"].to_dict() == {"negative": 0, "neutral": 1, "positive": 1}
+    assert counts.loc["pants"].to_dict() == {"negative": 1, "neutral": 0, "positive": 1}
+
+
+def test_update_with_same_rows_is_idempotent(tmp_path):
+    aggregate = SentimentAggregate(str(tmp_path / "aggregate.sqlite"))
+    aggregate.update(processed_df())
+    aggregate.update(processed_df())
+    assert aggregate.counts_frame().to_numpy().sum() == 4
+
+
+def test_unsaved_update_is_dropped_with_its_rows(tmp_path):
+    """A run that dies before save() leaves counts and rows as they were, so the retry counts once"""
+    path = str(tmp_path / "aggregate.sqlite")
+    aggregate = SentimentAggregate(path)
+    aggregate.rebuild(processed_df())
+    aggregate.save()
+    aggregate.close()
+
+    new_rows = pd.DataFrame({"Id": [2, 5], "Class Name": ["dresses", "pants"], "AI Sentiment": ["neutral", "positive"]})
+    crashed = SentimentAggregate(path)
+    crashed.update(new_rows)
+    crashed.close()
+
+    retried = SentimentAggregate(path)
+    assert len(retried) == 4
+    assert retried.update(new_rows) == 1
+    retried.save()
+    assert len(SentimentAggregate(path)) == 5
+    assert retried.counts_frame().loc["dresses"].to_dict() == {"negative": 0, "neutral": 1, "positive": 1}
@@ -18,5 +18,59 @@ def test_analyze_sentiment_by_class():
   assert test_result.get("highest_negative") == "pants"
 
 
-    
- 
\ No newline at end of file
+def test_analyze_sentiment_by_class_headless(tmp_path, capsys):
+  test_df = pd.DataFrame({
+        "Class Name": ["blouses", "dresses", "dresses", "pants"],
+        "AI Sentiment": ["positive", "negative", "positive", "negative"]
+    })
+
+  test_rev_obj = ReviewAnalysis(headless=True, output_dir=tmp_path, formats=("png", "svg"), verbose=False)
+  test_result = test_rev_obj.analyze_sentiment_by_class(test_df)
+
+  assert test_result.get("highest_positive") == "blouses"
+  assert test_result.get("highest_neutral") is None
+  assert test_result["charts"] == [str(tmp_path / "sentiment_by_class.png"), str(tmp_path / "sentiment_by_class.svg")]
+  assert (tmp_path / "sentiment_by_class.png").read_bytes().startswith(b"\x89PNG")
+  assert capsys.readouterr().out == ""
+
+
+def test_analyze_sentiment_by_class_background(tmp_path):
+  test_df = pd.DataFrame({"Class Name": ["blouses", "pants"], "AI Sentiment": ["positive", "negative"]})
+
+  test_rev_obj = ReviewAnalysis(headless=True, output_dir=tmp_path, background=True, verbose=False)
+  test_result = test_rev_obj.analyze_sentiment_by_class(test_df)
+
+  assert test_rev_obj.wait() == test_result["charts"].result()
+  test_rev_obj.close()
+  assert (tmp_path / "sentiment_by_class.png").exists()
+
+
+def test_analyze_sentiment_aggregate(tmp_path):
+  from src.aggregates import SentimentAggregate
+
+  test_df = pd.DataFrame({
+        "Id": range(12),
+        "Class Name": ["blouses","intimates","dresses","dresses","pants","blouses","blouses",'intimates',"pants","pants","blouses","blouses"],
+        "AI Sentiment": ["positive","negative","negative","neutral",'positive',"positive",'positive',"positive","negative","negative","negative","negative"]
+    })
+  aggregate = SentimentAggregate(str(tmp_path / "aggregate.sqlite"))
+  aggregate.update(test_df)
+
+  test_rev_obj = ReviewAnalysis(headless=True, output_dir=tmp_path, verbose=False)
+  test_result = test_rev_obj.analyze_sentiment_aggregate(aggregate)
+  assert test_result.get("highest_positive") == "blouses"
+  assert test_result.get("highest_negative") == "pants"
+
+
+def test_analyze_sentiment_by_dimensions():
+  test_df = pd.DataFrame({
+        "Class Name": ["blouses", "dresses", "dresses", "pants"],
+        "Department Name": ["tops", "dresses", "dresses", "bottoms"],
+        "Rating": [5, 1, 2, 4],
+        "AI Sentiment": ["positive", "negative", "positive", "negative"]
+    })
+
+  test_result = ReviewAnalysis(verbose=False).analyze_sentiment_by_dimensions(test_df, k=1)
+  assert set(test_result["crosstabs"]) == {"Class Name", "Department Name", "Rating Band"}
+  assert test_result["rankings"]["Class Name"]["top"].index.tolist() == ["pants"]
+  assert test_result["rankings"]["Rating Band"]["top"].index.tolist() == ["low (1-2)"]
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.analytics import AGE_BANDS, SentimentCrosstabs, band
+
+
+def processed_df():
+    return pd.DataFrame({
+        "Clothing Id": [10, 10, 11, 12, 12, 12],
+        "Age": [22, 30, 41, 68, 33, ""],
+        "Rating": [5, 1, 3, 4, 2, 5],
+        "Recommended Ind": [1, 0, 1, 1, 0, 1],
+        "Division Name": ["general", "general", "initmates", "general petite", "general", "general"],
+        "Department Name": ["tops", "tops", "intimate", "dresses", "dresses", "dresses"],
+        "Class Name": ["knits", "knits", "lounge", "dresses", "dresses", "dresses"],
+        "AI Sentiment": ["positive", "negative", "neutral", "positive", "negative", "positive"],
+    })
+
+
+def test_band():
+    bands = band(pd.Series([18, 25, "64", 65, None]), AGE_BANDS)
+    assert bands.tolist()[:4] == ["under 25", "25-34", "55-64", "65+"]
+    assert pd.isna(bands[4])
+
+
+def test_crosstabs_match_groupby():
+    df = processed_df()
+    crosstabs = SentimentCrosstabs().compute(df)
+
+    assert set(crosstabs) == {"Class Name", "Department Name", "Division Name", "Rating Band",
+                              "Age Band", "Recommended IND", "Clothing ID"}
+    for name, column in (("Class Name", "Class Name"), ("Clothing ID", "Clothing Id")):
+        expected = df.groupby([column, "AI Sentiment"]).size().unstack(fill_value=0)
+        got = crosstabs[name][expected.columns]
+        np.testing.assert_array_equal(got.to_numpy(), expected.to_numpy())
+        assert got.index.tolist() == expected.index.tolist()
+
+    ratings = crosstabs["Rating Band"]
+    assert ratings.loc["high (4-5)", "positive"] == 3
+    assert ratings.loc["low (1-2)", "negative"] == 2
+    # the row without an age is left out of the age bands only
+    assert crosstabs["Age Band"]["total"].sum() == 5
+
+
+def test_rankings_top_and_bottom():
+    engine = SentimentCrosstabs()
+    rankings = engine.rankings(engine.compute(processed_df()), "negative", k=2)
+
+    top = rankings["Class Name"]["top"]
+    assert top.index.tolist() == ["knits", "dresses"]
+    assert top["negative %"].tolist() == pytest.approx([50.0, 100 / 3])
+    assert rankings["Class Name"]["bottom"].index[0] == "lounge"
+
+
+def test_missing_sentiment_column():
+    with pytest.raises(ValueError):
+        SentimentCrosstabs().compute(pd.DataFrame({"Class Name": ["knits"]}))
@@ -0,0 +1,48 @@
+import pandas as pd
+from src.batching import BatchPlanner, estimate_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("a" * 400) == 100
+
+
+def test_short_reviews_pack_into_fewer_requests():
+    reviews = pd.Series(["love it!", "great dress", "runs small"] * 334)
+    planner = BatchPlanner()
+
+    batches = list(planner.plan(reviews))
+
+    # a fixed batch_size of 10 would need 101 requests
+    assert len(batches) < 30
+    assert sum(len(batch) for batch in batches) == len(reviews)
+    assert pd.concat(batches).index.tolist() == reviews.index.tolist()
+
+
+def test_long_reviews_get_smaller_batches():
+    planner = BatchPlanner(target_tokens=4000)
+    batches = list(planner.plan(pd.Series(["x" * 2000] * 20)))
+
+    assert max(len(batch) for batch in batches) < 10
+    assert planner.completion_budget(5) < planner.completion_budget(10)
+
+
+def test_truncation_shrinks_the_next_batches():
+    planner = BatchPlanner()
+    plan = planner.plan(pd.Series(["a fairly ordinary review of a dress " * 3] * 500))
+
+    before = len(next(plan))
+    planner.record("length")
+    after = len(next(plan))
+
+    assert after <= before // 2
+    assert planner.stats["truncated"] == 1
+
+
+def test_headroom_grows_the_budget():
+    planner = BatchPlanner()
+    planner.record("stop", completion_tokens=100, max_completion_tokens=1000)
+    assert planner.scale > 1.0
+
+    planner.record("stop", completion_tokens=900, max_completion_tokens=1000)
+    assert planner.stats["grows"] == 1
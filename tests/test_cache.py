@@ -0,0 +1,61 @@
+import time
+from src.cache import ReviewCache
+
+
+def test_make_key_normalizes_text():
+    key = ReviewCache.make_key("  The cloth is   LOVELY ", "openai/gpt-oss-120b", "1")
+    assert key == ReviewCache.make_key("the cloth is lovely", "openai/gpt-oss-120b", "1")
+    assert key != ReviewCache.make_key("the cloth is lovely", "openai/gpt-oss-20b", "1")
+    assert key != ReviewCache.make_key("the cloth is lovely", "openai/gpt-oss-120b", "2")
+
+
+def test_get_and_put_count_hits_and_misses(tmp_path):
+    cache = ReviewCache(str(tmp_path / "cache" / "llm.sqlite"))
+    cache.put_many([("a", "lovely cloth", "positive")])
+
+    found = cache.get_many(["a", "b"])
+
+    assert found == {"a": {"summary": "lovely cloth", "sentiment": "positive"}}
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+    # entries survive reopening the file
+    cache.close()
+    assert len(ReviewCache(str(tmp_path / "cache" / "llm.sqlite"))) == 1
+
+
+def test_evict_by_size_keeps_recently_used():
+    cache = ReviewCache(":memory:", max_entries=2)
+    cache.put_many([("a", "s", "positive"), ("b", "s", "negative")])
+    time.sleep(0.01)
+    cache.put_many([("c", "s", "neutral")])
+    time.sleep(0.01)
+    cache.get_many(["a"])
+
+    assert cache.evict() == 1
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+
+
+def test_evict_by_age():
+    cache = ReviewCache(":memory:", max_age_seconds=0)
+    cache.put_many([("a", "s", "positive")])
+    time.sleep(0.01)
+
+    assert cache.evict() == 1
+    assert len(cache) == 0
+
+
+def test_processes_can_share_the_cache_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first, second = ReviewCache(path), ReviewCache(path, busy_timeout=5)
+
+    assert first._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    # an open read of one connection does not block the write of the other
+    reading = first._conn.execute("SELECT key FROM llm_results")
+    second.put_many([("k2", "fits well", "positive")])
+    reading.fetchall()
+    first.put_many([("k1", "too small", "negative")])
+
+    assert set(second.get_many(["k1", "k2"])) == {"k1", "k2"}
+    first.close()
+    second.close()
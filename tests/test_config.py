@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+import pytest
+from configs import config
+from configs.config import Settings
+
+
+def test_import_does_not_load_heavy_modules():
+    code = ("import sys, src.etl; "
+            "print([m for m in ('gspread', 'groq', 'matplotlib', 'google.oauth2') if m in sys.modules])")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_credentials_are_loaded_on_first_use(monkeypatch, tmp_path):
+    monkeypatch.setenv("CREDS_PATH", str(tmp_path / "missing.json"))
+    settings = Settings()
+
+    assert settings.CRED_FILE.endswith("missing.json")
+    with pytest.raises(FileNotFoundError):
+        settings.creds
+
+
+def test_module_attributes_resolve_through_settings(monkeypatch):
+    monkeypatch.setattr(config.settings, "GROQ_MAX_WORKERS", 3, raising=False)
+    assert config.GROQ_MAX_WORKERS == 3
+
+    with pytest.raises(AttributeError):
+        config.not_a_setting
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from src.dedup import ReviewDeduplicator, normalize_review
+
+
+def test_normalize_review():
+    assert normalize_review("  Love it!! ") == normalize_review("love   it") == "love it"
+
+
+def test_exact_duplicates_point_at_their_first_review():
+    reviews = pd.Series(["Love it!", "too small", "love it", "Too small.", "great dress"], index=[10, 11, 12, 13, 14])
+    dedup = ReviewDeduplicator()
+
+    representatives = dedup.representatives(reviews)
+
+    assert representatives.tolist() == [10, 11, 10, 11, 14]
+    assert dedup.summary()["exact_duplicates"] == 2
+    assert dedup.summary()["groups"] == 3
+
+
+def test_near_duplicates_are_grouped_with_minhash():
+    reviews = pd.Series([
+        "This dress runs small, order a size up",
+        "The fabric is soft and the color is lovely",
+        "This dress runs small - order one size up",
+        "Terrible quality, returned it",
+    ])
+
+    exact_only = ReviewDeduplicator().representatives(reviews)
+    near = ReviewDeduplicator(near_threshold=0.5).representatives(reviews)
+
+    assert exact_only.tolist() == [0, 1, 2, 3]
+    assert near.tolist() == [0, 1, 0, 3]
+
+
+def test_signatures_estimate_jaccard_similarity():
+    dedup = ReviewDeduplicator(num_perm=128, bands=32)
+    same = (dedup.signature("runs small order a size up") == dedup.signature("runs small order a size up")).mean()
+    other = (dedup.signature("runs small order a size up") == dedup.signature("lovely soft fabric")).mean()
+    assert same == 1.0
+    assert other < 0.2
+
+
+def test_num_perm_must_split_into_bands():
+    with pytest.raises(ValueError):
+        ReviewDeduplicator(num_perm=10, bands=3)
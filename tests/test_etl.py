@@ -1,5 +1,6 @@
 
 import pytest
+from types import SimpleNamespace
 from src.etl import main
 
 
@@ -14,10 +15,12 @@ def test_etl_main_can_be_called(mocker):
     # Mock all the external dependencies to prevent actual execution
     mocker.patch('src.etl.GsheetAIAuto')
     mocker.patch('src.etl.ReviewAnalysis')
-    mocker.patch('src.etl.creds')
-    mocker.patch('src.etl.sheet_id')
-    mocker.patch('src.etl.csv_path')
-    mocker.patch('src.etl.GROQ_API_KEY')
+    mocker.patch('src.etl.settings')
+    mocker.patch('src.etl.ReviewCache')
+    mocker.patch('src.etl.WatermarkStore')
+    mocker.patch('src.etl.SentimentAggregate')
+    mocker.patch('src.etl.RowKeys')
+    mocker.patch('src.etl.ResultJournal')
     
     
     main()
@@ -44,3 +47,187 @@ def test_etl_main_can_be_called(mocker):
 
 
 
+def run_offline(mocker, tmp_path, mode, rows=50, storage="sheets", publish=True, pre_classifier="none",
+                flush_every=500, shards=1, sheets_quota=None):
+    from src.fakes import FakeGroq, FakeSheetsClient
+    from benchmarks.bench_pipeline import OfflineGsheetAIAuto, make_dataset
+
+    tmp_path.mkdir(exist_ok=True)
+    csv_path = tmp_path / "reviews.csv"
+    make_dataset(csv_path, rows)
+    mocker.patch('src.etl.settings', SimpleNamespace(
+        csv_path=str(csv_path), sheet_id="offline", creds=None, GROQ_API_KEY="offline", READ_CHUNK_ROWS=20,
+        GROQ_MAX_WORKERS=2, GROQ_RPM=10_000, GROQ_TPM=10_000_000, PIPELINE_MODE=mode,
+        STORAGE_BACKEND=storage, STORAGE_DIR=str(tmp_path / "mirror"), PUBLISH_TO_SHEETS=publish,
+        LLM_CACHE_PATH=str(tmp_path / "cache.sqlite"), WATERMARK_PATH=str(tmp_path / "watermark.json"),
+        AGGREGATE_PATH=str(tmp_path / "aggregate.sqlite"), ROW_INDEX_DIR=str(tmp_path / "row_index"),
+        DEDUP_NEAR_THRESHOLD=None, PRE_CLASSIFIER=pre_classifier, PRE_CLASSIFIER_THRESHOLD=0.9,
+        PRE_CLASSIFIER_MODEL_PATH=str(tmp_path / "pre_classifier.npz"),
+        JOURNAL_PATH=str(tmp_path / "journal.jsonl"), FLUSH_EVERY_ROWS=flush_every))
+    sheets, groq = FakeSheetsClient(quota=sheets_quota), FakeGroq()
+    # kept for tests that inspect the sheets of a run that raised
+    run_offline.last_sheets = sheets
+    revana = mocker.Mock()
+
+    main(OfflineGsheetAIAuto(sheets, groq), revana, no_of_rows=rows, shards=shards)
+    return sheets.spreadsheets.get("offline"), groq, revana
+
+
+def test_etl_main_runs_offline(mocker, tmp_path):
+    """End to end run of main() against the in-memory Sheets and Groq fakes"""
+    spreadsheet, groq, revana = run_offline(mocker, tmp_path, "memory")
+
+    processed = spreadsheet.worksheet("processed").get_all_records()
+    assert len(processed) == 50
+    assert {row["AI Sentiment"] for row in processed} <= {"positive", "negative", "neutral"}
+    assert groq.stats["requests"] > 0
+    aggregate = revana.analyze_sentiment_aggregate.call_args.args[0]
+    assert aggregate.counts_frame().to_numpy().sum() == 50
+    revana.analyze_sentiment_by_class.assert_not_called()
+
+
+def test_etl_main_memory_mode_matches_sheets_mode(mocker, tmp_path):
+    """Keeping the frames in memory writes the same sheets with fewer full reads"""
+    memory, _, _ = run_offline(mocker, tmp_path / "memory", "memory")
+    sheets, _, _ = run_offline(mocker, tmp_path / "sheets", "sheets")
+
+    for title in ("raw_data", "staging", "processed"):
+        assert memory.worksheet(title).get_all_values() == sheets.worksheet(title).get_all_values()
+    # only the processed sheet is read in full, raw and staging are not read back
+    memory_reads = sum(ws.calls["get_all_records"] for ws in memory.worksheets())
+    sheets_reads = sum(ws.calls["get_all_records"] for ws in sheets.worksheets())
+    assert memory_reads < sheets_reads
+
+
+@pytest.mark.parametrize("code", [429, 503])
+def test_etl_main_survives_sheets_failures(mocker, tmp_path, code):
+    """Every third write to Sheets fails, the retried run writes the same sheets"""
+    from src.fakes import FakeSheetsQuota
+
+    # retry at once instead of backing off
+    mocker.patch('src.sheet_writer.random.uniform', return_value=0.0)
+    reference, _, _ = run_offline(mocker, tmp_path / "reference", "memory", rows=60, flush_every=20)
+    quota = FakeSheetsQuota(fail_every=3, fail_code=code)
+    flaky, _, _ = run_offline(mocker, tmp_path / "flaky", "memory", rows=60, flush_every=20, sheets_quota=quota)
+
+    assert quota.stats["failures"] > 0
+    for title in ("raw_data", "staging", "processed"):
+        assert flaky.worksheet(title).get_all_values() == reference.worksheet(title).get_all_values()
+
+
+def test_etl_main_local_mirror_publishes_the_same_sheets(mocker, tmp_path):
+    """A SQLite mirror published at the end leaves the worksheets as the sheets backend does"""
+    direct, _, _ = run_offline(mocker, tmp_path / "direct", "memory")
+    published, _, _ = run_offline(mocker, tmp_path / "mirror", "memory", storage="sqlite")
+
+    for title in ("raw_data", "staging", "processed"):
+        assert published.worksheet(title).get_all_values() == direct.worksheet(title).get_all_values()
+
+
+def test_etl_main_runs_without_sheets(mocker, tmp_path):
+    """With a local backend and no publishing, Google Sheets is never touched"""
+    from src.storage import SQLiteBackend
+
+    spreadsheet, groq, _ = run_offline(mocker, tmp_path, "sheets", storage="sqlite", publish=False)
+
+    assert spreadsheet is None
+    processed = SQLiteBackend(str(tmp_path / "mirror" / "pipeline.sqlite"), "processed").read()
+    assert len(processed) == 50
+    assert processed["Id"].tolist() == list(range(1, 51))
+
+
+def test_reordered_source_is_not_processed_again(mocker, tmp_path):
+    """Ids follow the content of a row, so a reordered csv has nothing new for the AI stage"""
+    import pandas as pd
+
+    spreadsheet, groq, _ = run_offline(mocker, tmp_path, "memory")
+    csv_path = tmp_path / "reviews.csv"
+    mocker.patch('benchmarks.bench_pipeline.make_dataset',
+                 lambda path, rows: pd.read_csv(csv_path).iloc[::-1].to_csv(path, index=False))
+    mocker.patch('src.fakes.FakeSheetsClient', return_value=mocker.Mock(
+        open_by_key=lambda key: spreadsheet, spreadsheets={"offline": spreadsheet}))
+    _, groq_again, _ = run_offline(mocker, tmp_path, "memory")
+
+    assert groq_again.stats["requests"] == 0
+    assert len(spreadsheet.worksheet("raw_data").get_all_records()) == 50
+    assert len(spreadsheet.worksheet("processed").get_all_records()) == 50
+
+
+def test_second_run_only_writes_the_changed_rows(mocker, tmp_path):
+    """A run with a few edited reviews neither reads the processed sheet back nor rewrites it"""
+    import pandas as pd
+
+    run_offline(mocker, tmp_path, "memory")
+    sheets = run_offline.last_sheets
+    spreadsheet = sheets.spreadsheets["offline"]
+    processed = spreadsheet.worksheet("processed")
+    reads, written = processed.calls["get_all_records"], processed.cells_written
+
+    csv_path = tmp_path / "reviews.csv"
+    edited = pd.read_csv(csv_path)
+    edited.loc[:2, "Review Text"] = "I love it, perfect fit"
+    mocker.patch('benchmarks.bench_pipeline.make_dataset', lambda path, rows: edited.to_csv(path, index=False))
+    mocker.patch('src.fakes.FakeSheetsClient', return_value=sheets)
+    _, groq, _ = run_offline(mocker, tmp_path, "memory")
+
+    assert groq.stats["requests"] > 0
+    assert processed.calls["get_all_records"] == reads
+    # the three edited rows are new rows, nothing else of the processed sheet is written
+    assert processed.cells_written - written <= 3 * len(processed.row_values(1))
+    assert len(processed.get_all_records()) == 53
+
+
+def test_pre_classifier_cuts_groq_requests(mocker, tmp_path):
+    _, groq, _ = run_offline(mocker, tmp_path / "none", "memory", rows=200)
+    spreadsheet, groq_rules, _ = run_offline(mocker, tmp_path / "rules", "memory", rows=200, pre_classifier="rules")
+
+    assert groq_rules.stats["prompt_tokens"] < groq.stats["prompt_tokens"]
+    assert len(spreadsheet.worksheet("processed").get_all_records()) == 200
+
+
+def test_crashed_run_resumes_from_the_journal(mocker, tmp_path):
+    """Rows finished before a crash are already on the processed sheet and are not sent again"""
+    from src.fakes import FakeGroq
+
+    class CrashingGroq(FakeGroq):
+        def _create(self, *args, **kwargs):
+            if self.stats["requests"] >= 3:
+                raise RuntimeError("connection reset")
+            return super()._create(*args, **kwargs)
+
+    reference, groq_reference, _ = run_offline(mocker, tmp_path / "reference", "memory", rows=200)
+    mocker.patch('src.fakes.FakeGroq', CrashingGroq)
+    with pytest.raises(RuntimeError):
+        run_offline(mocker, tmp_path, "memory", rows=200, flush_every=10)
+    spreadsheet = run_offline.last_sheets.spreadsheets["offline"]
+    assert len(spreadsheet.worksheet("processed").get_all_records()) >= 10
+    assert (tmp_path / "journal.jsonl").exists()
+
+    mocker.patch('src.fakes.FakeGroq', FakeGroq)
+    mocker.patch('src.fakes.FakeSheetsClient', return_value=run_offline.last_sheets)
+    _, groq, _ = run_offline(mocker, tmp_path, "memory", rows=200)
+
+    assert groq.stats["requests"] < groq_reference.stats["requests"]
+    assert not (tmp_path / "journal.jsonl").exists()
+    # flushed rows were appended first, the content is the same
+    by_id = lambda sheet: sorted(sheet.worksheet("processed").get_all_records(), key=lambda row: row["Id"])
+    assert by_id(spreadsheet) == by_id(reference)
+
+
+def test_sharded_run_matches_single_process(mocker, tmp_path):
+    """Staging and AI-processing the rows in shard processes writes the same processed rows"""
+    single, _, _ = run_offline(mocker, tmp_path / "single", "memory", rows=60)
+    sharded, _, revana = run_offline(mocker, tmp_path / "sharded", "memory", rows=60, shards=3)
+
+    def rows(spreadsheet, title, id_column):
+        return sorted(spreadsheet.worksheet(title).get_all_records(), key=lambda row: row[id_column])
+
+    assert rows(sharded, "staging", "id") == rows(single, "staging", "id")
+    assert rows(sharded, "processed", "Id") == rows(single, "processed", "Id")
+    assert revana.analyze_sentiment_aggregate.call_args.args[0].counts_frame().to_numpy().sum() == 60
+    assert not list((tmp_path / "sharded").glob("journal.jsonl*"))
+
+    # in sheets mode the shards are cut from the raw table read back
+    from_sheets, _, _ = run_offline(mocker, tmp_path / "sheets", "sheets", rows=60, shards=2)
+    assert rows(from_sheets, "staging", "id") == rows(single, "staging", "id")
+    assert rows(from_sheets, "processed", "Id") == rows(single, "processed", "Id")
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from src.fakes import FakeWorksheet
+from src.instrumentation import Metrics, metrics
+from src.utils import GsheetAIAuto
+
+
+@pytest.fixture()
+def enabled_metrics():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_metrics_record_nothing():
+    recorder = Metrics()
+
+    @recorder.instrument("stage")
+    def work():
+        return 42
+
+    with recorder.span("other") as span:
+        span.add(rows=3)
+    recorder.add("stage", rows=1)
+
+    assert work() == 42
+    assert recorder.summary()["stages"] == {}
+
+
+def test_span_and_decorator_record_calls_and_counts():
+    recorder = Metrics(enabled=True)
+
+    @recorder.instrument()
+    def load():
+        recorder.add("load", rows=10, api_calls=1)
+
+    load()
+    load()
+    with recorder.span("load") as span:
+        span.add(rows=5)
+
+    stage = recorder.summary()["stages"]["load"]
+    assert stage["calls"] == 3
+    assert stage["rows"] == 25
+    assert stage["api_calls"] == 2
+    assert stage["seconds"] >= stage["max_seconds"] > 0
+
+
+def test_exports(tmp_path):
+    recorder = Metrics(enabled=True)
+    with recorder.span("apply_groqAI") as span:
+        span.add(prompt_tokens=120, retries=1)
+
+    recorder.export(tmp_path / "metrics.json")
+    recorder.export(tmp_path / "metrics.prom")
+
+    summary = json.loads((tmp_path / "metrics.json").read_text())
+    assert summary["stages"]["apply_groqAI"]["prompt_tokens"] == 120
+    prom = (tmp_path / "metrics.prom").read_text()
+    assert "# TYPE pipeline_stage_prompt_tokens_total counter" in prom
+    assert 'pipeline_stage_retries_total{stage="apply_groqAI"} 1' in prom
+    assert 'pipeline_stage_calls_total{stage="apply_groqAI"} 1' in prom
+
+
+def test_pipeline_stages_are_instrumented(enabled_metrics):
+    gsheetauto = GsheetAIAuto()
+    worksheet = FakeWorksheet("staging")
+
+    gsheetauto.upload_rows_to_gsheets(worksheet, [["a", 1], ["b", 2]], ["name", "value"], mode="append")
+    gsheetauto.pull_gsheet_data_to_df(worksheet, process=True)
+
+    stages = enabled_metrics.summary()["stages"]
+    assert stages["upload_rows_to_gsheets"]["rows"] == 2
+    # get_all_values, then one update for the whole table
+    assert stages["upload_rows_to_gsheets"]["api_calls"] == 2
+    assert stages["upload_rows_to_gsheets"]["cells"] == 9
+    assert stages["pull_gsheet_data_to_df"]["rows"] == 2
+    assert stages["process_stg_data"]["calls"] == 1
@@ -0,0 +1,24 @@
+from src.journal import ResultJournal
+
+
+def test_journal_round_trip_and_clear(tmp_path):
+    journal = ResultJournal(str(tmp_path / "journal.jsonl"))
+    assert journal.load() == {}
+
+    journal.record([("1", "k1", "nice", "positive")])
+    journal.record([("2", "k2", "too small", "negative"), ("1", "k1", "lovely", "positive")])
+
+    assert journal.load() == {"k1": {"id": "1", "summary": "lovely", "sentiment": "positive"},
+                              "k2": {"id": "2", "summary": "too small", "sentiment": "negative"}}
+    journal.clear()
+    assert journal.load() == {}
+
+
+def test_journal_skips_a_line_cut_off_by_a_crash(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = ResultJournal(str(path))
+    journal.record([("1", "k1", "nice", "positive")])
+    with open(path, "a") as f:
+        f.write('{"id": "2", "key": "k2", "summ')
+
+    assert list(journal.load()) == ["k1"]
@@ -0,0 +1,45 @@
+from src.llm_output import ParseMetrics, is_valid_item, iter_json_objects, parse_results
+
+
+def test_parse_json_object_by_id():
+    text = '{"results": [{"id": 1, "summary": "b", "sentiment": "negative"}, {"id": 0, "summary": "a", "sentiment": "positive"}]}'
+    parsed, clean = parse_results(text, [0, 1])
+
+    assert clean
+    assert parsed[0]["summary"] == "a"
+    assert parsed[1]["sentiment"] == "negative"
+
+
+def test_parse_ignores_ids_that_were_not_requested():
+    parsed, clean = parse_results('[{"id": 7, "summary": "x", "sentiment": "neutral"}]', [0])
+    assert parsed == {}
+
+
+def test_parse_python_literal_without_ids_by_position():
+    parsed, clean = parse_results("[{'summary': 'a', 'sentiment': 'positive'}, {'summary': 'b', 'sentiment': 'neutral'}]", [3, 4])
+    assert parsed[4]["summary"] == "b"
+
+
+def test_truncated_output_keeps_complete_items():
+    text = '{"results": [{"id": 0, "summary": "a", "sentiment": "positive"}, {"id": 1, "summary": "b", "sentim'
+    parsed, clean = parse_results(text, [0, 1])
+
+    assert not clean
+    assert list(parsed) == [0]
+    assert [obj["id"] for obj in iter_json_objects(text)] == [0]
+
+
+def test_is_valid_item():
+    assert is_valid_item({"summary": "ok", "sentiment": "neutral"})
+    assert not is_valid_item({"summary": " ", "sentiment": "neutral"})
+    assert not is_valid_item({"summary": "ok", "sentiment": "mixed"})
+    assert not is_valid_item("ok")
+
+
+def test_parse_metrics_rates():
+    metrics = ParseMetrics()
+    metrics.add(requests=4, parse_failures=1, items_requested=10, items_fallback=2)
+
+    summary = metrics.summary()
+    assert summary["parse_failure_rate"] == 0.25
+    assert summary["fallback_rate"] == 0.2
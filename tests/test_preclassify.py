@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.preclassify import LogisticClassifier, RatingLexiconClassifier, build_pre_classifier
+
+
+def reviews():
+    return pd.DataFrame({
+        "Review Text": ["Love it, so soft!", "Itchy and cheap. Returned it.", "The color was off",
+                        "Lovely but I had to return it", "Great", ""],
+        "Rating": [5, 1, 3, 5, 4, np.nan],
+        "Recommended IND": [1, 0, 1, 1, 1, np.nan],
+    })
+
+
+def test_rules_decide_only_clear_cut_rows():
+    labels, confidence = RatingLexiconClassifier().predict(reviews())
+
+    assert labels[:2].tolist() == ["positive", "negative"]
+    assert confidence[:2].tolist() == [0.95, 0.95]
+    # 3 stars, and 5 stars with a complaint, are left to the LLM
+    assert confidence[2] == confidence[3] == 0.0
+    assert labels[4] == "positive"
+
+
+def test_threshold_sets_what_is_resolved_locally():
+    strict, _ = RatingLexiconClassifier(threshold=0.9).resolve(reviews())
+    loose, _ = RatingLexiconClassifier(threshold=0.7).resolve(reviews())
+    assert strict.tolist() == [True, True, False, False, False, False]
+    assert loose.tolist() == [True, True, False, False, True, False]
+
+
+def test_summarize_keeps_the_first_sentence():
+    summaries = RatingLexiconClassifier.summarize(pd.Series(["Itchy and cheap. Returned it.", "Great"]))
+    assert summaries.tolist() == ["Itchy and cheap.", "Great"]
+
+
+def training_frame(rows=300):
+    rng = np.random.default_rng(0)
+    texts = np.array(["love the fabric", "runs small returned", "nice color", "awful seams"], dtype=object)
+    picks = rng.integers(0, 4, rows)
+    return pd.DataFrame({"review_text": texts[picks], "rating": rng.integers(1, 6, rows),
+                         "recommended_ind": rng.integers(0, 2, rows),
+                         "AI Sentiment": np.array(["positive", "negative", "neutral", "negative"])[picks]})
+
+
+def test_logistic_model_learns_and_round_trips(tmp_path):
+    model = LogisticClassifier(epochs=100, n_features=1 << 10).fit(training_frame())
+    test = pd.DataFrame({"Review Text": ["I love the fabric", "awful seams"], "Rating": [5, 2],
+                         "Recommended IND": [1, 0]})
+    labels, confidence = model.predict(test)
+    assert labels.tolist() == ["positive", "negative"]
+    assert (confidence > 0.5).all()
+
+    model.save(str(tmp_path / "model.npz"))
+    loaded = LogisticClassifier().load(str(tmp_path / "model.npz"))
+    np.testing.assert_allclose(loaded.predict(test)[1], confidence)
+
+
+def test_build_pre_classifier(tmp_path):
+    path = str(tmp_path / "model.npz")
+    assert build_pre_classifier("none", 0.9) is None
+    assert isinstance(build_pre_classifier("rules", 0.8), RatingLexiconClassifier)
+    # nothing processed yet, nothing to train on
+    assert build_pre_classifier("logistic", 0.9, path, pd.DataFrame()) is None
+
+    trained = build_pre_classifier("logistic", 0.9, path, training_frame())
+    assert trained.threshold == 0.9
+    assert isinstance(build_pre_classifier("logistic", 0.9, path), LogisticClassifier)
+    with pytest.raises(ValueError):
+        build_pre_classifier("forest", 0.9)
+
+
+def test_classifier_without_predict_fails_when_created():
+    from src.preclassify import PreClassifier
+
+    class Unfinished(PreClassifier):
+        name = "unfinished"
+
+    with pytest.raises(TypeError):
+        Unfinished(0.9)
@@ -0,0 +1,150 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+from src.rate_limiter import RateLimiter, parse_reset
+from src.utils import GsheetAIAuto
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ThrottlingGroqHandler(BaseHTTPRequestHandler):
+    """Answers chat completions, throttling the first `throttle` requests with a 429."""
+
+    throttle = 1
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests.append(body)
+        if len(type(self).requests) <= type(self).throttle:
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "tokens"}},
+                       {"retry-after": "0.05", "x-ratelimit-remaining-tokens": "0",
+                        "x-ratelimit-reset-tokens": "50ms"})
+            return
+
+        reviews = json.loads(body["messages"][1]["content"].split("=", 1)[1])
+        content = json.dumps({"results": [{"id": item["id"], "summary": item["review"], "sentiment": "positive"}
+                                          for item in reviews]})
+        self._send(200, {
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 20, "total_tokens": 70},
+        }, {"x-ratelimit-limit-tokens": "8000", "x-ratelimit-remaining-tokens": "7930",
+            "x-ratelimit-remaining-requests": "999", "x-ratelimit-reset-tokens": "0.5s"})
+
+    def _send(self, status, payload, headers):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def fake_groq_server(monkeypatch):
+    ThrottlingGroqHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingGroqHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("GROQ_BASE_URL", f"http://127.0.0.1:{server.server_port}")
+    yield ThrottlingGroqHandler
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_reset():
+    assert parse_reset("2m59.56s") == pytest.approx(179.56)
+    assert parse_reset("7.66s") == pytest.approx(7.66)
+    assert parse_reset("250ms") == pytest.approx(0.25)
+    assert parse_reset("3") == 3
+
+
+def test_acquire_waits_for_request_budget():
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000, clock=clock, sleep=clock.sleep)
+
+    limiter.acquire(10)
+    limiter.acquire(10)
+    assert clock.sleeps == []
+
+    # the third request has to wait for one request to refill (60s / 2)
+    limiter.acquire(10)
+    assert sum(clock.sleeps) == pytest.approx(30)
+
+
+def test_headers_block_until_reset():
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=1000, clock=clock, sleep=clock.sleep)
+
+    limiter.update_from_headers({"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "7.5s"})
+    limiter.acquire(1)
+    assert sum(clock.sleeps) == pytest.approx(7.5)
+
+
+def test_call_retries_throttled_errors():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep, base_delay=0.5)
+
+    class Throttled(Exception):
+        status_code = 429
+
+    outcomes = [Throttled(), Throttled(), "ok"]
+
+    def flaky():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call(flaky) == "ok"
+    assert limiter.stats["retries"] == 2
+    assert limiter.stats["throttled"] == 2
+
+
+def test_call_gives_up_after_max_retries():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep, max_retries=1)
+
+    class ServerError(Exception):
+        status_code = 503
+
+    def failing():
+        raise ServerError()
+
+    with pytest.raises(ServerError):
+        limiter.call(failing)
+    assert limiter.stats["retries"] == 1
+
+
+def test_apply_groqAI_against_throttling_server(fake_groq_server):
+    limiter = RateLimiter(base_delay=0.01)
+    df = pd.DataFrame({"Review Text": ["lovely", "nice fit", "great"], "Clothing ID": [1, 2, 3]})
+
+    result = GsheetAIAuto().apply_groqAI("key", df, "openai/gpt-oss-120b", "Review Text",
+                                         batch_size=2, rate_limiter=limiter)
+
+    assert result["AI Sentiment"].tolist() == ["positive"] * 3
+    # one throttled request, then one per batch
+    assert len(fake_groq_server.requests) == 3
+    assert limiter.stats["throttled"] == 1
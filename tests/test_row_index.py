@@ -0,0 +1,67 @@
+import pandas as pd
+
+from src.fakes import FakeWorksheet
+from src.row_index import RowKeys, SheetIndex
+from src.utils import GsheetAIAuto
+
+
+def reviews(rows):
+    return pd.DataFrame(rows, columns=["Clothing ID", "Review Text", "Rating"])
+
+
+def test_row_keys_are_stable_across_order_and_runs(tmp_path):
+    path = str(tmp_path / "keys.json")
+    df = reviews([[1, "great", 5], [2, "bad", 1], [1, "", 3], [1, "", 4]])
+    row_keys = RowKeys(path)
+    ids = row_keys.assign(df)
+    row_keys.save()
+    assert ids.tolist() == [1, 2, 3, 4]
+
+    # reordered, with one new review: known rows keep their id, the new one gets the next
+    reordered = reviews([[3, "new", 2], [2, "bad", 1], [1, "great", 5], [1, "", 3], [1, "", 4]])
+    assert RowKeys(path).assign(reordered).tolist() == [5, 2, 1, 3, 4]
+
+
+def test_row_keys_accept_staging_column_names(tmp_path):
+    df = pd.DataFrame({"clothing_id": [1], "review_text": ["great"]})
+    assert RowKeys(str(tmp_path / "keys.json")).assign(df).tolist() == [1]
+
+
+def test_indexed_upload_reads_the_sheet_only_once(tmp_path):
+    gsheetauto = GsheetAIAuto()
+    worksheet = FakeWorksheet("raw_data", sheet_id=7)
+    index = SheetIndex(str(tmp_path / "raw_data.json"))
+    df = pd.DataFrame({"Review Text": ["a", "b", "c"], "id": [1, 2, 3]})
+
+    gsheetauto.upload_rows_to_gsheets(worksheet, df, df.columns.tolist(), mode="indexed", row_index=index)
+    assert worksheet.calls["get_all_values"] == 1
+
+    # a fresh index object reads the saved state, not the sheet
+    index = SheetIndex(str(tmp_path / "raw_data.json"))
+    changed = pd.DataFrame({"Review Text": ["a", "B", "c", "d"], "id": [1, 2, 3, 4]})
+    status = gsheetauto.upload_rows_to_gsheets(worksheet, changed, changed.columns.tolist(),
+                                               mode="indexed", row_index=index)
+    assert status["message"] == "1 new records uploaded. 1 records updated."
+    assert worksheet.calls["get_all_values"] == 1
+    assert worksheet.calls["get_all_records"] == 0
+    assert worksheet.calls["clear"] == 0
+    assert worksheet.get_all_values() == [["Review Text", "id"], ["a", "1"], ["B", "2"], ["c", "3"], ["d", "4"]]
+    assert index.rows["4"][0] == 5
+
+    status = gsheetauto.upload_rows_to_gsheets(worksheet, changed, changed.columns.tolist(),
+                                               mode="indexed", row_index=index)
+    assert status["message"] == "No new records to update."
+
+
+def test_indexed_upload_resyncs_with_another_sheet(tmp_path):
+    gsheetauto = GsheetAIAuto()
+    index = SheetIndex(str(tmp_path / "raw_data.json"))
+    df = pd.DataFrame({"Review Text": ["a", "b"], "id": [1, 2]})
+    gsheetauto.upload_rows_to_gsheets(FakeWorksheet("raw_data", sheet_id=1), df, df.columns.tolist(),
+                                      mode="indexed", row_index=index)
+
+    # the worksheet was recreated: the index is rebuilt from what is on it
+    recreated = FakeWorksheet("raw_data", rows=[["Review Text", "id"], ["a", "1"]], sheet_id=2)
+    gsheetauto.upload_rows_to_gsheets(recreated, df, df.columns.tolist(), mode="indexed", row_index=index)
+    assert recreated.calls["get_all_values"] == 1
+    assert recreated.get_all_values() == [["Review Text", "id"], ["a", "1"], ["b", "2"]]
@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+from src.sharding import ShardPool, shard_of, split_shards, worker_state
+
+
+def reviews(n):
+    return pd.DataFrame({"Clothing ID": [i % 7 for i in range(n)],
+                         "Review Text": [f"review number {i}" for i in range(n)]})
+
+
+def test_shard_of_is_stable_and_independent_of_order():
+    df = reviews(200)
+    shards = pd.Series(shard_of(df, 4), index=df.index)
+    shuffled = df.sample(frac=1, random_state=0)
+
+    assert shards.between(0, 3).all()
+    assert shards.nunique() == 4
+    assert (pd.Series(shard_of(shuffled, 4), index=shuffled.index) == shards.loc[shuffled.index]).all()
+
+
+def test_split_shards_covers_every_row_once():
+    df = reviews(100)
+    parts = split_shards(df, 3)
+
+    assert len(parts) == 3
+    assert sorted(pd.concat(parts).index) == list(df.index)
+
+
+def spend_budget(requests):
+    _, rate_limiter = worker_state()
+    before = rate_limiter.snapshot()["requests"]
+    for _ in range(requests):
+        rate_limiter.acquire(10)
+    return os.getpid(), rate_limiter.snapshot()["requests"] - before
+
+
+def test_shard_pool_workers_share_one_budget():
+    with ShardPool(2, 1_000, 1_000_000) as pool:
+        results = pool.map(spend_budget, [(3,), (5,)])
+        shared = pool.budget.snapshot()
+
+    # a worker may run both calls, the budget saw the requests of all of them
+    assert [requests for _, requests in results] == [3, 5]
+    assert all(pid != os.getpid() for pid, _ in results)
+    assert shared["requests"] == 8
@@ -0,0 +1,153 @@
+import pytest
+import requests
+from src.sheet_writer import ChunkedSheetWriter, ChunkWriteError
+from src.fakes import FakeSheetsError, FakeSheetsQuota, FakeWorksheet
+
+
+class FlakyWorksheet(FakeWorksheet):
+    """Fails the update of the given start rows, `times` times each."""
+
+    def __init__(self, title, fail_rows, times=1, code=503):
+        super().__init__(title)
+        self.failures = {row: times for row in fail_rows}
+        self.code = code
+        self.update_ranges = []
+
+    def update(self, values=None, range_name=None, *args, **kwargs):
+        self.update_ranges.append(range_name)
+        if self.failures.get(range_name, 0) > 0:
+            self.failures[range_name] -= 1
+            error = Exception(f"APIError: [{self.code}]")
+            error.code = self.code
+            raise error
+        return super().update(values, range_name)
+
+
+def table(rows, cols=4):
+    return [[f"r{r}c{c}" for c in range(cols)] for r in range(rows)]
+
+
+def test_write_splits_into_bounded_chunks():
+    worksheet = FakeWorksheet("processed")
+    writer = ChunkedSheetWriter(worksheet, max_cells_per_chunk=40)
+
+    report = writer.write(table(25))
+
+    assert worksheet.calls["update"] == 3
+    assert worksheet.grid == table(25)
+    assert report["rows"] == 25
+    assert report["cells"] == 100
+    assert report["rows_per_second"] > 0
+
+
+def test_failed_chunk_is_retried():
+    worksheet = FlakyWorksheet("processed", fail_rows=["A11"], times=2)
+    writer = ChunkedSheetWriter(worksheet, max_cells_per_chunk=40, sleep=lambda s: None)
+
+    writer.write(table(25))
+
+    assert worksheet.grid == table(25)
+    assert writer.stats["retries"] == 2
+
+
+def test_resume_does_not_resend_written_chunks():
+    worksheet = FlakyWorksheet("processed", fail_rows=["A21"], times=2, code=500)
+    writer = ChunkedSheetWriter(worksheet, max_cells_per_chunk=40, max_retries=1, sleep=lambda s: None)
+
+    with pytest.raises(ChunkWriteError) as error:
+        writer.write(table(25))
+    assert error.value.chunk == 2
+
+    worksheet.update_ranges.clear()
+    writer.write(table(25))
+
+    assert worksheet.update_ranges == ["A21"]
+    assert worksheet.grid == table(25)
+
+
+def test_permission_errors_are_not_retried():
+    worksheet = FlakyWorksheet("processed", fail_rows=["A1"], code=403)
+    writer = ChunkedSheetWriter(worksheet, sleep=lambda s: None)
+
+    with pytest.raises(ChunkWriteError):
+        writer.write(table(3))
+    assert worksheet.update_ranges == ["A1"]
+
+
+def test_append_in_chunks():
+    worksheet = FakeWorksheet("raw_data", [["a", "b", "c", "d"]])
+    ChunkedSheetWriter(worksheet, max_cells_per_chunk=8).append(table(5))
+
+    assert worksheet.calls["append_rows"] == 3
+    assert worksheet.grid[1:] == table(5)
+
+
+def test_failed_rewrite_keeps_the_old_table_and_resumes():
+    from src.utils import GsheetAIAuto
+    old = [["id", "review", "extra"]] + [[i, f"old {i}", "x"] for i in range(1, 31)]
+    worksheet = FlakyWorksheet("processed", fail_rows=["A11"], times=6)
+    worksheet.grid = [list(row) for row in old]
+    records = [{"id": i, "review": f"new {i}"} for i in range(1, 21)]
+    writer = ChunkedSheetWriter(worksheet, max_cells_per_chunk=20, max_retries=1, sleep=lambda s: None)
+
+    with pytest.raises(ChunkWriteError):
+        GsheetAIAuto().upload_rows_to_gsheets(worksheet, records, ["id", "review"], writer=writer)
+    # nothing was cleared, the rows of the failed chunk still hold the old table
+    assert worksheet.calls["clear"] == 0
+    assert worksheet.grid[10] == [10, "old 10", "x"]
+
+    worksheet.update_ranges.clear()
+    worksheet.failures.clear()
+    GsheetAIAuto().upload_rows_to_gsheets(worksheet, records, ["id", "review"], writer=writer)
+
+    assert worksheet.update_ranges == ["A11", "A21"]
+    assert worksheet.get_all_records() == records
+    assert len(worksheet.grid) == 21
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ConnectionError("connection reset"),
+                                   requests.exceptions.ReadTimeout("read timed out")])
+def test_requests_network_errors_are_retried(error):
+    worksheet = FakeWorksheet("processed")
+    calls = []
+
+    def update(values=None, range_name=None, *args, **kwargs):
+        calls.append(range_name)
+        if len(calls) == 1:
+            raise error
+        return FakeWorksheet.update(worksheet, values, range_name)
+
+    worksheet.update = update
+    writer = ChunkedSheetWriter(worksheet, sleep=lambda s: None)
+    writer.write(table(3))
+
+    assert calls == ["A1", "A1"]
+    assert worksheet.grid == table(3)
+    assert writer.stats["retries"] == 1
+
+
+@pytest.mark.parametrize("code", [429, 503])
+def test_injected_sheets_failures_are_retried(code):
+    worksheet = FakeWorksheet("processed", quota=FakeSheetsQuota(fail_every=2, fail_code=code))
+    writer = ChunkedSheetWriter(worksheet, max_cells_per_chunk=40, sleep=lambda s: None)
+    updater = ChunkedSheetWriter(worksheet, sleep=lambda s: None)
+
+    writer.write(table(25))
+    updater.update_ranges([[{"range": "A1", "values": [["x"]]}]])
+
+    assert worksheet.grid == [["x"] + table(1)[0][1:]] + table(25)[1:]
+    assert writer.stats["retries"] + updater.stats["retries"] == worksheet.quota.stats["failures"] == 3
+
+
+def test_sheets_quota_throttles_requests():
+    quota = FakeSheetsQuota(requests_per_minute=2)
+    worksheet = FakeWorksheet("processed", quota=quota)
+    worksheet.update(table(1))
+    worksheet.get_all_values()
+
+    with pytest.raises(FakeSheetsError) as error:
+        worksheet.update(table(1))
+    assert error.value.code == 429
+    assert quota.stats["throttled"] == 1
+    # a throttled request writes nothing
+    assert worksheet.cells_written == 4
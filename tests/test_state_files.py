@@ -0,0 +1,26 @@
+import pytest
+from src.state_files import atomic_write, read_json, write_json
+
+
+def test_write_json_creates_the_folder_and_reads_back(tmp_path):
+    path = str(tmp_path / "state" / "watermark.json")
+
+    assert read_json(path) == {}
+    write_json(path, {"hashes": {"1": "abc"}})
+
+    assert read_json(path) == {"hashes": {"1": "abc"}}
+    assert [p.name for p in (tmp_path / "state").iterdir()] == ["watermark.json"]
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = str(tmp_path / "aggregate.json")
+    write_json(path, {"rows": 1})
+
+    def crash(tmp_path):
+        with open(tmp_path, "w") as f:
+            f.write('{"rows": ')
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        atomic_write(path, crash)
+    assert read_json(path) == {"rows": 1}
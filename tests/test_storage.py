@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+from src.fakes import FakeWorksheet
+from src.storage import ParquetBackend, SheetsBackend, SQLiteBackend, open_local_tables
+from src.utils import GsheetAIAuto
+
+
+def rows(ids, text):
+    return pd.DataFrame({"review_text": [f"{text} {i}" for i in ids], "rating": [5] * len(ids), "id": list(ids)})
+
+
+def local_backend(kind, tmp_path):
+    return open_local_tables(kind, str(tmp_path))["staging"]
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "parquet"])
+def test_upsert_inserts_updates_and_keeps_order(kind, tmp_path):
+    backend = local_backend(kind, tmp_path)
+    assert backend.read().empty
+
+    assert backend.upsert(rows([1, 2, 3], "old")) == {"inserted": 3, "updated": 0}
+    assert backend.upsert(rows([2, 4], "new")) == {"inserted": 1, "updated": 1}
+
+    table = backend.read()
+    assert table["id"].tolist() == [1, 2, 3, 4]
+    assert table["review_text"].tolist() == ["old 1", "new 2", "old 3", "new 4"]
+
+
+@pytest.mark.parametrize("kind", ["sqlite", "parquet"])
+def test_append_and_clear(kind, tmp_path):
+    backend = local_backend(kind, tmp_path)
+    backend.append(rows([1], "a"))
+    backend.append(rows([1], "a"))
+    assert len(backend.read()) == 2
+
+    backend.clear()
+    assert backend.read().empty
+
+
+def test_sqlite_tables_share_one_file(tmp_path):
+    tables = open_local_tables("sqlite", str(tmp_path))
+    tables["raw_data"].upsert(rows([1], "raw"))
+    tables["processed"].upsert(rows([1], "processed").rename(columns={"id": "Id"}), "Id")
+
+    reopened = SQLiteBackend(str(tmp_path / "pipeline.sqlite"), "processed")
+    assert reopened.read()["review_text"].tolist() == ["processed 1"]
+
+
+def test_unknown_local_backend(tmp_path):
+    with pytest.raises(ValueError):
+        open_local_tables("csv", str(tmp_path))
+
+
+def test_sheets_backend(tmp_path):
+    worksheet = FakeWorksheet("staging")
+    backend = SheetsBackend(GsheetAIAuto(), worksheet)
+
+    backend.upsert(rows([1, 2], "old"))
+    backend.upsert(rows([2, 3], "new"))
+    assert backend.read()["review_text"].tolist() == ["old 1", "new 2", "new 3"]
+    assert backend.verify([1, 2, 3])
+
+    backend.append(rows([4], "appended"))
+    assert worksheet.grid[-1] == ["appended 4", 5, 4]
+    # rows are matched on their id column only
+    with pytest.raises(ValueError):
+        backend.upsert(rows([5], "other"), "review_text")
+
+
+def test_parquet_upsert_keeps_the_last_row_of_a_duplicate_key(tmp_path):
+    backend = ParquetBackend(str(tmp_path / "staging.parquet"))
+    backend.upsert(rows([1], "old"))
+
+    duplicates = pd.concat([rows([1, 2], "first"), rows([2, 1], "last")], ignore_index=True)
+    assert backend.upsert(duplicates) == {"inserted": 1, "updated": 1}
+    assert backend.read()["review_text"].tolist() == ["last 1", "last 2"]
+    assert backend.upsert(rows([3, 3], "new")) == {"inserted": 1, "updated": 0}
+    assert backend.read()["id"].tolist() == [1, 2, 3]
+
+
+def test_incomplete_backend_fails_when_created():
+    from src.storage import StorageBackend
+
+    class ReadOnlyBackend(StorageBackend):
+        def read(self):
+            return pd.DataFrame()
+
+    with pytest.raises(TypeError):
+        ReadOnlyBackend()
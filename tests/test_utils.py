@@ -1,7 +1,11 @@
+import json
 import pytest
 from pytest_mock import MockFixture
 from src.utils import GsheetAIAuto
-from configs.config import creds, sheet_id, csv_path ,GROQ_API_KEY
+from src.cache import ReviewCache
+from src.batching import BatchPlanner
+from src.fakes import FakeSheetsQuota, FakeWorksheet
+from configs.config import settings
 from gspread.client import Client
 from gspread import Spreadsheet
 from gspread.worksheet import Worksheet
@@ -13,8 +17,9 @@ from typing import List
  
 
 @pytest.fixture()
-def init_object():
-    return [GsheetAIAuto(), creds, sheet_id, csv_path ,GROQ_API_KEY]
+def init_object(mocker: MockFixture):
+    # credentials are only loaded when used, the client tests never need real ones
+    return [GsheetAIAuto(), mocker.Mock(name="creds"), settings.sheet_id, settings.csv_path, settings.GROQ_API_KEY]
 
 def test_create_client(mocker:MockFixture,init_object):
     test_obj = init_object[0]
@@ -51,7 +56,7 @@ def test_get_spreadsheet(mocker: MockFixture, init_object):
         return_value = mock_response_ss
     )
 
-    test_spreadsheet = test_obj.get_spreadsheet(test_create, sheet_id)
+    test_spreadsheet = test_obj.get_spreadsheet(test_create, init_object[2])
 
     assert isinstance(test_spreadsheet, Spreadsheet)
 
@@ -97,10 +102,12 @@ def test_clean_sheet(mocker: MockFixture, init_object):
     test_obj.clean_sheet(mock_spreadsheet)
 
    
-    mock_spreadsheet.del_worksheet.assert_any_call(ws_sheet1)
-    
-    with pytest.raises(AssertionError):
-        mock_spreadsheet.del_worksheet.assert_any_call(ws_stg)
+    mock_spreadsheet.batch_update.assert_called_once_with(
+        {"requests": [{"deleteSheet": {"sheetId": ws_sheet1.id}}]})
+    mock_spreadsheet.del_worksheet.assert_not_called()
+    mock_spreadsheet.worksheet.assert_not_called()
+    assert "Sheet1" not in test_obj.worksheets(mock_spreadsheet)
+    assert "staging" in test_obj.worksheets(mock_spreadsheet)
 
 
 
@@ -121,12 +128,18 @@ def test_get_worksheet(mocker: MockFixture, init_object):
     
     # Test getting existing worksheet
     result1 = test_obj.get_worksheet(mock_ss, "raw_data", 3, 3)
-    mock_ss.worksheet.assert_called_with("raw_data")
+    assert result1 is ws_raw_data
     
     #Test getting non-existing worksheet (should create it)
     ws_prc = test_obj.get_worksheet(mock_ss, "processed", 3, 3)
     mock_ss.add_worksheet.assert_called_with(title="processed", rows=3, cols=3)
 
+    # later lookups, including the new sheet, are served from the registry
+    assert test_obj.get_worksheet(mock_ss, "processed", 3, 3) is ws_prc
+    assert test_obj.get_worksheet(mock_ss, "staging", 3, 3) is ws_stg
+    mock_ss.worksheets.assert_called_once()
+    mock_ss.add_worksheet.assert_called_once()
+
 
 # def test_upload_rows_to_gsheets(mocker: MockFixture, init_object):
 #     mock_ws = mocker.Mock(spec= Worksheet)
@@ -212,7 +225,7 @@ def test_apply_apply_groqAI(init_object):
 
     test_obj = init_object[0]
     test_result = test_obj.apply_groqAI(
-        api_key=GROQ_API_KEY,
+        api_key=init_object[4],
         df=test_df,
         model= "openai/gpt-oss-120b",
         review_column="Review Text",
@@ -239,3 +252,377 @@ def test_set_action_needed(init_object):
 
 
 
+
+
+def fake_groq_completion(mocker: MockFixture, content=None, **kwargs):
+    # answers every review in the prompt, marking "lovely" ones positive
+    reviews = json.loads(kwargs["messages"][1]["content"].split("=", 1)[1])
+    results = [{"id": item["id"], "summary": item["review"],
+                "sentiment": "positive" if "lovely" in item["review"] else "negative"}
+               for item in reviews]
+    content = json.dumps({"results": results}) if content is None else content(results)
+    return mocker.Mock(choices=[mocker.Mock(message=mocker.Mock(content=content))])
+
+
+@pytest.fixture()
+def fake_groq(mocker: MockFixture):
+    """with_raw_response.create of a mocked Groq client, answering with fake_groq_completion."""
+    mock_groq = mocker.patch("src.utils.GsheetAIAuto.create_groq_client")
+    create = mock_groq.return_value.chat.completions.with_raw_response.create
+    create.side_effect = lambda **kwargs: mocker.Mock(parse=lambda: fake_groq_completion(mocker, **kwargs))
+    return create
+
+
+def test_apply_groqAI_concurrent_matches_sequential(fake_groq, init_object):
+    reviews = ["The cloth is lovely", "", "I don't like the cloth material", "lovely fit", None, "too small"]
+    test_obj = init_object[0]
+
+    sequential = test_obj.apply_groqAI("key", pd.DataFrame({"Review Text": reviews, "Clothing ID": range(6)}),
+                                       "openai/gpt-oss-120b", "Review Text", batch_size=2)
+    concurrent = test_obj.apply_groqAI("key", pd.DataFrame({"Review Text": reviews, "Clothing ID": range(6)}),
+                                       "openai/gpt-oss-120b", "Review Text", batch_size=2, max_workers=3)
+
+    pd.testing.assert_frame_equal(sequential, concurrent)
+    assert concurrent["AI Sentiment"].tolist() == ["positive", "neutral", "negative", "positive", "neutral", "negative"]
+    # empty reviews never reach Groq, so 4 reviews make 2 batches per run
+    assert fake_groq.call_count == 4
+
+
+def test_apply_groqAI_reuses_cached_results(fake_groq, init_object):
+    cache = ReviewCache(":memory:")
+    test_obj = init_object[0]
+
+    first = test_obj.apply_groqAI("key", pd.DataFrame({"Review Text": ["The cloth is lovely", "too small"]}),
+                                  "openai/gpt-oss-120b", "Review Text", cache=cache)
+    # a rerun with one new review only sends that review
+    second = test_obj.apply_groqAI("key", pd.DataFrame({"Review Text": ["the cloth is  LOVELY", "too small", "lovely dress"]}),
+                                   "openai/gpt-oss-120b", "Review Text", cache=cache)
+
+    assert fake_groq.call_count == 2
+    assert "lovely dress" in fake_groq.call_args.kwargs["messages"][1]["content"]
+    assert "too small" not in fake_groq.call_args.kwargs["messages"][1]["content"]
+    assert second["AI Sentiment"].tolist() == ["positive", "negative", "positive"]
+    assert second["AI Summary"].tolist()[:2] == first["AI Summary"].tolist()
+    assert cache.hits == 2
+
+
+def test_apply_groqAI_keeps_results_on_their_rows_with_any_index(fake_groq, init_object):
+    # e.g. the changed rows of a watermark, a filtered slice of staging
+    df = pd.DataFrame({"Review Text": ["too small", "", "lovely fit"]}, index=[5, 2, 9])
+
+    result = init_object[0].apply_groqAI("key", df, "openai/gpt-oss-120b", "Review Text", batch_size=1)
+
+    assert result.index.tolist() == [5, 2, 9]
+    assert result["AI Summary"].tolist() == ["too small", "", "lovely fit"]
+    assert result["AI Sentiment"].tolist() == ["negative", "neutral", "positive"]
+    assert result["Action Needed"].tolist() == ["Yes", "No", "No"]
+
+
+def test_apply_groqAI_sends_duplicates_once(fake_groq, init_object):
+    from src.dedup import ReviewDeduplicator
+    dedup = ReviewDeduplicator()
+    df = pd.DataFrame({"Review Text": ["a lovely fit!", "too small", "A lovely fit", "", "Too small."]})
+
+    result = init_object[0].apply_groqAI("key", df, "openai/gpt-oss-120b", "Review Text",
+                                         batch_size=1, deduplicator=dedup)
+
+    assert fake_groq.call_count == 2
+    assert result["AI Sentiment"].tolist() == ["positive", "negative", "positive", "neutral", "negative"]
+    assert result["AI Summary"].tolist() == ["a lovely fit!", "too small", "a lovely fit!", "", "too small"]
+    assert dedup.summary()["calls_saved"] == 2
+
+
+def test_apply_groqAI_skips_rows_the_pre_classifier_decides(fake_groq, init_object):
+    from src.preclassify import RatingLexiconClassifier
+    df = pd.DataFrame({"Review Text": ["Perfect fit. Will buy again.", "lovely but it pills", "Poor stitching"],
+                       "Rating": [5, 3, 1], "Recommended IND": [1, 1, 0]})
+
+    result = init_object[0].apply_groqAI("key", df, "openai/gpt-oss-120b", "Review Text",
+                                         pre_classifier=RatingLexiconClassifier(threshold=0.9))
+
+    assert fake_groq.call_count == 1
+    assert "lovely but it pills" in fake_groq.call_args.kwargs["messages"][1]["content"]
+    assert "Poor stitching" not in fake_groq.call_args.kwargs["messages"][1]["content"]
+    assert result["AI Sentiment"].tolist() == ["positive", "positive", "negative"]
+    assert result["AI Summary"].tolist() == ["Perfect fit.", "lovely but it pills", "Poor stitching"]
+
+
+def test_apply_groqAI_resumes_from_the_journal(mocker: MockFixture, fake_groq, init_object, tmp_path):
+    from src.journal import ResultJournal
+    calls = []
+
+    def crash_on_third_request(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 3:
+            raise RuntimeError("connection reset")
+        return mocker.Mock(parse=lambda: fake_groq_completion(mocker, **kwargs))
+
+    fake_groq.side_effect = crash_on_third_request
+    journal = ResultJournal(str(tmp_path / "journal.jsonl"))
+    flushed = []
+    reviews = ["lovely fit", "too small", "lovely color", "runs big"]
+
+    with pytest.raises(RuntimeError):
+        init_object[0].apply_groqAI("key", pd.DataFrame({"Review Text": reviews, "Id": [1, 2, 3, 4]}),
+                                    "openai/gpt-oss-120b", "Review Text", batch_size=1, journal=journal,
+                                    flush=flushed.append, flush_every=2)
+    # the two finished batches were journaled and flushed before the crash
+    assert len(journal.load()) == 2
+    assert flushed[0]["Id"].tolist() == [1, 2]
+    assert flushed[0]["Action Needed"].tolist() == ["No", "Yes"]
+
+    result = init_object[0].apply_groqAI("key", pd.DataFrame({"Review Text": reviews, "Id": [1, 2, 3, 4]}),
+                                         "openai/gpt-oss-120b", "Review Text", batch_size=1, journal=journal)
+    assert len(calls) == 5
+    assert "lovely fit" not in calls[3]["messages"][1]["content"]
+    assert result["AI Sentiment"].tolist() == ["positive", "negative", "positive", "negative"]
+
+
+def test_apply_groqAI_journals_duplicates_with_their_representative(mocker: MockFixture, fake_groq, init_object,
+                                                                    tmp_path):
+    from src.dedup import ReviewDeduplicator
+    from src.journal import ResultJournal
+
+    def crash_on_second_request(**kwargs):
+        if fake_groq.call_count == 2:
+            raise RuntimeError("connection reset")
+        return mocker.Mock(parse=lambda: fake_groq_completion(mocker, **kwargs))
+
+    fake_groq.side_effect = crash_on_second_request
+    journal = ResultJournal(str(tmp_path / "journal.jsonl"))
+    flushed = []
+    df = pd.DataFrame({"Review Text": ["a lovely fit!", "too small", "A lovely fit"], "Id": [1, 2, 3]})
+
+    with pytest.raises(RuntimeError):
+        init_object[0].apply_groqAI("key", df, "openai/gpt-oss-120b", "Review Text", batch_size=1,
+                                    deduplicator=ReviewDeduplicator(), journal=journal,
+                                    flush=flushed.append, flush_every=1)
+    # the duplicate of the finished review is journalled and flushed with it
+    assert sorted(entry["id"] for entry in journal.load().values()) == ["1", "3"]
+    assert flushed[0]["Id"].tolist() == [1, 3]
+
+
+def test_apply_groqAI_does_not_keep_fallback_results(mocker: MockFixture, fake_groq, init_object, tmp_path):
+    from src.journal import ResultJournal
+    fake_groq.side_effect = lambda **kwargs: mocker.Mock(
+        parse=lambda: fake_groq_completion(mocker, lambda results: "garbage", **kwargs))
+    cache = ReviewCache(":memory:")
+    journal = ResultJournal(str(tmp_path / "journal.jsonl"))
+    df = pd.DataFrame({"Review Text": ["lovely fit", ""], "Id": [7, 8]})
+
+    failed = init_object[0].apply_groqAI("key", df, "openai/gpt-oss-120b", "Review Text",
+                                         cache=cache, journal=journal)
+    assert failed["AI Sentiment"].tolist() == ["neutral", "neutral"]
+    assert failed.attrs["fallback_ids"] == ["7"]
+    assert journal.load() == {}
+
+    # once the model answers again, the row is asked for instead of served from the cache
+    fake_groq.side_effect = lambda **kwargs: mocker.Mock(parse=lambda: fake_groq_completion(mocker, **kwargs))
+    calls = fake_groq.call_count
+    result = init_object[0].apply_groqAI("key", df, "openai/gpt-oss-120b", "Review Text",
+                                         cache=cache, journal=journal)
+    assert fake_groq.call_count == calls + 1
+    assert result["AI Sentiment"].tolist() == ["positive", "neutral"]
+    assert result.attrs["fallback_ids"] == []
+
+
+def test_merge_processed_replaces_rows_by_id(init_object):
+    existing = pd.DataFrame({"Id": [1, 2, 3], "Review Text": ["a", "b", "c"], "AI Sentiment": ["positive"] * 3})
+    new = pd.DataFrame({"Id": [4, 2], "Review Text": ["d", "b2"], "AI Sentiment": ["negative"] * 2})
+
+    merged = init_object[0].merge_processed(existing, new, "Id")
+
+    assert merged["Id"].tolist() == [1, 2, 3, 4]
+    assert merged["Review Text"].tolist() == ["a", "b2", "c", "d"]
+
+
+def test_upload_rows_to_gsheets_rewrites_changed_records(mocker, init_object):
+    mock_ws = mocker.Mock(spec=Worksheet)
+    mock_ws.get_all_records.return_value = [{"Review Text": "lovely", "id": 1},
+                                            {"Review Text": "too small", "id": 2}]
+    test_obj = init_object[0]
+
+    unchanged = test_obj.upload_rows_to_gsheets(mock_ws, [["lovely", 1], ["too small", 2]], ["Review Text", "id"])
+    assert unchanged["message"] == "No new records to update."
+    mock_ws.update.assert_not_called()
+
+    changed = test_obj.upload_rows_to_gsheets(mock_ws, [["lovely", 1], ["too big", 2]], ["Review Text", "id"])
+    assert changed["message"] == "0 new records uploaded. 1 records updated."
+    mock_ws.update.assert_called_once()
+
+
+def test_upload_rows_to_gsheets_append_mode_sends_only_the_diff(init_object):
+    header = ["Review Text", "Clothing ID", "id"]
+    existing = [[f"review {i}", 100 + i, i] for i in range(1, 101)]
+    worksheet = FakeWorksheet("staging", [header] + existing)
+
+    records = [list(row) for row in existing]
+    records[4][0] = "edited review"
+    records.append(["brand new review", 201, 101])
+
+    test_obj = init_object[0]
+    status = test_obj.upload_rows_to_gsheets(worksheet, records, header, mode="append")
+
+    assert status == {"status": "success", "message": "1 new records uploaded. 1 records updated."}
+    # one changed cell plus one appended row, instead of rewriting 101 rows
+    assert worksheet.cells_written == 1 + 3
+    assert worksheet.calls["clear"] == 0
+    assert worksheet.grid[5][0] == "edited review"
+    assert worksheet.grid[-1] == ["brand new review", 201, 101]
+
+    again = test_obj.upload_rows_to_gsheets(worksheet, records, header, mode="append")
+    assert again == {"status": "success", "message": "No new records to update."}
+    assert worksheet.cells_written == 4
+
+
+def test_upload_rows_to_gsheets_append_mode_bounds_cell_updates(init_object):
+    header = ["Review Text", "Clothing ID", "id"]
+    existing = [[f"review {i}", 100 + i, i] for i in range(1, 11)]
+    worksheet = FakeWorksheet("staging", [header] + existing)
+    records = [[f"edited {i}", 100 + i, i] for i in range(1, 11)]
+
+    init_object[0].upload_rows_to_gsheets(worksheet, records, header, mode="append", chunk_cells=4)
+
+    # 10 changed cells, at most 4 per request
+    assert worksheet.calls["batch_update"] == 3
+    assert [row[0] for row in worksheet.grid[1:]] == [f"edited {i}" for i in range(1, 11)]
+
+
+def test_upload_rows_to_gsheets_retries_failed_cell_updates(init_object, mocker):
+    mocker.patch('src.sheet_writer.random.uniform', return_value=0.0)
+    header = ["Review Text", "Clothing ID", "id"]
+    existing = [[f"review {i}", 100 + i, i] for i in range(1, 11)]
+    quota = FakeSheetsQuota(fail_every=2, fail_code=429)
+    worksheet = FakeWorksheet("staging", [header] + existing, quota=quota)
+    records = [[f"edited {i}", 100 + i, i] for i in range(1, 11)]
+
+    init_object[0].upload_rows_to_gsheets(worksheet, records, header, mode="append", chunk_cells=4)
+
+    assert quota.stats["failures"] == 2
+    assert worksheet.calls["batch_update"] == 5
+    assert [row[0] for row in worksheet.grid[1:]] == [f"edited {i}" for i in range(1, 11)]
+
+
+def test_upload_rows_to_gsheets_append_mode_on_empty_sheet(init_object):
+    worksheet = FakeWorksheet("raw_data")
+
+    status = init_object[0].upload_rows_to_gsheets(worksheet, [["lovely", 10], ["too small", 11]],
+                                                   ["Review Text", "Clothing ID"], mode="append")
+
+    assert status["message"] == "2 new records uploaded."
+    assert worksheet.grid == [["Review Text", "Clothing ID", "id"], ["lovely", 10, 1], ["too small", 11, 2]]
+
+
+def test_upload_rows_to_gsheets_append_mode_rewrites_on_new_columns(init_object):
+    worksheet = FakeWorksheet("processed", [["Review Text", "id"], ["lovely", 1]])
+
+    init_object[0].upload_rows_to_gsheets(worksheet, [["lovely", "positive", 1]],
+                                          ["Review Text", "AI Sentiment", "id"], mode="append")
+
+    assert worksheet.calls["clear"] == 1
+    assert worksheet.grid == [["Review Text", "AI Sentiment", "id"], ["lovely", "positive", 1]]
+
+
+def test_iter_dataset_streams_batches(tmp_path, init_object):
+    csv = tmp_path / "test_dataset.csv"
+    pd.DataFrame({
+        "Unnamed: 0": range(7),
+        "Review Text": ["lovely", None, "too small", "great", "ok", "bad", "nice"],
+        "Clothing ID": range(10, 17),
+    }).to_csv(csv, index=False)
+
+    test_obj = init_object[0]
+    batches = list(test_obj.iter_dataset(str(csv), 5, chunksize=2))
+
+    assert [len(rows) for rows, cols in batches] == [2, 2, 1]
+    assert batches[0][1] == ["Review Text", "Clothing ID"]
+    assert batches[0][0] == [["lovely", 10], ["", 11]]
+    assert test_obj.dataset_columns(str(csv)) == ["Review Text", "Clothing ID"]
+
+
+def test_process_stg_data_keeps_numbers_in_object_columns(init_object):
+    # values read back from Sheets can mix numbers and text in one column
+    test_df = pd.DataFrame({"Title": [" Lovely ", 2024, None], "Clothing ID": [10, 11, 12]})
+
+    test_result = init_object[0].process_stg_data(test_df, columnar=True)
+
+    frame = test_result.get("processed_frame")
+    assert frame["title"].tolist()[:2] == ["lovely", 2024]
+    assert pd.isna(frame["title"].tolist()[2])
+    assert test_df.columns.tolist() == ["Title", "Clothing ID"]
+
+
+def test_process_stg_data_without_copy_changes_the_input(init_object):
+    test_df = pd.DataFrame({"Review Text": [" The Cloth "], "Clothing ID": [10]})
+
+    test_result = init_object[0].process_stg_data(test_df, copy=False, columnar=True)
+
+    assert test_result.get("processed_frame") is test_df
+    assert test_df.loc[0, "review_text"] == "the cloth"
+
+
+def test_upload_rows_to_gsheets_accepts_a_dataframe(init_object):
+    worksheet = FakeWorksheet("staging")
+    frame = pd.DataFrame({"review_text": ["lovely", "too small"], "clothing_id": [10, 11]})
+
+    init_object[0].upload_rows_to_gsheets(worksheet, frame, frame.columns.tolist(), mode="append")
+
+    assert worksheet.grid == [["review_text", "clothing_id", "id"], ["lovely", 10, 1], ["too small", 11, 2]]
+
+
+def test_apply_groqAI_rerequests_only_missing_ids(mocker: MockFixture, fake_groq, init_object):
+    responses = [
+        # first answer is cut off after the first item and has a bad sentiment for the second
+        lambda results: json.dumps({"results": [results[0], dict(results[1], sentiment="mixed")]})[:-40],
+        None,
+    ]
+    fake_groq.side_effect = lambda **kwargs: mocker.Mock(
+        parse=lambda content=responses.pop(0): fake_groq_completion(mocker, content, **kwargs))
+    test_obj = init_object[0]
+
+    result = test_obj.apply_groqAI("key", pd.DataFrame({"Review Text": ["The cloth is lovely", "too small", "bad zip"]}),
+                                   "openai/gpt-oss-120b", "Review Text")
+
+    assert fake_groq.call_count == 2
+    repair_prompt = json.loads(fake_groq.call_args.kwargs["messages"][1]["content"].split("=", 1)[1])
+    assert [item["id"] for item in repair_prompt] == [1, 2]
+    assert result["AI Sentiment"].tolist() == ["positive", "negative", "negative"]
+    assert test_obj.parse_metrics.counts["parse_failures"] == 1
+    assert test_obj.parse_metrics.counts["items_repaired"] == 2
+    assert test_obj.parse_metrics.counts["items_fallback"] == 0
+
+
+def test_apply_groqAI_with_batch_planner(fake_groq, init_object):
+    planner = BatchPlanner()
+    reviews = ["The cloth is lovely", "too small"] * 50
+
+    result = init_object[0].apply_groqAI("key", pd.DataFrame({"Review Text": reviews}),
+                                         "openai/gpt-oss-120b", "Review Text", max_workers=2,
+                                         batch_planner=planner)
+
+    assert result["AI Sentiment"].tolist() == ["positive", "negative"] * 50
+    # 100 short reviews fit in far fewer requests than the 10 a batch_size of 10 needs
+    assert fake_groq.call_count < 10
+    assert fake_groq.call_args.kwargs["max_completion_tokens"] == planner.completion_budget(
+        len(json.loads(fake_groq.call_args.kwargs["messages"][1]["content"].split("=", 1)[1])))
+
+
+def test_records_to_frame_matches_uploaded_rows(init_object):
+    test_obj = init_object[0]
+    worksheet = FakeWorksheet("raw_data")
+
+    records, cols = [["a", 1], ["b", 2]], ["name", "value"]
+    test_obj.upload_rows_to_gsheets(worksheet, records, cols, mode="append", start_id=5)
+    frame = test_obj.records_to_frame(records, cols, start_id=5)
+
+    assert [frame.columns.tolist()] + frame.values.tolist() == worksheet.grid
+
+
+def test_verify_upload_reads_only_the_id_column(init_object):
+    test_obj = init_object[0]
+    worksheet = FakeWorksheet("staging", [["name", "id"], ["a", 1], ["b", 2]])
+
+    assert test_obj.verify_upload(worksheet, [1, 2])
+    assert not test_obj.verify_upload(worksheet, [1, 2, 3])
+    assert worksheet.calls["get_all_records"] == 0
+    assert worksheet.cells_read == 2 * (2 + 3)
@@ -0,0 +1,56 @@
+import pandas as pd
+from src.watermark import WatermarkStore
+
+
+def staging_df():
+    return pd.DataFrame({
+        "id": [1, 2, 3],
+        "review_text": ["the cloth is lovely", "i don't like the cloth material", "where can i get this cloth?"],
+        "clothing_id": [10, 11, 12],
+    })
+
+
+def test_first_run_returns_every_row(tmp_path):
+    store = WatermarkStore(str(tmp_path / "watermark.json"))
+    assert store.changed_rows(staging_df()).shape[0] == 3
+
+
+def test_commit_skips_processed_rows_on_next_run(tmp_path):
+    path = str(tmp_path / "state" / "watermark.json")
+    store = WatermarkStore(path)
+    store.changed_rows(staging_df())
+    store.commit()
+
+    df = pd.concat([staging_df(), pd.DataFrame({"id": [4], "review_text": ["too small"], "clothing_id": [13]})])
+    df.loc[df["id"] == 2, "review_text"] = "i love the cloth material"
+
+    reloaded = WatermarkStore(path)
+    changed = reloaded.changed_rows(df)
+
+    assert reloaded.high_water_mark == 3
+    assert changed["id"].tolist() == [2, 4]
+
+
+def test_seed_from_processed_sheet_ignores_ai_columns(tmp_path):
+    store = WatermarkStore(str(tmp_path / "watermark.json"))
+    processed = pd.DataFrame({
+        "Id": [1, 2, 3],
+        "Review Text": ["the cloth is lovely", "i don't like the cloth material", "where can i get this cloth?"],
+        "Clothing Id": [10, 11, 12],
+        "AI Summary": ["lovely", "dislikes material", "asks where to buy"],
+        "AI Sentiment": ["positive", "negative", "neutral"],
+        "Action Needed": ["No", "Yes", "No"],
+    })
+    store.seed(processed)
+
+    assert store.changed_rows(staging_df()).empty
+
+
+def test_released_rows_are_handed_out_again(tmp_path):
+    path = str(tmp_path / "watermark.json")
+    store = WatermarkStore(path)
+    store.changed_rows(staging_df())
+    store.release([2])
+    store.commit()
+
+    assert WatermarkStore(path).changed_rows(staging_df())["id"].tolist() == [2]